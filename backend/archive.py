@@ -0,0 +1,181 @@
+"""
+Storage maintenance: move closed requests out of the hot collection and prune
+old notifications.
+
+Closed (approved/rejected/cancelled) requests untouched for ARCHIVE_AFTER_DAYS
+are copied into ``requests_archive`` (zstd block compression where the
+server allows it) and then removed from ``requests``. Each batch is an
+idempotent upsert followed by a guarded delete, so an interrupted run or two
+instances running at once never lose or duplicate a request.
+
+Notification timestamps are ISO strings, which a TTL index cannot expire, so
+they are pruned by age instead: read ones after
+NOTIFICATION_READ_RETENTION_DAYS, everything after NOTIFICATION_RETENTION_DAYS.
+Pruning unread notifications leaves the per-user unread counters high, so
+each run also reconciles them against the notifications collection.
+
+Runs every MAINTENANCE_INTERVAL_MINUTES from the API process (0 disables it)
+or on demand: ``python archive.py [--dry-run]``.
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pymongo import ReplaceOne, UpdateOne
+
+logger = logging.getLogger(__name__)
+
+CLOSED_STATUSES = ("approved", "rejected", "cancelled")
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '180'))
+ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '500'))
+NOTIFICATION_READ_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_READ_RETENTION_DAYS', '30'))
+NOTIFICATION_RETENTION_DAYS = int(os.environ.get('NOTIFICATION_RETENTION_DAYS', '180'))
+MAINTENANCE_INTERVAL_MINUTES = float(os.environ.get('MAINTENANCE_INTERVAL_MINUTES', '60'))
+
+_maintenance_task = None
+
+
+def _cutoff(days: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+
+
+async def ensure_archive_collection(db):
+    """Create requests_archive with compression; its indexes come from migrations.ensure_indexes."""
+    if "requests_archive" in await db.list_collection_names():
+        return
+    try:
+        await db.create_collection(
+            "requests_archive",
+            storageEngine={"wiredTiger": {"configString": "block_compressor=zstd"}},
+        )
+    except Exception as exc:
+        # Also raised when another instance created it first
+        logger.warning(f"Creating requests_archive without zstd compression: {exc}")
+
+
+async def archive_closed_requests(db, older_than_days: int = ARCHIVE_AFTER_DAYS, dry_run: bool = False) -> int:
+    """Move closed requests last updated more than ``older_than_days`` ago into requests_archive."""
+    query = {"status": {"$in": list(CLOSED_STATUSES)}, "updated_at": {"$lt": _cutoff(older_than_days)}}
+    if dry_run:
+        return await db.requests.count_documents(query)
+
+    await ensure_archive_collection(db)
+    archived = 0
+    while True:
+        batch = await db.requests.find(query).limit(ARCHIVE_BATCH_SIZE).to_list(ARCHIVE_BATCH_SIZE)
+        if not batch:
+            break
+        for doc in batch:
+            doc.pop("_id", None)
+            doc["archived_at"] = datetime.now(timezone.utc).isoformat()
+        await db.requests_archive.bulk_write(
+            [ReplaceOne({"id": doc["id"]}, doc, upsert=True) for doc in batch],
+            ordered=False,
+        )
+        # Re-check the filter so a request reopened in the meantime stays put
+        result = await db.requests.delete_many({**query, "id": {"$in": [doc["id"] for doc in batch]}})
+        archived += result.deleted_count
+        if len(batch) < ARCHIVE_BATCH_SIZE:
+            break
+
+    if archived:
+        logger.info(f"Archived {archived} closed requests.")
+    return archived
+
+
+async def prune_notifications(db, dry_run: bool = False) -> int:
+    query = {"$or": [
+        {"is_read": True, "created_at": {"$lt": _cutoff(NOTIFICATION_READ_RETENTION_DAYS)}},
+        {"created_at": {"$lt": _cutoff(NOTIFICATION_RETENTION_DAYS)}},
+    ]}
+    if dry_run:
+        return await db.notifications.count_documents(query)
+    result = await db.notifications.delete_many(query)
+    if result.deleted_count:
+        logger.info(f"Pruned {result.deleted_count} old notifications.")
+    return result.deleted_count
+
+
+async def reconcile_unread_counts(db, dry_run: bool = False) -> int:
+    """Correct notification_counters that disagree with the actual unread counts."""
+    # Snapshot counters before counting, so any change in between fails the
+    # compare-and-set below instead of being overwritten
+    counters = {c["_id"]: c.get("unread") async for c in db.notification_counters.find({})}
+    actual = {}
+    async for row in db.notifications.aggregate([
+        {"$match": {"is_read": False}},
+        {"$group": {"_id": "$user_id", "count": {"$sum": 1}}},
+    ]):
+        actual[row["_id"]] = row["count"]
+
+    ops = [
+        UpdateOne({"_id": user_id, "unread": unread}, {"$set": {"unread": actual.get(user_id, 0)}})
+        for user_id, unread in counters.items()
+        if unread != actual.get(user_id, 0)
+    ]
+    if ops and not dry_run:
+        await db.notification_counters.bulk_write(ops, ordered=False)
+        logger.info(f"Reconciled {len(ops)} unread notification counters.")
+    return len(ops)
+
+
+async def run_maintenance(db, dry_run: bool = False) -> dict:
+    return {
+        "archived_requests": await archive_closed_requests(db, dry_run=dry_run),
+        "pruned_notifications": await prune_notifications(db, dry_run=dry_run),
+        "reconciled_unread_counters": await reconcile_unread_counts(db, dry_run=dry_run),
+    }
+
+
+async def _maintenance_loop(db):
+    while True:
+        try:
+            await run_maintenance(db)
+        except Exception as exc:
+            logger.exception("Storage maintenance failed: %s", exc)
+        await asyncio.sleep(MAINTENANCE_INTERVAL_MINUTES * 60)
+
+
+def start_maintenance(db):
+    global _maintenance_task
+    if MAINTENANCE_INTERVAL_MINUTES > 0 and _maintenance_task is None:
+        _maintenance_task = asyncio.create_task(_maintenance_loop(db))
+
+
+async def stop_maintenance():
+    global _maintenance_task
+    if _maintenance_task is not None:
+        _maintenance_task.cancel()
+        try:
+            await _maintenance_task
+        except asyncio.CancelledError:
+            pass
+        _maintenance_task = None
+
+
+async def main():
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    parser = argparse.ArgumentParser(description="Archive closed requests, prune old notifications and reconcile unread counters.")
+    parser.add_argument("--dry-run", action="store_true", help="only report how many documents would move")
+    args = parser.parse_args()
+
+    from migrations import ensure_indexes
+
+    load_dotenv(Path(__file__).parent / '.env')
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    if not args.dry_run:
+        await ensure_indexes(db)
+    result = await run_maintenance(db, dry_run=args.dry_run)
+    logger.info(("Would move: " if args.dry_run else "Done: ") + str(result))
+    client.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(main())
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Request-lifecycle benchmark.
+
+Starts the FastAPI app in-process (no network hop) against a local MongoDB or
+mongomock-motor, optionally with a fake Redis, then drives concurrent
+create -> approve -> approve -> fulfill flows followed by a mixed read phase
+(lists, inbox, dashboard, notifications, request detail).
+
+Per-endpoint p50/p95/p99 latency and throughput are printed and written as
+JSON under test_reports/benchmarks/ so runs can be compared:
+
+    python benchmark.py --mongo mongomock --flows 100 --concurrency 20
+    python benchmark.py --mongo mongodb://localhost:27017 --redis fake \\
+        --compare ../test_reports/benchmarks/<previous>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+REPORTS_DIR = ROOT_DIR.parent / "test_reports" / "benchmarks"
+
+REQUESTER = ("ana.reyes@company.com", "pass123")
+APPROVERS = [("maria.santos@company.com", "pass123"), ("ricardo.cruz@company.com", "pass123")]
+CUSTODIAN = ("carlos.mendoza@company.com", "pass123")
+ADMIN = ("admin@company.com", "admin123")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo", default="mongomock",
+                        help="'mongomock' or a MongoDB URL (default: mongomock)")
+    parser.add_argument("--db-name", default=None,
+                        help="Database name (default: a fresh justino_bench_<id> database)")
+    parser.add_argument("--redis", default="none",
+                        help="'none', 'fake' (fakeredis) or a Redis URL (default: none)")
+    parser.add_argument("--flows", type=int, default=50, help="Number of full request lifecycles")
+    parser.add_argument("--reads", type=int, default=200, help="Number of read requests in the read phase")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent in-flight API calls")
+    parser.add_argument("--output", default=None, help="Report path (default: test_reports/benchmarks/<timestamp>.json)")
+    parser.add_argument("--compare", default=None, help="Previous report to compare p95 latencies against")
+    parser.add_argument("--keep-db", action="store_true", help="Do not drop the benchmark database afterwards")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    """Point the app at the benchmark backends before it is imported."""
+    db_name = args.db_name or f"justino_bench_{uuid.uuid4().hex[:8]}"
+    os.environ["DB_NAME"] = db_name
+    os.environ.setdefault("JWT_SECRET", "benchmark-secret-" + uuid.uuid4().hex)
+    os.environ["RESEND_API_KEY"] = ""
+    # Measure the app itself, not the per-client throttle
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+
+    if args.mongo == "mongomock":
+        os.environ["MONGO_URL"] = "mongodb://mongomock"
+        import motor.motor_asyncio
+        from mongomock_motor import AsyncMongoMockClient
+        import mongomock.collection
+
+        shared_client = AsyncMongoMockClient()
+        # server.py and utils/helpers.py each create a client; share one in-memory store
+        motor.motor_asyncio.AsyncIOMotorClient = lambda *a, **kw: shared_client
+
+        # mongomock re-runs the original filter to fetch the post-update document,
+        # which misses when the update changed a filtered field (our transition
+        # guards always do). Pin the lookup to _id as a real server would.
+        original_find_and_modify = mongomock.collection.Collection._find_and_modify
+
+        def _find_and_modify(self, query, projection=None, *a, **kw):
+            match = self.find_one(query, projection={"_id": 1})
+            if match is not None:
+                query = {"_id": match["_id"]}
+            return original_find_and_modify(self, query, projection, *a, **kw)
+
+        mongomock.collection.Collection._find_and_modify = _find_and_modify
+    else:
+        os.environ["MONGO_URL"] = args.mongo
+
+    if args.redis == "none":
+        os.environ.pop("REDIS_URL", None)
+    elif args.redis == "fake":
+        os.environ["REDIS_URL"] = "redis://fakeredis"
+    else:
+        os.environ["REDIS_URL"] = args.redis
+
+    sys.path.insert(0, str(ROOT_DIR))
+    if args.redis == "fake":
+        import fakeredis
+        import realtime
+        realtime.Redis = fakeredis.aioredis.FakeRedis
+    return db_name
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, int(round(pct / 100 * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    def __init__(self, client, concurrency):
+        self.client = client
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.samples = {}
+        self.errors = {}
+
+    async def call(self, label, method, url, expected=(200, 201), **kwargs):
+        async with self.semaphore:
+            started = time.perf_counter()
+            response = await self.client.request(method, url, **kwargs)
+            elapsed_ms = (time.perf_counter() - started) * 1000
+        self.samples.setdefault(label, []).append(elapsed_ms)
+        if response.status_code not in expected:
+            self.errors.setdefault(label, []).append(f"{response.status_code}: {response.text[:200]}")
+            return None
+        return response.json() if response.content else {}
+
+    def summary(self, wall_seconds):
+        endpoints = {}
+        for label, values in sorted(self.samples.items()):
+            ordered = sorted(values)
+            endpoints[label] = {
+                "count": len(ordered),
+                "errors": len(self.errors.get(label, [])),
+                "mean_ms": round(sum(ordered) / len(ordered), 3),
+                "p50_ms": round(percentile(ordered, 50), 3),
+                "p95_ms": round(percentile(ordered, 95), 3),
+                "p99_ms": round(percentile(ordered, 99), 3),
+                "max_ms": round(ordered[-1], 3),
+                "throughput_rps": round(len(ordered) / wall_seconds, 2) if wall_seconds else None,
+            }
+        return endpoints
+
+
+async def login(client, email, password):
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
+
+
+async def setup_template(client, admin_headers, approver_headers, custodian_headers, requester_headers):
+    """Create a two-approver + custodian template in the requester's department."""
+    requester = (await client.get("/api/auth/me", headers=requester_headers)).json()
+    approver_users = [(await client.get("/api/auth/me", headers=h)).json() for h in approver_headers]
+    custodian = (await client.get("/api/auth/me", headers=custodian_headers)).json()
+    response = await client.post("/api/form-templates", headers=admin_headers, json={
+        "department_id": requester["department_id"],
+        "name": f"Benchmark Form {uuid.uuid4().hex[:6]}",
+        "fields": [
+            {"name": "item_description", "label": "Item Description", "type": "textarea", "required": True},
+            {"name": "quantity", "label": "Quantity", "type": "number", "required": True},
+        ],
+        "approver_chain": [
+            {"step": idx + 1, "user_id": u["id"], "user_name": u["name"]}
+            for idx, u in enumerate(approver_users)
+        ],
+        "custodian": {"user_id": custodian["id"], "user_name": custodian["name"]},
+    })
+    response.raise_for_status()
+    return response.json()["id"]
+
+
+async def run_flow(rec, template_id, requester, approvers, custodian):
+    created = await rec.call("POST /api/requests", "POST", "/api/requests", headers=requester, json={
+        "form_template_id": template_id,
+        "form_data": {"item_description": "Benchmark item", "quantity": "3"},
+    })
+    if not created:
+        return
+    request_id = created["id"]
+    for approver in approvers:
+        await rec.call("GET /api/requests?my_approvals", "GET", "/api/requests",
+                       headers=approver, params={"my_approvals": True, "limit": 12})
+        await rec.call("POST /api/requests/{id}/action approve", "POST", f"/api/requests/{request_id}/action",
+                       headers=approver, json={"action": "approve"})
+    await rec.call("POST /api/requests/{id}/action fulfill", "POST", f"/api/requests/{request_id}/action",
+                   headers=custodian, json={"action": "fulfill"})
+    await rec.call("GET /api/requests/{id}", "GET", f"/api/requests/{request_id}", headers=requester)
+    return request_id
+
+
+async def run_reads(rec, users, request_ids, count):
+    reads = [
+        ("GET /api/requests", "/api/requests", {"limit": 12}),
+        ("GET /api/requests?my_approvals", "/api/requests", {"my_approvals": True, "limit": 12}),
+        ("GET /api/dashboard/stats", "/api/dashboard/stats", None),
+        ("GET /api/notifications", "/api/notifications", {"limit": 20}),
+    ]
+    tasks = []
+    for i in range(count):
+        headers = users[i % len(users)]
+        if request_ids and i % 5 == 4:
+            rid = request_ids[i % len(request_ids)]
+            tasks.append(rec.call("GET /api/requests/{id}", "GET", f"/api/requests/{rid}",
+                                  expected=(200, 403), headers=headers))
+            continue
+        label, url, params = reads[i % len(reads)]
+        tasks.append(rec.call(label, "GET", url, headers=headers, params=params))
+    await asyncio.gather(*tasks)
+
+
+def compare_reports(current, previous_path):
+    previous = json.loads(Path(previous_path).read_text())
+    rows = []
+    for phase in ("lifecycle", "reads"):
+        for label, stats in current["phases"][phase]["endpoints"].items():
+            before = previous.get("phases", {}).get(phase, {}).get("endpoints", {}).get(label)
+            if not before:
+                continue
+            delta = (stats["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100 if before["p95_ms"] else 0.0
+            rows.append((phase, label, before["p95_ms"], stats["p95_ms"], round(delta, 1)))
+    return rows
+
+
+def print_phase(name, phase):
+    print(f"\n== {name}: {phase['wall_seconds']:.2f}s ==")
+    print(f"{'endpoint':48} {'n':>5} {'err':>4} {'p50':>9} {'p95':>9} {'p99':>9} {'rps':>8}")
+    for label, s in phase["endpoints"].items():
+        print(f"{label:48} {s['count']:>5} {s['errors']:>4} {s['p50_ms']:>9.2f} {s['p95_ms']:>9.2f} "
+              f"{s['p99_ms']:>9.2f} {s['throughput_rps']:>8.1f}")
+
+
+async def main(args, db_name):
+    import httpx
+    import server
+
+    await server.startup_event()
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        admin = await login(client, *ADMIN)
+        requester = await login(client, *REQUESTER)
+        approvers = [await login(client, *creds) for creds in APPROVERS]
+        custodian = await login(client, *CUSTODIAN)
+        template_id = await setup_template(client, admin, approvers, custodian, requester)
+
+        lifecycle = Recorder(client, args.concurrency)
+        started = time.perf_counter()
+        request_ids = await asyncio.gather(*(
+            run_flow(lifecycle, template_id, requester, approvers, custodian) for _ in range(args.flows)
+        ))
+        lifecycle_seconds = time.perf_counter() - started
+
+        reads = Recorder(client, args.concurrency)
+        started = time.perf_counter()
+        await run_reads(reads, [requester, *approvers, custodian, admin], [r for r in request_ids if r], args.reads)
+        read_seconds = time.perf_counter() - started
+
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "mongo": "mongomock" if args.mongo == "mongomock" else "mongodb",
+            "redis": args.redis if args.redis in ("none", "fake") else "redis",
+            "flows": args.flows,
+            "reads": args.reads,
+            "concurrency": args.concurrency,
+            "python": platform.python_version(),
+        },
+        "phases": {
+            "lifecycle": {
+                "wall_seconds": round(lifecycle_seconds, 3),
+                "flows_per_second": round(args.flows / lifecycle_seconds, 2) if lifecycle_seconds else None,
+                "endpoints": lifecycle.summary(lifecycle_seconds),
+            },
+            "reads": {
+                "wall_seconds": round(read_seconds, 3),
+                "endpoints": reads.summary(read_seconds),
+            },
+        },
+        "errors": {**lifecycle.errors, **reads.errors},
+    }
+
+    if args.mongo != "mongomock" and not args.keep_db:
+        await server.client.drop_database(db_name)
+    await server.shutdown_db_client()
+    return report
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    db_name = configure_environment(args)
+    report = asyncio.run(main(args, db_name))
+
+    print_phase("lifecycle", report["phases"]["lifecycle"])
+    print_phase("reads", report["phases"]["reads"])
+    if report["errors"]:
+        print("\nErrors:")
+        for label, messages in report["errors"].items():
+            print(f"  {label}: {len(messages)} (first: {messages[0]})")
+
+    if args.compare:
+        print("\n== p95 vs previous ==")
+        for phase, label, before, after, delta in compare_reports(report, args.compare):
+            print(f"{phase:9} {label:48} {before:>9.2f} -> {after:>9.2f} ms ({delta:+.1f}%)")
+
+    output = Path(args.output) if args.output else REPORTS_DIR / f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"\nReport written to {output}")
@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+"""
+Synthetic data generator for production-scale profiling.
+
+Reuses the seed DEPARTMENTS and FORM_TEMPLATES to bulk-produce users, form
+templates with approver chains, requests and notifications that match the
+shapes the API writes (including current_actor_id / participant_ids / version).
+Documents are produced lazily batch by batch and written with insert_many,
+several batches in flight at once, so millions of rows need constant memory.
+
+    python generate_data.py --users 20000 --requests 2000000 \\
+        --status-mix in_progress=0.25,pending=0.05,approved=0.5,rejected=0.15,cancelled=0.05 \\
+        --chain-length 1-4 --max-age-days 730 --age-distribution exponential
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import uuid
+from datetime import datetime, timezone, timedelta
+from pathlib import Path
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+
+from migrations import ensure_indexes, rebuild_request_stats
+from seed import DEPARTMENTS, FORM_TEMPLATES
+from utils.helpers import hash_password
+from utils.request_numbers import allocate_request_numbers, format_request_number
+from utils.workflow import actor_fields
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+logger = logging.getLogger("generate_data")
+
+FIRST_NAMES = ["Maria", "Jose", "Ana", "Juan", "Carmen", "Pedro", "Rosa", "Miguel", "Elena", "Ramon",
+               "Lucia", "Carlos", "Sofia", "Diego", "Isabel", "Antonio", "Teresa", "Manuel", "Grace", "Mark"]
+LAST_NAMES = ["Santos", "Reyes", "Cruz", "Bautista", "Garcia", "Mendoza", "Torres", "Flores", "Ramos",
+              "Villanueva", "Aquino", "Navarro", "Lim", "Tan", "Gonzales", "Ocampo", "Dela Cruz", "Fernandez"]
+ROLE_MIX = [("requestor", 0.55), ("approver", 0.2), ("both", 0.2), ("manager", 0.05)]
+COMMENTS = ["Approved.", "Looks good.", "OK, proceed.", "", "Noted.", "Please expedite."]
+REJECT_COMMENTS = ["Budget not justified.", "Please revise and resubmit.", "Duplicate request.", "Out of policy."]
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, weight = part.split("=")
+        mix[name.strip()] = float(weight)
+    unknown = set(mix) - {"in_progress", "pending", "approved", "rejected", "cancelled"}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown statuses in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def parse_range(value):
+    low, _, high = value.partition("-")
+    return int(low), int(high or low)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--notifications-per-request", type=float, default=1.5,
+                        help="Average notifications per request")
+    parser.add_argument("--status-mix", type=parse_mix,
+                        default=parse_mix("in_progress=0.3,pending=0.05,approved=0.45,rejected=0.15,cancelled=0.05"))
+    parser.add_argument("--chain-length", type=parse_range, default=(1, 3),
+                        help="Approvers per template, e.g. 1-4")
+    parser.add_argument("--custodian-ratio", type=float, default=0.3,
+                        help="Share of templates that have a custodian step")
+    parser.add_argument("--max-age-days", type=int, default=365)
+    parser.add_argument("--age-distribution", choices=["uniform", "exponential"], default="exponential",
+                        help="exponential skews towards recent requests")
+    parser.add_argument("--batch-size", type=int, default=2000)
+    parser.add_argument("--parallel", type=int, default=4, help="insert_many batches in flight")
+    parser.add_argument("--seed", type=int, default=None, help="Random seed for reproducible datasets")
+    parser.add_argument("--drop", action="store_true",
+                        help="Drop users/departments/templates/requests/notifications first")
+    return parser.parse_args()
+
+
+class BatchWriteFailed(Exception):
+    pass
+
+
+class BatchWriter:
+    """Keeps up to ``parallel`` insert_many calls in flight; flush() raises if any document failed."""
+
+    def __init__(self, collection, parallel):
+        self.collection = collection
+        self.semaphore = asyncio.Semaphore(parallel)
+        self.tasks = set()
+        self.written = 0
+        self.failed = 0
+
+    async def _insert(self, docs):
+        try:
+            await self.collection.insert_many(docs, ordered=False)
+            self.written += len(docs)
+        except BulkWriteError as exc:
+            # Unordered: the rest of the batch was still inserted
+            inserted = exc.details.get("nInserted", 0)
+            self.written += inserted
+            self.failed += len(docs) - inserted
+            first = (exc.details.get("writeErrors") or [{}])[0]
+            logger.error(f"  {len(docs) - inserted} {self.collection.name} failed to insert: {first.get('errmsg')}")
+        except Exception as exc:
+            self.failed += len(docs)
+            logger.error(f"  {len(docs)} {self.collection.name} failed to insert: {exc}")
+        finally:
+            self.semaphore.release()
+
+    async def write(self, docs):
+        if not docs:
+            return
+        await self.semaphore.acquire()
+        task = asyncio.create_task(self._insert(docs))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def flush(self):
+        if self.tasks:
+            await asyncio.gather(*list(self.tasks))
+        if self.failed:
+            raise BatchWriteFailed(
+                f"{self.failed} {self.collection.name} failed to insert ({self.written} written)"
+            )
+
+
+def random_age(args):
+    if args.age_distribution == "uniform":
+        days = random.uniform(0, args.max_age_days)
+    else:
+        days = min(random.expovariate(4 / args.max_age_days), args.max_age_days)
+    return timedelta(days=days)
+
+
+async def ensure_departments(db, now):
+    existing = {d["code"]: d["id"] async for d in db.departments.find({}, {"_id": 0, "code": 1, "id": 1})}
+    missing = [
+        {"id": str(uuid.uuid4()), "name": d["name"], "code": d["code"], "description": d["description"],
+         "is_active": True, "created_at": now.isoformat()}
+        for d in DEPARTMENTS if d["code"] not in existing
+    ]
+    if missing:
+        await db.departments.insert_many(missing)
+        existing.update({d["code"]: d["id"] for d in missing})
+    return existing
+
+
+async def generate_users(db, args, dept_map, now):
+    run_id = uuid.uuid4().hex[:6]
+    # Hashing is deliberately slow; every synthetic user shares one password
+    password_hash = hash_password("pass123")
+    roles, weights = zip(*ROLE_MIX)
+    dept_codes = list(dept_map)
+    writer = BatchWriter(db.users, args.parallel)
+    users_by_dept = {code: {"approvers": [], "managers": [], "requestors": []} for code in dept_codes}
+    batch = []
+
+    for n in range(args.users):
+        code = dept_codes[n % len(dept_codes)]
+        # Guarantee at least one manager and one approver per department
+        if n < len(dept_codes):
+            role = "manager"
+        elif n < 2 * len(dept_codes):
+            role = "approver"
+        else:
+            role = random.choices(roles, weights)[0]
+        name = f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}"
+        doc = {
+            "id": str(uuid.uuid4()),
+            "email": f"user{n}.{run_id}@synthetic.local",
+            "password_hash": password_hash,
+            "name": name,
+            "role": role,
+            "department_id": dept_map[code],
+            "has_viewed_tutorial": True,
+            "is_active": random.random() > 0.02,
+            "created_at": (now - random_age(args)).isoformat(),
+        }
+        batch.append(doc)
+        summary = {"id": doc["id"], "name": name, "email": doc["email"]}
+        if role in ("approver", "both", "manager"):
+            users_by_dept[code]["approvers"].append(summary)
+        if role == "manager":
+            users_by_dept[code]["managers"].append(summary)
+        if role in ("requestor", "both", "manager"):
+            users_by_dept[code]["requestors"].append(summary)
+        if len(batch) >= args.batch_size:
+            await writer.write(batch)
+            batch = []
+
+    await writer.write(batch)
+    await writer.flush()
+    logger.info(f"  {writer.written} users written.")
+    return users_by_dept
+
+
+async def generate_templates(db, args, dept_map, users_by_dept, now):
+    templates = []
+    for code, forms in FORM_TEMPLATES.items():
+        if code not in dept_map:
+            continue
+        approvers = users_by_dept[code]["approvers"]
+        for form in forms:
+            chain_length = min(random.randint(*args.chain_length), len(approvers))
+            chain = [
+                {"step": idx + 1, "user_id": u["id"], "user_name": u["name"]}
+                for idx, u in enumerate(random.sample(approvers, chain_length))
+            ]
+            custodian = None
+            if random.random() < args.custodian_ratio:
+                u = random.choice(approvers)
+                custodian = {"user_id": u["id"], "user_name": u["name"]}
+            templates.append({
+                "id": str(uuid.uuid4()),
+                "department_id": dept_map[code],
+                "department_code": code,
+                "name": form["name"],
+                "description": "",
+                "fields": form["fields"],
+                "approver_chain": chain,
+                "custodian": custodian,
+                "is_active": True,
+                "created_at": now.isoformat(),
+            })
+    await db.form_templates.insert_many([{k: v for k, v in t.items() if k != "department_code"} for t in templates])
+    for t in templates:
+        t.pop("_id", None)
+    logger.info(f"  {len(templates)} form templates written.")
+    return templates
+
+
+def sample_form_data(fields):
+    data = {}
+    for f in fields:
+        if f["type"] == "number":
+            data[f["name"]] = str(random.randint(1, 500))
+        elif f["type"] == "date":
+            data[f["name"]] = (datetime.now(timezone.utc) + timedelta(days=random.randint(1, 60))).date().isoformat()
+        elif f["type"] == "select" and f.get("options"):
+            data[f["name"]] = random.choice(f["options"])
+        elif f["type"] in ("table", "dropzone"):
+            data[f["name"]] = None
+        else:
+            data[f["name"]] = f"Synthetic {f['label'].lower()} {random.randint(1, 9999)}"
+    return data
+
+
+def build_request(args, number, tmpl, requester, dept_id, status, now):
+    created = now - random_age(args)
+    chain = tmpl["approver_chain"]
+    custodian_tmpl = tmpl.get("custodian")
+    if status == "pending" and not custodian_tmpl:
+        status = "in_progress"
+    if not chain and status in ("in_progress", "rejected"):
+        status = "approved"
+
+    acted = created
+    approvals = []
+    current_step = 1 if chain else 0
+    if status == "in_progress":
+        stop_at = random.randint(1, len(chain))
+    elif status == "rejected":
+        stop_at = random.randint(1, len(chain))
+    elif status == "cancelled":
+        stop_at = random.randint(1, len(chain)) if chain else 0
+    else:
+        stop_at = len(chain) + 1
+
+    for a in chain:
+        if a["step"] < stop_at:
+            acted = acted + timedelta(hours=random.uniform(0.5, 72))
+            approvals.append({"step": a["step"], "approver_id": a["user_id"], "approver_name": a["user_name"],
+                              "status": "approved", "comments": random.choice(COMMENTS), "acted_at": acted.isoformat()})
+        elif a["step"] == stop_at and status == "rejected":
+            acted = acted + timedelta(hours=random.uniform(0.5, 72))
+            approvals.append({"step": a["step"], "approver_id": a["user_id"], "approver_name": a["user_name"],
+                              "status": "rejected", "comments": random.choice(REJECT_COMMENTS),
+                              "acted_at": acted.isoformat()})
+            current_step = a["step"]
+        elif a["step"] == stop_at and status in ("in_progress", "cancelled"):
+            approvals.append({"step": a["step"], "approver_id": a["user_id"], "approver_name": a["user_name"],
+                              "status": "pending", "comments": "", "acted_at": None})
+            current_step = a["step"]
+        else:
+            approvals.append({"step": a["step"], "approver_id": a["user_id"], "approver_name": a["user_name"],
+                              "status": "waiting", "comments": "", "acted_at": None})
+
+    custodian = None
+    if custodian_tmpl:
+        custodian = {"user_id": custodian_tmpl["user_id"], "user_name": custodian_tmpl["user_name"],
+                     "status": "waiting", "comments": "", "acted_at": None}
+        if status == "pending":
+            custodian["status"] = "pending"
+            current_step = len(chain) + 1
+        elif status == "approved":
+            acted = acted + timedelta(hours=random.uniform(0.5, 96))
+            custodian.update(status="fulfilled", comments=random.choice(COMMENTS), acted_at=acted.isoformat())
+            current_step = len(chain) + 1
+    elif status == "approved":
+        current_step = len(chain)
+
+    updated = acted if acted > created else created
+    if status == "cancelled":
+        updated = created + timedelta(hours=random.uniform(0.5, 48))
+
+    doc = {
+        "id": str(uuid.uuid4()),
+        "request_number": format_request_number(number),
+        "form_template_id": tmpl["id"],
+        "form_template_name": tmpl["name"],
+        "department_id": tmpl["department_id"],
+        "requester_id": requester["id"],
+        "requester_name": requester["name"],
+        "requester_department_id": dept_id,
+        "requester_email": requester["email"],
+        "title": tmpl["name"],
+        "form_data": sample_form_data(tmpl["fields"]),
+        "notes": "",
+        "status": status,
+        "current_approval_step": current_step,
+        "total_approval_steps": len(chain) + (1 if custodian else 0),
+        "approvals": approvals,
+        "custodian": custodian,
+        "version": 1 + sum(1 for a in approvals if a["acted_at"]) + (1 if status == "cancelled" else 0),
+        "created_at": created.isoformat(),
+        "updated_at": updated.isoformat(),
+    }
+    doc.update(actor_fields(doc))
+    return doc
+
+
+def build_notifications(args, req):
+    recipients = [req["requester_id"]]
+    if req["current_actor_id"]:
+        recipients.insert(0, req["current_actor_id"])
+    recipients.extend(a["approver_id"] for a in req["approvals"] if a["acted_at"])
+    count = max(0, int(random.gauss(args.notifications_per_request, 0.75) + 0.5))
+    notif_type = {
+        "in_progress": "approval_required",
+        "pending": "custodian_required",
+        "approved": "request_approved",
+        "rejected": "request_rejected",
+        "cancelled": "request_rejected",
+    }[req["status"]]
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": recipients[i % len(recipients)],
+            "request_id": req["id"],
+            "request_number": req["request_number"],
+            "message": f"Request '{req['title']}' was updated",
+            "type": notif_type if i == 0 else "request_completed",
+            "is_read": req["status"] not in ("in_progress", "pending") and random.random() < 0.8,
+            "created_at": req["updated_at"],
+        }
+        for i in range(count)
+    ]
+
+
+async def generate_requests(db, args, dept_map, users_by_dept, templates, now):
+    statuses, weights = zip(*args.status_mix.items())
+    start_number = await allocate_request_numbers(db, args.requests)
+    templates_by_dept = {}
+    for t in templates:
+        templates_by_dept.setdefault(t["department_code"], []).append(t)
+    requester_pool = [
+        (code, u) for code, users in users_by_dept.items() for u in users["requestors"]
+    ]
+
+    request_writer = BatchWriter(db.requests, args.parallel)
+    notif_writer = BatchWriter(db.notifications, args.parallel)
+    requests_batch, notif_batch = [], []
+
+    for n in range(args.requests):
+        code, requester = random.choice(requester_pool)
+        # Most requests go to the requester's own department
+        form_dept = code if random.random() < 0.7 or not templates_by_dept else random.choice(list(templates_by_dept))
+        tmpl = random.choice(templates_by_dept.get(form_dept) or templates)
+        req = build_request(args, start_number + n, tmpl, requester, dept_map[code],
+                            random.choices(statuses, weights)[0], now)
+        requests_batch.append(req)
+        notif_batch.extend(build_notifications(args, req))
+
+        if len(requests_batch) >= args.batch_size:
+            await request_writer.write(requests_batch)
+            requests_batch = []
+        if len(notif_batch) >= args.batch_size:
+            await notif_writer.write(notif_batch)
+            notif_batch = []
+        if (n + 1) % (args.batch_size * 50) == 0:
+            logger.info(f"  {n + 1} requests generated...")
+
+    await request_writer.write(requests_batch)
+    await notif_writer.write(notif_batch)
+    await request_writer.flush()
+    await notif_writer.flush()
+    logger.info(f"  {request_writer.written} requests and {notif_writer.written} notifications written.")
+
+
+async def main(args):
+    if args.seed is not None:
+        random.seed(args.seed)
+    client = AsyncIOMotorClient(os.environ['MONGO_URL'])
+    db = client[os.environ['DB_NAME']]
+    now = datetime.now(timezone.utc)
+
+    if args.drop:
+        for name in ("users", "departments", "form_templates", "requests", "notifications"):
+            await db.drop_collection(name)
+
+    logger.info("Generating synthetic dataset...")
+    dept_map = await ensure_departments(db, now)
+    users_by_dept = await generate_users(db, args, dept_map, now)
+    templates = await generate_templates(db, args, dept_map, users_by_dept, now)
+    await generate_requests(db, args, dept_map, users_by_dept, templates, now)
+
+    logger.info("Building indexes...")
+    await ensure_indexes(db)
+    logger.info("Rebuilding request stats...")
+    await rebuild_request_stats(db)
+    # Bulk-inserted notifications bypass the unread counters; they re-initialize on next read
+    await db.notification_counters.drop()
+    client.close()
+    logger.info("Done.")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    try:
+        asyncio.run(main(parse_args()))
+    except BatchWriteFailed as exc:
+        logger.error(f"Generation failed: {exc}")
+        sys.exit(1)
@@ -0,0 +1,298 @@
+import asyncio
+import os
+from datetime import datetime, timedelta, timezone
+
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError, OperationFailure
+from archive import ensure_archive_collection
+from utils.request_numbers import ensure_request_number_counter
+from utils.request_stats import bucket_id
+from utils.template_versions import save_template_version
+from utils.workflow import actor_fields
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKFILL_BATCH_SIZE = int(os.environ.get('BACKFILL_BATCH_SIZE', '500'))
+# Optional sleep between batches to limit load when backfilling a busy primary
+BACKFILL_PAUSE_SECONDS = float(os.environ.get('BACKFILL_PAUSE_SECONDS', '0'))
+BACKFILL_LEASE_SECONDS = 300
+
+
+async def ensure_indexes(db):
+    """Create every index the API relies on. Safe to run on each startup."""
+    await db.users.create_index("id", unique=True)
+    await db.users.create_index("email", unique=True)
+    await db.departments.create_index("id", unique=True)
+    await db.departments.create_index("code", unique=True)
+    await db.form_templates.create_index("id", unique=True)
+    await db.form_templates.create_index("department_id")
+    await db.form_template_versions.create_index("id", unique=True)
+    await db.form_template_versions.create_index([("template_id", 1), ("created_at", -1)])
+    await db.requests.create_index("id", unique=True)
+    await _create_request_number_index(db.requests)
+    await db.requests.create_index("requester_id")
+    await db.requests.create_index("department_id")
+    await db.requests.create_index("status")
+    await db.requests.create_index([("created_at", -1)])
+    await db.requests.create_index("updated_at")
+    await db.requests.create_index([("status", 1), ("updated_at", 1)])
+    await db.requests.create_index([("current_actor_id", 1), ("created_at", -1)])
+    await db.requests.create_index([("participant_ids", 1), ("created_at", -1)])
+    # Created here rather than on first archival so every instance converges on the same indexes
+    await ensure_archive_collection(db)
+    await db.requests_archive.create_index("id", unique=True)
+    await _create_request_number_index(db.requests_archive)
+    await db.requests_archive.create_index([("created_at", -1)])
+    await db.requests_archive.create_index("department_id")
+    await db.requests_archive.create_index([("participant_ids", 1), ("created_at", -1)])
+    await db.notifications.create_index("id", unique=True)
+    await db.notifications.create_index("user_id")
+    await db.notifications.create_index([("user_id", 1), ("is_read", 1)])
+    await db.notifications.create_index("created_at")
+    await db.email_digest_queue.create_index([("frequency", 1), ("user_id", 1), ("created_at", 1)])
+    await db.request_stats.create_index([("department_id", 1), ("month", 1)])
+
+
+async def _create_request_number_index(collection):
+    try:
+        await collection.create_index("request_number", unique=True)
+    except OperationFailure as exc:
+        # Numbers reused before the counter existed; keep serving and let an operator renumber them
+        logger.error(f"Duplicate request numbers in {collection.name}, not enforcing uniqueness: {exc}")
+
+
+class Backfill:
+    """
+    A resumable, batched fix for legacy documents.
+
+    ``query`` selects documents that still need the fix and ``build(db, docs)``
+    returns the ``$set`` for each ``_id`` in one batch. Updates repeat
+    ``query`` as a guard, so documents changed by live traffic in the
+    meantime are left alone and the fix can run while the API is serving.
+    """
+
+    def __init__(self, name: str, collection: str, query: dict, projection: dict, build):
+        self.name = name
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self.build = build
+
+    @property
+    def progress_id(self) -> str:
+        return f"{self.name}:{self.collection}"
+
+
+async def _build_actor_fields(db, docs):
+    return {doc["_id"]: actor_fields(doc) for doc in docs}
+
+
+async def _build_requester_department(db, docs):
+    requester_ids = list({doc["requester_id"] for doc in docs if doc.get("requester_id")})
+    users = await db.users.find(
+        {"id": {"$in": requester_ids}}, {"_id": 0, "id": 1, "department_id": 1}
+    ).to_list(len(requester_ids))
+    departments = {u["id"]: u.get("department_id") for u in users}
+    # Unknown requesters get None so the document stops matching the backfill
+    return {doc["_id"]: {"requester_department_id": departments.get(doc.get("requester_id"))} for doc in docs}
+
+
+async def _build_custodian(db, docs):
+    return {doc["_id"]: {"custodian": None} for doc in docs}
+
+
+async def _build_version(db, docs):
+    # Starts the optimistic-concurrency counter used by transition_guard
+    return {doc["_id"]: {"version": 1} for doc in docs}
+
+
+BACKFILLS = [
+    backfill
+    for collection in ("requests", "requests_archive")
+    for backfill in (
+        Backfill(
+            "request_actor_fields", collection,
+            {"participant_ids": {"$exists": False}},
+            {"_id": 1, "status": 1, "requester_id": 1, "current_approval_step": 1, "approvals": 1, "custodian": 1},
+            _build_actor_fields,
+        ),
+        Backfill(
+            "request_requester_department", collection,
+            {"requester_department_id": {"$exists": False}},
+            {"_id": 1, "requester_id": 1},
+            _build_requester_department,
+        ),
+        Backfill(
+            "request_custodian", collection,
+            {"custodian": {"$exists": False}},
+            {"_id": 1},
+            _build_custodian,
+        ),
+        Backfill(
+            "request_version", collection,
+            {"version": {"$exists": False}},
+            {"_id": 1},
+            _build_version,
+        ),
+    )
+]
+
+
+def _lease_until() -> str:
+    return (datetime.now(timezone.utc) + timedelta(seconds=BACKFILL_LEASE_SECONDS)).isoformat()
+
+
+async def run_backfill(db, backfill: Backfill) -> int:
+    """
+    Run one backfill to completion, resuming after the last processed ``_id``.
+
+    Progress lives in db.migrations. A lease keeps a second instance from
+    working on the same backfill; if the holder dies, the lease expires and
+    the next run picks up where it stopped.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        await db.migrations.update_one(
+            {
+                "_id": backfill.progress_id,
+                "status": {"$ne": "done"},
+                "$or": [{"lease_until": {"$exists": False}}, {"lease_until": {"$lt": now}}],
+            },
+            {
+                "$set": {"status": "running", "lease_until": _lease_until()},
+                "$setOnInsert": {"processed": 0, "last_id": None, "started_at": now},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # Already done, or another instance holds the lease
+        return 0
+
+    progress = await db.migrations.find_one({"_id": backfill.progress_id})
+    collection = db[backfill.collection]
+    last_id = progress.get("last_id")
+    processed = progress.get("processed", 0)
+    while True:
+        query = dict(backfill.query)
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await collection.find(query, backfill.projection).sort("_id", 1).limit(
+            BACKFILL_BATCH_SIZE
+        ).to_list(BACKFILL_BATCH_SIZE)
+        if not docs:
+            break
+
+        updates = await backfill.build(db, docs)
+        ops = [UpdateOne({"_id": _id, **backfill.query}, {"$set": fields}) for _id, fields in updates.items()]
+        if ops:
+            await collection.bulk_write(ops, ordered=False)
+        processed += len(ops)
+        last_id = docs[-1]["_id"]
+        await db.migrations.update_one(
+            {"_id": backfill.progress_id},
+            {"$set": {"last_id": last_id, "processed": processed, "lease_until": _lease_until()}},
+        )
+        if len(docs) < BACKFILL_BATCH_SIZE:
+            break
+        if BACKFILL_PAUSE_SECONDS:
+            await asyncio.sleep(BACKFILL_PAUSE_SECONDS)
+
+    await db.migrations.update_one(
+        {"_id": backfill.progress_id},
+        {
+            "$set": {"status": "done", "finished_at": datetime.now(timezone.utc).isoformat()},
+            "$unset": {"lease_until": ""},
+        },
+    )
+    if processed:
+        logger.info(f"Backfill {backfill.progress_id}: updated {processed} documents.")
+    return processed
+
+
+async def run_backfills(db):
+    for backfill in BACKFILLS:
+        await run_backfill(db, backfill)
+
+
+async def backfill_template_versions(db):
+    """
+    Snapshot templates that predate versioning and point their existing
+    requests at that snapshot (the closest record of the schema they used).
+    """
+    templates = await db.form_templates.find({"current_version_id": {"$exists": False}}, {"_id": 0}).to_list(None)
+    for tmpl in templates:
+        version_id = await save_template_version(tmpl, db)
+        await db.form_templates.update_one({"id": tmpl["id"]}, {"$set": {"current_version_id": version_id}})
+        for collection in (db.requests, db.requests_archive):
+            await collection.update_many(
+                {"form_template_id": tmpl["id"], "template_version_id": {"$exists": False}},
+                {"$set": {"template_version_id": version_id}},
+            )
+    if templates:
+        logger.info(f"Created versions for {len(templates)} templates.")
+
+
+async def rebuild_request_stats(db):
+    """
+    Recompute db.request_stats from the requests and requests_archive collections.
+
+    Buckets are built in a scratch collection and swapped in with a rename, so
+    readers never see a half-built collection. Increments that land while the
+    aggregation runs can be lost; the next rebuild picks them up.
+    """
+    pipeline = [
+        {"$group": {
+            "_id": {
+                "department_id": "$department_id",
+                "form_template_id": "$form_template_id",
+                "month": {"$substr": ["$created_at", 0, 7]},
+                "status": "$status",
+            },
+            "count": {"$sum": 1},
+            "form_template_name": {"$last": "$form_template_name"},
+        }},
+    ]
+    buckets = {}
+    for collection in (db.requests, db.requests_archive):
+        async for row in collection.aggregate(pipeline, allowDiskUse=True):
+            key = {
+                "department_id": row["_id"].get("department_id") or "",
+                "form_template_id": row["_id"].get("form_template_id") or "",
+                "month": row["_id"].get("month") or "",
+            }
+            bucket = buckets.setdefault(bucket_id(key), {
+                "_id": bucket_id(key), **key, "form_template_name": "", "total": 0, "by_status": {},
+            })
+            status = row["_id"]["status"]
+            bucket["total"] += row["count"]
+            bucket["by_status"][status] = bucket["by_status"].get(status, 0) + row["count"]
+            bucket["form_template_name"] = row.get("form_template_name") or bucket["form_template_name"]
+
+    scratch = db.request_stats_rebuild
+    await scratch.drop()
+    if buckets:
+        await scratch.insert_many(list(buckets.values()))
+        await scratch.rename("request_stats", dropTarget=True)
+    else:
+        await db.request_stats.drop()
+    logger.info(f"Rebuilt request stats: {len(buckets)} buckets.")
+    return len(buckets)
+
+
+async def ensure_request_stats(db):
+    """Populate request_stats the first time it is deployed."""
+    if await db.request_stats.estimated_document_count() > 0:
+        return
+    for collection in (db.requests, db.requests_archive):
+        if await collection.find_one({}, {"_id": 1}):
+            await rebuild_request_stats(db)
+            return
+
+
+async def run_migrations(db):
+    await ensure_indexes(db)
+    await run_backfills(db)
+    await backfill_template_versions(db)
+    await ensure_request_stats(db)
+    await ensure_request_number_counter(db)
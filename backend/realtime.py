@@ -1,18 +1,55 @@
-from typing import List, Optional
+from collections import deque
+from typing import Deque, Dict, List, Optional, Set, Tuple, Union
 from fastapi import WebSocket
 from redis.asyncio import Redis
 import asyncio
 import json
 import logging
 import os
+import time
 import uuid
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+from utils.metrics import REDIS_PUBLISH_DURATION, WEBSOCKET_FANOUT_DURATION, WEBSOCKET_FANOUT_RECIPIENTS
+
 logger = logging.getLogger(__name__)
 
+# Events kept for Last-Event-ID resume, and per-subscriber queue bound for stream clients
+EVENT_REPLAY_BUFFER = int(os.environ.get("EVENT_REPLAY_BUFFER", "1000"))
+SUBSCRIBER_QUEUE_SIZE = 256
+
+StreamEvent = Tuple[Optional[str], Optional[str], Optional[dict]]
+
+# /ws frame encodings a client can request as a websocket subprotocol, in
+# order of preference. Without one the connection gets JSON text frames.
+WS_ENCODINGS = ("msgpack", "json") if msgpack is not None else ("json",)
+
+
+def negotiate_encoding(offered: List[str]) -> Optional[str]:
+    for encoding in WS_ENCODINGS:
+        if encoding in offered:
+            return encoding
+    return None
+
+
+def encode_frame(encoding: str, message: dict) -> Union[str, bytes]:
+    if encoding == "msgpack":
+        return msgpack.packb(message, use_bin_type=True)
+    return json.dumps(message)
+
 
 class ConnectionManager:
     def __init__(self):
         self.active_connections: List[WebSocket] = []
+        self.connection_encodings: Dict[WebSocket, str] = {}
+        # Who each authenticated connection belongs to, to filter request patches
+        self.connection_users: Dict[WebSocket, dict] = {}
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.recent_events: Deque[StreamEvent] = deque(maxlen=EVENT_REPLAY_BUFFER)
         self.redis: Optional[Redis] = None
         self.pubsub = None
         self.listener_task: Optional[asyncio.Task] = None
@@ -50,6 +87,9 @@ class ConnectionManager:
             self.last_error = str(exc)
 
     async def shutdown(self):
+        for queue in list(self.subscribers):
+            self._close_subscriber(queue)
+
         if self.listener_task:
             self.listener_task.cancel()
             try:
@@ -75,23 +115,101 @@ class ConnectionManager:
         self.redis_connected = False
 
     async def connect(self, websocket: WebSocket):
-        await websocket.accept()
+        # permessage-deflate is negotiated by the ASGI server (uvicorn enables it by default)
+        encoding = negotiate_encoding(websocket.scope.get("subprotocols") or [])
+        await websocket.accept(subprotocol=encoding)
         self.active_connections.append(websocket)
+        self.connection_encodings[websocket] = encoding or "json"
+
+    def identify(self, websocket: WebSocket, user: dict):
+        """Attach the user who authenticated on this connection, so it receives their request patches."""
+        if websocket in self.active_connections:
+            self.connection_users[websocket] = {"id": user["id"], "role": user.get("role")}
 
     def disconnect(self, websocket: WebSocket):
         if websocket in self.active_connections:
             self.active_connections.remove(websocket)
+        self.connection_encodings.pop(websocket, None)
+        self.connection_users.pop(websocket, None)
 
-    async def _broadcast_local(self, event: str, payload: dict):
-        message = json.dumps({
-            "event": event,
-            "payload": payload
-        })
-        for ws in list(self.active_connections):
+    def subscribe(self, last_event_id: Optional[str] = None) -> Tuple[asyncio.Queue, Optional[List[StreamEvent]]]:
+        """
+        Register a stream consumer; every event delivered on this instance is put
+        on the returned queue as (event_id, event, payload). With ``last_event_id``
+        the events after it are returned for replay, or None if it has already
+        left the buffer (the client should refetch instead).
+        """
+        queue: asyncio.Queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        backlog: Optional[List[StreamEvent]] = []
+        if last_event_id:
+            ids = [item[0] for item in self.recent_events]
+            if last_event_id in ids:
+                backlog = list(self.recent_events)[ids.index(last_event_id) + 1:]
+            else:
+                backlog = None
+        self.subscribers.add(queue)
+        return queue, backlog
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def _close_subscriber(self, queue: asyncio.Queue):
+        """End a consumer's stream; the (None, None, None) sentinel tells it to stop."""
+        self.unsubscribe(queue)
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait((None, None, None))
+
+    def _publish_to_subscribers(self, item: StreamEvent):
+        self.recent_events.append(item)
+        for queue in list(self.subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                # Too slow to keep up; it resumes from the buffer on reconnect
+                self._close_subscriber(queue)
+
+    def _visible_deltas(self, ws: WebSocket, deltas: List[dict]) -> Tuple[int, ...]:
+        viewer = self.connection_users.get(ws)
+        if viewer is None:
+            return ()
+        if viewer["role"] == "super_admin":
+            return tuple(range(len(deltas)))
+        return tuple(i for i, delta in enumerate(deltas) if viewer["id"] in delta["participant_ids"])
+
+    async def _broadcast_local(
+        self, event: str, payload: dict, event_id: Optional[str] = None, deltas: Optional[List[dict]] = None
+    ):
+        started = time.perf_counter()
+        self._publish_to_subscribers((event_id or uuid.uuid4().hex, event, payload))
+        deltas = deltas or []
+        if deltas:
+            # Versions go to everyone; patches only to connections that can view the request
+            payload = {**payload, "versions": {d["request_id"]: d["version"] for d in deltas}}
+        # Each (encoding, visible patches) frame is built once and shared by its connections
+        frames: Dict[Tuple[str, Tuple[int, ...]], Union[str, bytes]] = {}
+        recipients = list(self.active_connections)
+        for ws in recipients:
+            encoding = self.connection_encodings.get(ws, "json")
+            visible = self._visible_deltas(ws, deltas) if deltas else ()
+            frame = frames.get((encoding, visible))
+            if frame is None:
+                frame_payload = payload
+                if deltas:
+                    frame_payload = {
+                        **payload,
+                        "patches": {deltas[i]["request_id"]: deltas[i]["patch"] for i in visible},
+                    }
+                frame = frames[(encoding, visible)] = encode_frame(encoding, {"event": event, "payload": frame_payload})
             try:
-                await ws.send_text(message)
+                if isinstance(frame, bytes):
+                    await ws.send_bytes(frame)
+                else:
+                    await ws.send_text(frame)
             except Exception:
                 self.disconnect(ws)
+        WEBSOCKET_FANOUT_DURATION.observe(time.perf_counter() - started)
+        WEBSOCKET_FANOUT_RECIPIENTS.observe(len(recipients))
 
     async def _listen_for_messages(self):
         try:
@@ -107,7 +225,9 @@ class ConnectionManager:
                     event_message = json.loads(raw_data)
                     await self._broadcast_local(
                         event_message["event"],
-                        event_message["payload"]
+                        event_message["payload"],
+                        event_message.get("event_id"),
+                        event_message.get("deltas"),
                     )
                 except Exception as exc:
                     logger.warning("Failed to process realtime message: %s", exc)
@@ -118,16 +238,26 @@ class ConnectionManager:
             self.last_error = str(exc)
             logger.exception("Redis realtime listener stopped unexpectedly: %s", exc)
 
-    async def broadcast(self, event: str, payload: dict):
+    async def broadcast(self, event: str, payload: dict, deltas: Optional[List[dict]] = None):
+        """
+        Send an event to every connection on every instance. ``deltas`` are
+        request patches (see utils.workflow.request_delta) added only for
+        connections whose user may view that request.
+        """
         event_message = {
             "event": event,
             "payload": payload,
             "instance_id": self.instance_id,
+            # Assigned by the publisher so every instance buffers the event under the same id
+            "event_id": uuid.uuid4().hex,
+            "deltas": deltas or [],
         }
 
         if self.redis:
             try:
+                started = time.perf_counter()
                 await self.redis.publish(self.redis_channel, json.dumps(event_message))
+                REDIS_PUBLISH_DURATION.observe(time.perf_counter() - started)
                 self.redis_connected = True
                 return
             except Exception as exc:
@@ -135,7 +265,7 @@ class ConnectionManager:
                 self.last_error = str(exc)
                 logger.warning("Redis publish failed, falling back to local broadcast: %s", exc)
 
-        await self._broadcast_local(event, payload)
+        await self._broadcast_local(event, payload, event_message["event_id"], event_message["deltas"])
 
     async def get_status(self):
         ping_ok = False
@@ -159,6 +289,11 @@ class ConnectionManager:
             "redis_channel": self.redis_channel if self.redis_enabled else None,
             "instance_id": self.instance_id,
             "active_connections": len(self.active_connections),
+            "connection_encodings": {
+                encoding: sum(1 for e in self.connection_encodings.values() if e == encoding)
+                for encoding in WS_ENCODINGS
+            },
+            "stream_subscribers": len(self.subscribers),
             "last_error": self.last_error,
             "ping_ok": ping_ok if self.redis_enabled else None,
         }
@@ -0,0 +1,91 @@
+from fastapi import APIRouter, Depends, Query
+from typing import Optional
+from utils.helpers import db, require_admin
+from utils.sla import approval_turnaround
+from migrations import rebuild_request_stats
+
+analytics_router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+
+def _add_counts(target: dict, bucket: dict):
+    target["total"] = target.get("total", 0) + bucket.get("total", 0)
+    by_status = target.setdefault("by_status", {})
+    for status, count in (bucket.get("by_status") or {}).items():
+        by_status[status] = by_status.get(status, 0) + count
+
+
+@analytics_router.get("/requests")
+async def request_analytics(
+    department_id: Optional[str] = None,
+    form_template_id: Optional[str] = None,
+    month_from: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    month_to: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}$"),
+    user=Depends(require_admin),
+):
+    """Request counts by department, template, month and status, read from db.request_stats."""
+    query = {}
+    if department_id:
+        query["department_id"] = department_id
+    if form_template_id:
+        query["form_template_id"] = form_template_id
+    if month_from or month_to:
+        query["month"] = {}
+        if month_from:
+            query["month"]["$gte"] = month_from
+        if month_to:
+            query["month"]["$lte"] = month_to
+
+    buckets = await db.request_stats.find(query, {"_id": 0}).to_list(None)
+    dept_names = {
+        d["id"]: d["name"]
+        for d in await db.departments.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    }
+
+    totals = {"total": 0, "by_status": {}}
+    by_department, by_template, by_month = {}, {}, {}
+    for bucket in buckets:
+        _add_counts(totals, bucket)
+        dept_id = bucket["department_id"]
+        _add_counts(by_department.setdefault(dept_id, {
+            "department_id": dept_id, "department_name": dept_names.get(dept_id, ""),
+        }), bucket)
+        tmpl_id = bucket["form_template_id"]
+        _add_counts(by_template.setdefault(tmpl_id, {
+            "form_template_id": tmpl_id,
+            "form_template_name": bucket.get("form_template_name", ""),
+            "department_id": dept_id,
+        }), bucket)
+        _add_counts(by_month.setdefault(bucket["month"], {"month": bucket["month"]}), bucket)
+
+    return {
+        "totals": totals,
+        "by_department": sorted(by_department.values(), key=lambda d: -d["total"]),
+        "by_template": sorted(by_template.values(), key=lambda t: -t["total"]),
+        "by_month": sorted(by_month.values(), key=lambda m: m["month"]),
+    }
+
+
+@analytics_router.post("/requests/rebuild")
+async def rebuild_request_analytics(user=Depends(require_admin)):
+    """Recompute the materialized counts from the requests collection."""
+    buckets = await rebuild_request_stats(db)
+    return {"buckets": buckets}
+
+
+@analytics_router.get("/sla")
+async def approval_sla(
+    group_by: str = Query("department", pattern="^(department|approver|step)$"),
+    department_id: Optional[str] = None,
+    since: Optional[str] = Query(None, pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    user=Depends(require_admin),
+):
+    """Approval turnaround percentiles (hours) and open-step backlog aging."""
+    rows = await approval_turnaround(group_by, department_id, since)
+    if group_by == "department":
+        dept_names = {
+            d["id"]: d["name"]
+            for d in await db.departments.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+        }
+        for row in rows:
+            row["department_name"] = dept_names.get(row["department_id"], "")
+    return {"group_by": group_by, "rows": rows}
@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, EmailStr
 from utils.helpers import db, hash_password, verify_password, create_token, get_current_user
+from utils.http_cache import conditional_response
 from fastapi import Depends
 import uuid
 from datetime import datetime, timezone
@@ -33,9 +34,9 @@ async def login(req: LoginRequest):
 
 
 @auth_router.get("/me")
-async def get_me(user=Depends(get_current_user)):
+async def get_me(request: Request, user=Depends(get_current_user)):
     safe_user = {k: v for k, v in user.items() if k != "password_hash"}
-    return safe_user
+    return conditional_response(request, safe_user)
 
 
 @auth_router.post("/tutorial/viewed")
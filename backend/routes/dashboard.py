@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends
 from utils.helpers import db, get_current_user
+from utils.unread_counts import get_unread_count
 
 dashboard_router = APIRouter(prefix="/dashboard", tags=["dashboard"])
 
@@ -10,43 +11,40 @@ async def get_dashboard_stats(user=Depends(get_current_user)):
     role = user["role"]
 
     if role == "super_admin":
-        total = await db.requests.count_documents({})
-        pending = await db.requests.count_documents({"status": {"$in": ["in_progress", "pending"]}})
-        approved = await db.requests.count_documents({"status": "approved"})
-        rejected = await db.requests.count_documents({"status": "rejected"})
-        cancelled = await db.requests.count_documents({"status": "cancelled"})
+        # Organisation-wide counts come from the materialized request_stats buckets
+        by_status = {}
+        total = 0
+        async for bucket in db.request_stats.find({}, {"_id": 0, "total": 1, "by_status": 1}):
+            total += bucket.get("total", 0)
+            for status, count in (bucket.get("by_status") or {}).items():
+                by_status[status] = by_status.get(status, 0) + count
+        pending = by_status.get("in_progress", 0) + by_status.get("pending", 0)
+        approved = by_status.get("approved", 0)
+        rejected = by_status.get("rejected", 0)
+        cancelled = by_status.get("cancelled", 0)
         total_users = await db.users.count_documents({})
         total_templates = await db.form_templates.count_documents({"is_active": True})
     else:
-        user_scope = {
-            "$or": [
-                {"requester_id": uid},
-                {"approvals": {"$elemMatch": {"approver_id": uid}}},
-            ]
-        }
-        total = await db.requests.count_documents(user_scope)
-        pending = await db.requests.count_documents({**user_scope, "status": {"$in": ["in_progress", "pending"]}})
-        approved = await db.requests.count_documents({**user_scope, "status": "approved"})
-        rejected = await db.requests.count_documents({**user_scope, "status": "rejected"})
-        cancelled = await db.requests.count_documents({**user_scope, "status": "cancelled"})
+        # Archived requests count too, matching the organisation-wide request_stats
+        pipeline = [
+            {"$match": {"participant_ids": uid}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+        ]
+        by_status = {}
+        for collection in (db.requests, db.requests_archive):
+            async for row in collection.aggregate(pipeline):
+                by_status[row["_id"]] = by_status.get(row["_id"], 0) + row["count"]
+        total = sum(by_status.values())
+        pending = by_status.get("in_progress", 0) + by_status.get("pending", 0)
+        approved = by_status.get("approved", 0)
+        rejected = by_status.get("rejected", 0)
+        cancelled = by_status.get("cancelled", 0)
         total_users = 0
         total_templates = 0
 
-    my_pending_approvals = await db.requests.count_documents({
-        "$or": [
-            {
-                "approvals": {"$elemMatch": {"approver_id": uid, "status": "pending"}},
-                "status": "in_progress"
-            },
-            {
-                "custodian.user_id": uid,
-                "custodian.status": "pending",
-                "status": "pending"
-            },
-        ]
-    })
+    my_pending_approvals = await db.requests.count_documents({"current_actor_id": uid})
 
-    unread_notifs = await db.notifications.count_documents({"user_id": uid, "is_read": False})
+    unread_notifs = await get_unread_count(uid)
 
     return {
         "total_requests": total,
@@ -1,7 +1,9 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import Optional
 from utils.helpers import db, require_admin, get_current_user
+from utils.http_cache import REFERENCE_DATA, conditional_response
+from utils.user_directory import invalidate_department_map
 import uuid
 from datetime import datetime, timezone
 
@@ -22,9 +24,9 @@ class DepartmentUpdate(BaseModel):
 
 
 @departments_router.get("")
-async def list_departments(user=Depends(get_current_user)):
+async def list_departments(request: Request, user=Depends(get_current_user)):
     depts = await db.departments.find({"is_active": True}, {"_id": 0}).to_list(100)
-    return depts
+    return conditional_response(request, depts, REFERENCE_DATA)
 
 
 @departments_router.get("/all")
@@ -47,6 +49,7 @@ async def create_department(req: DepartmentCreate, admin=Depends(require_admin))
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.departments.insert_one(dept)
+    invalidate_department_map()
     return {k: v for k, v in dept.items() if k != "_id"}
 
 
@@ -66,6 +69,7 @@ async def update_department(dept_id: str, req: DepartmentUpdate, admin=Depends(r
     result = await db.departments.update_one({"id": dept_id}, {"$set": updates})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Department not found")
+    invalidate_department_map()
     dept = await db.departments.find_one({"id": dept_id}, {"_id": 0})
     return dept
 
@@ -93,5 +97,6 @@ async def delete_department(dept_id: str, admin=Depends(require_admin)):
     result = await db.departments.delete_one({"id": dept_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Department not found")
+    invalidate_department_map()
 
     return {"message": "Department deleted"}
@@ -1,7 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, Request
 from pydantic import BaseModel
 from typing import Optional, List
 from utils.helpers import db, require_admin, get_current_user
+from utils.http_cache import IMMUTABLE, conditional_response
+from utils.template_versions import get_template_version as load_template_version, save_template_version
+from pymongo import ReturnDocument
 import uuid
 from datetime import datetime, timezone
 
@@ -52,6 +55,7 @@ class TemplateUpdate(BaseModel):
 
 @templates_router.get("")
 async def list_templates(
+    request: Request,
     department_id: Optional[str] = None,
     user=Depends(get_current_user)
 ):
@@ -59,7 +63,7 @@ async def list_templates(
     if department_id:
         query["department_id"] = department_id
     templates = await db.form_templates.find(query, {"_id": 0}).to_list(500)
-    return templates
+    return conditional_response(request, templates)
 
 
 @templates_router.get("/all")
@@ -68,12 +72,35 @@ async def list_all_templates(admin=Depends(require_admin)):
     return templates
 
 
+@templates_router.get("/versions/{version_id}")
+async def get_template_version(version_id: str, request: Request, user=Depends(get_current_user)):
+    """A template snapshot. Versions never change, so clients may cache them forever."""
+    version = await load_template_version(version_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Template version not found")
+    return conditional_response(request, version, IMMUTABLE, etag_key=version["id"])
+
+
+@templates_router.get("/{template_id}/versions")
+async def list_template_versions(template_id: str, request: Request, user=Depends(get_current_user)):
+    versions = await db.form_template_versions.find(
+        {"template_id": template_id}, {"_id": 0, "id": 1, "name": 1, "created_at": 1}
+    ).sort("created_at", -1).to_list(None)
+    return conditional_response(request, versions)
+
+
 @templates_router.get("/{template_id}")
-async def get_template(template_id: str, user=Depends(get_current_user)):
+async def get_template(template_id: str, request: Request, user=Depends(get_current_user)):
     tmpl = await db.form_templates.find_one({"id": template_id}, {"_id": 0})
     if not tmpl:
         raise HTTPException(status_code=404, detail="Template not found")
-    return tmpl
+    modified_at = tmpl.get("updated_at") or tmpl.get("created_at")
+    return conditional_response(
+        request,
+        tmpl,
+        etag_key=f"{tmpl['id']}:{tmpl.get('current_version_id')}:{modified_at or ''}",
+        last_modified=modified_at,
+    )
 
 
 @templates_router.post("", status_code=201)
@@ -92,6 +119,7 @@ async def create_template(req: TemplateCreate, admin=Depends(require_admin)):
         "is_active": True,
         "created_at": datetime.now(timezone.utc).isoformat()
     }
+    tmpl["current_version_id"] = await save_template_version(tmpl)
     await db.form_templates.insert_one(tmpl)
     return {k: v for k, v in tmpl.items() if k != "_id"}
 
@@ -111,11 +139,23 @@ async def update_template(template_id: str, req: TemplateUpdate, admin=Depends(r
             updates[k] = v
     if not updates:
         raise HTTPException(status_code=400, detail="No fields to update")
-    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
-    result = await db.form_templates.update_one({"id": template_id}, {"$set": updates})
-    if result.matched_count == 0:
+    current = await db.form_templates.find_one({"id": template_id}, {"_id": 0})
+    if not current:
         raise HTTPException(status_code=404, detail="Template not found")
-    tmpl = await db.form_templates.find_one({"id": template_id}, {"_id": 0})
+    # Snapshot first so the fields and current_version_id change in one write
+    updates["current_version_id"] = await save_template_version({**current, **updates})
+    updates["updated_at"] = datetime.now(timezone.utc).isoformat()
+    tmpl = await db.form_templates.find_one_and_update(
+        {"id": template_id, "current_version_id": current.get("current_version_id")},
+        {"$set": updates},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not tmpl:
+        raise HTTPException(
+            status_code=409,
+            detail="This form was changed by someone else. Please refresh and try again.",
+        )
     return tmpl
 
 
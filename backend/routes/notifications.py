@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, Query
-from utils.helpers import db, get_current_user
+from fastapi import APIRouter, Depends, Header, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from utils.helpers import STREAM_TOKEN_TTL_SECONDS, create_stream_token, db, get_current_user, get_stream_user
+from utils.responses import FastJSONResponse
+from utils.unread_counts import adjust_unread_count, get_unread_count
+import asyncio
+import json
+import os
 import uuid
 from datetime import datetime, timezone
 from realtime import manager
 
 notifications_router = APIRouter(prefix="/notifications", tags=["notifications"])
 
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', '15'))
+STREAM_RETRY_MS = 3000
 
-@notifications_router.get("")
+
+@notifications_router.get("", response_class=FastJSONResponse)
 async def list_notifications(
     unread_only: bool = False,
     page: int = Query(1, ge=1),
@@ -15,45 +25,110 @@ async def list_notifications(
     user=Depends(get_current_user)
 ):
     query = {"user_id": user["id"]}
+    unread_count = await get_unread_count(user["id"])
     if unread_only:
         query["is_read"] = False
-    total = await db.notifications.count_documents(query)
-    unread_count = await db.notifications.count_documents({"user_id": user["id"], "is_read": False})
+        total = unread_count
+    else:
+        total = await db.notifications.count_documents(query)
     skip = (page - 1) * limit
     notifs = await db.notifications.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    return {"items": notifs, "total": total, "unread_count": unread_count, "page": page}
+    return FastJSONResponse({"items": notifs, "total": total, "unread_count": unread_count, "page": page})
+
+
+def _sse(event_id: str, event: str, payload: dict) -> str:
+    # Same {"event", "payload"} message as /ws, so clients share one handler
+    return f"id: {event_id}\ndata: {json.dumps({'event': event, 'payload': payload})}\n\n"
+
+
+async def _notification_events(user_id: str, last_event_id: Optional[str]):
+    queue, backlog = manager.subscribe(last_event_id)
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        if backlog is None:
+            # The missed events are gone from the buffer; the client must refetch
+            yield "event: resync\ndata: {}\n\n"
+        for event_id, event, payload in backlog or []:
+            if payload.get("user_id") == user_id:
+                yield _sse(event_id, event, payload)
+        while True:
+            try:
+                event_id, event, payload = await asyncio.wait_for(queue.get(), STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                # Comment line: keeps proxies from timing out an idle stream
+                yield ": keep-alive\n\n"
+                continue
+            if event_id is None:
+                break
+            if payload.get("user_id") == user_id:
+                yield _sse(event_id, event, payload)
+    finally:
+        manager.unsubscribe(queue)
+
+
+@notifications_router.post("/stream-token")
+async def issue_stream_token(user=Depends(get_current_user)):
+    """Short-lived token for ``/stream?token=``, so the session token never goes in a URL."""
+    return {"token": create_stream_token(user["id"]), "expires_in": STREAM_TOKEN_TTL_SECONDS}
+
+
+@notifications_router.get("/stream")
+async def stream_notifications(
+    last_event_id: Optional[str] = Query(None),
+    last_event_id_header: Optional[str] = Header(None, alias="Last-Event-ID"),
+    user=Depends(get_stream_user),
+):
+    """
+    Server-Sent Events feed of the user's notification events, for clients
+    whose proxies break the /ws websocket. Reconnects resume after the
+    Last-Event-ID header (or ``last_event_id``); a ``resync`` event means
+    events were missed and the notification list should be refetched.
+    """
+    return StreamingResponse(
+        _notification_events(user["id"], last_event_id_header or last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @notifications_router.post("/{notification_id}/read")
 async def mark_read(notification_id: str, user=Depends(get_current_user)):
-    await db.notifications.update_one(
-        {"id": notification_id, "user_id": user["id"]},
+    result = await db.notifications.update_one(
+        {"id": notification_id, "user_id": user["id"], "is_read": False},
         {"$set": {"is_read": True}}
     )
+    if result.modified_count:
+        unread_count = await adjust_unread_count(user["id"], -1)
+    else:
+        unread_count = await get_unread_count(user["id"])
 
     await manager.broadcast(
         event="NOTIFICATION_READ",
         payload={
             "user_id": user["id"],
-            "notification_id": notification_id
+            "notification_id": notification_id,
+            "unread_count": unread_count,
         }
     )
 
-    return {"message": "Marked as read"}
+    return {"message": "Marked as read", "unread_count": unread_count}
 
 
 @notifications_router.post("/read-all")
 async def mark_all_read(user=Depends(get_current_user)):
-    await db.notifications.update_many(
+    result = await db.notifications.update_many(
         {"user_id": user["id"], "is_read": False},
         {"$set": {"is_read": True}}
     )
+    # Decrement rather than reset, so notifications delivered meanwhile still count
+    unread_count = await adjust_unread_count(user["id"], -result.modified_count)
 
     await manager.broadcast(
         event="NOTIFICATIONS_CLEARED",
         payload={
-            "user_id": user["id"]
+            "user_id": user["id"],
+            "unread_count": unread_count,
         }
     )
 
-    return {"message": "All notifications marked as read"}
+    return {"message": "All notifications marked as read", "unread_count": unread_count}
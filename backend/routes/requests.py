@@ -1,13 +1,32 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from pydantic import BaseModel
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from typing import Optional, List
-from utils.helpers import db, get_current_user, send_email_notification
+from utils.helpers import db, get_current_user
+from utils.http_cache import conditional_response
+from utils.responses import FastJSONResponse
+from utils.form_validation import validate_form_data
+from utils.template_versions import get_template_version, save_template_version
+from utils.export import EXPORT_BATCH_SIZE, Workbook, form_columns, stream_csv, stream_xlsx
+from utils.user_directory import get_department_managers, get_department_map, get_users_by_ids
+from utils.notifications import deliver_notifications, notice
+from utils.request_numbers import allocate_request_numbers, format_request_number
+from utils.request_stats import record_created, record_transitions
+from utils.workflow import actor_fields, can_view_request, participant_ids, request_delta, transition_guard
+from pymongo import ReturnDocument, UpdateOne
+import asyncio
 import uuid
 from datetime import datetime, timezone
 from realtime import manager
 
 requests_router = APIRouter(prefix="/requests", tags=["requests"])
 
+_EXPORT_PROJECTION = {
+    "_id": 0, "id": 1, "request_number": 1, "form_template_name": 1, "department_id": 1, "status": 1,
+    "requester_name": 1, "requester_email": 1, "created_at": 1, "updated_at": 1,
+    "approvals": 1, "custodian": 1, "notes": 1, "form_data": 1,
+}
+
 
 class RequestCreate(BaseModel):
     form_template_id: str
@@ -22,18 +41,75 @@ class RequestAction(BaseModel):
     comments: Optional[str] = ""
 
 
-@requests_router.get("")
-async def list_requests(
+class BulkRequestAction(BaseModel):
+    request_ids: List[str] = Field(..., min_length=1, max_length=500)
+    action: str  # approve, reject
+    comments: Optional[str] = ""
+
+
+async def _apply_transition(req: dict, updates: dict) -> dict:
+    """
+    Write a state transition in one round trip, only if the request is still in
+    the state it was read in, and return the updated document.
+    """
+    if "participant_ids" not in req:
+        # Fill in what the request_actor_fields backfill would, so list scoping finds it
+        updates = {**updates, "participant_ids": participant_ids(req)}
+    updated = await db.requests.find_one_and_update(
+        transition_guard(req),
+        {"$set": updates, "$inc": {"version": 1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not updated:
+        raise HTTPException(
+            status_code=409,
+            detail="This request was changed by someone else. Please refresh and try again.",
+        )
+    await record_transitions([(req, updated["status"])])
+    return updated
+
+
+async def _merge_newest_first(cursors):
+    """
+    Merge cursors that are each sorted by created_at descending into one stream.
+
+    A request being archived can be read from both collections; the copies
+    share a created_at, so only ids seen at the current created_at are kept
+    to drop the second one.
+    """
+    iterators = [cursor.__aiter__() for cursor in cursors]
+    heads = {}
+    for i, iterator in enumerate(iterators):
+        doc = await anext(iterator, None)
+        if doc is not None:
+            heads[i] = doc
+    created_at, seen = None, set()
+    while heads:
+        i = max(heads, key=lambda k: heads[k].get("created_at") or "")
+        head = heads[i]
+        if head.get("created_at") != created_at:
+            created_at, seen = head.get("created_at"), set()
+        if head.get("id") not in seen:
+            seen.add(head.get("id"))
+            yield head
+        doc = await anext(iterators[i], None)
+        if doc is None:
+            del heads[i]
+        else:
+            heads[i] = doc
+
+
+def _build_list_query(
+    user: dict,
     status: Optional[str] = None,
     department_id: Optional[str] = None,
+    form_template_id: Optional[str] = None,
     my_requests: Optional[bool] = False,
     my_approvals: Optional[bool] = False,
     search: Optional[str] = None,
-    offset: int = Query(0, ge=0),
-    page: int = Query(1, ge=1),
-    limit: int = Query(50, ge=1, le=200),
-    user=Depends(get_current_user)
-):
+) -> dict:
+    """Filters and per-user scoping shared by the request list and export."""
     query = {}
     if status:
         if status == "pending":
@@ -42,25 +118,12 @@ async def list_requests(
             query["status"] = status
     if department_id:
         query["department_id"] = department_id
+    if form_template_id:
+        query["form_template_id"] = form_template_id
     if my_requests:
         query["requester_id"] = user["id"]
     if my_approvals:
-        query["$or"] = [
-            {
-                "approvals": {
-                    "$elemMatch": {
-                        "approver_id": user["id"],
-                        "status": "pending"
-                    }
-                },
-                "status": "in_progress",
-            },
-            {
-                "custodian.user_id": user["id"],
-                "custodian.status": "pending",
-                "status": "pending",
-            },
-        ]
+        query["current_actor_id"] = user["id"]
 
     if search:
         escaped_search = search.strip()
@@ -77,43 +140,157 @@ async def list_requests(
     # Non-super-admin: restrict to user-related requests (their requests + any request they're in the approval chain)
     role = user.get("role", "")
     if role != "super_admin":
-        user_scope = {
-            "$or": [
-                {"requester_id": user["id"]},
-                {"approvals": {"$elemMatch": {"approver_id": user["id"]}}},
-                {"custodian.user_id": user["id"]},
-            ]
-        }
+        user_scope = {"participant_ids": user["id"]}
         query = {"$and": [query, user_scope]} if query else user_scope
+    return query
 
-    total = await db.requests.count_documents(query)
+
+@requests_router.get("", response_class=FastJSONResponse)
+async def list_requests(
+    status: Optional[str] = None,
+    department_id: Optional[str] = None,
+    form_template_id: Optional[str] = None,
+    my_requests: Optional[bool] = False,
+    my_approvals: Optional[bool] = False,
+    search: Optional[str] = None,
+    include_archived: bool = False,
+    offset: int = Query(0, ge=0),
+    page: int = Query(1, ge=1),
+    limit: int = Query(50, ge=1, le=200),
+    user=Depends(get_current_user)
+):
+    """
+    Requests matching the filters, newest first. Closed requests moved to
+    requests_archive are left out unless ``include_archived`` is set.
+    """
+    query = _build_list_query(user, status, department_id, form_template_id, my_requests, my_approvals, search)
     skip = offset if offset else (page - 1) * limit
+
+    if include_archived:
+        total_active, total_archived = await asyncio.gather(
+            db.requests.count_documents(query), db.requests_archive.count_documents(query)
+        )
+        total = total_active + total_archived
+        # Each collection contributes at most skip + limit rows to the merged page
+        cursors = [
+            collection.find(query, {"_id": 0}).sort("created_at", -1).limit(skip + limit)
+            for collection in (db.requests, db.requests_archive)
+        ]
+        reqs = []
+        async for req in _merge_newest_first(cursors):
+            if len(reqs) == skip + limit:
+                break
+            reqs.append(req)
+        reqs = reqs[skip:]
+        return FastJSONResponse({"items": reqs, "total": total, "page": page, "limit": limit, "offset": skip})
+
+    total = await db.requests.count_documents(query)
     reqs = await db.requests.find(query, {"_id": 0}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
 
-    return {"items": reqs, "total": total, "page": page, "limit": limit, "offset": skip}
+    return FastJSONResponse({"items": reqs, "total": total, "page": page, "limit": limit, "offset": skip})
 
 
-@requests_router.get("/{request_id}")
-async def get_request(request_id: str, user=Depends(get_current_user)):
+@requests_router.get("/export")
+async def export_requests(
+    format: str = Query("csv", pattern="^(csv|xlsx)$"),
+    status: Optional[str] = None,
+    department_id: Optional[str] = None,
+    form_template_id: Optional[str] = None,
+    my_requests: Optional[bool] = False,
+    my_approvals: Optional[bool] = False,
+    search: Optional[str] = None,
+    include_archived: bool = False,
+    user=Depends(get_current_user)
+):
+    """Stream every request matching the list filters as CSV or XLSX, one column per form field."""
+    if format == "xlsx" and Workbook is None:
+        raise HTTPException(status_code=400, detail="XLSX export is not available on this server; use CSV")
+    query = _build_list_query(user, status, department_id, form_template_id, my_requests, my_approvals, search)
+    collections = [db.requests, db.requests_archive] if include_archived else [db.requests]
+
+    if form_template_id:
+        template_ids = [form_template_id]
+    else:
+        template_ids = list({
+            tid for collection in collections for tid in await collection.distinct("form_template_id", query)
+        })
+    templates = await db.form_templates.find(
+        {"id": {"$in": template_ids}}, {"_id": 0, "fields": 1}
+    ).sort("name", 1).to_list(None)
+    dept_names = {
+        d["id"]: d["name"]
+        for d in await db.departments.find({}, {"_id": 0, "id": 1, "name": 1}).to_list(None)
+    }
+    cursor = _merge_newest_first([
+        collection.find(query, _EXPORT_PROJECTION).sort("created_at", -1).batch_size(EXPORT_BATCH_SIZE)
+        for collection in collections
+    ])
+
+    filename = f"requests-{datetime.now(timezone.utc):%Y%m%d-%H%M%S}.{format}"
+    if format == "xlsx":
+        body = stream_xlsx(cursor, form_columns(templates), dept_names)
+        media_type = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    else:
+        body = stream_csv(cursor, form_columns(templates), dept_names)
+        media_type = "text/csv; charset=utf-8"
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+async def _find_visible_request(request_id: str, user: dict) -> dict:
     req = await db.requests.find_one({"id": request_id}, {"_id": 0})
+    if not req:
+        # Closed requests are moved out of the hot collection by archive.py
+        req = await db.requests_archive.find_one({"id": request_id}, {"_id": 0})
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
     # Non-super-admin can only view requests they created or are in the approval chain
-    if user.get("role") != "super_admin":
-        uid = user["id"]
-        is_requester = req.get("requester_id") == uid
-        is_approver = any(a.get("approver_id") == uid for a in req.get("approvals", []))
-        is_custodian = req.get("custodian", {}).get("user_id") == uid
-        if not is_requester and not is_approver and not is_custodian:
-            raise HTTPException(status_code=403, detail="You do not have access to this request")
-    # Populate requester_department_id for older requests that don't have it
-    if "requester_department_id" not in req and req.get("requester_id"):
-        requester = await db.users.find_one({"id": req["requester_id"]}, {"department_id": 1})
-        if requester and requester.get("department_id"):
-            req["requester_department_id"] = requester["department_id"]
+    if user.get("role") != "super_admin" and not can_view_request(req, user["id"]):
+        raise HTTPException(status_code=403, detail="You do not have access to this request")
     return req
 
 
+@requests_router.get("/{request_id}/bundle")
+async def get_request_bundle(request_id: str, request: Request, user=Depends(get_current_user)):
+    """
+    Everything the request detail view needs in one response: the request,
+    the template version it was created against, participant profiles and
+    the departments involved. Lookups run concurrently and mostly hit caches.
+    """
+    req = await _find_visible_request(request_id, user)
+    version, profiles, departments = await asyncio.gather(
+        get_template_version(req.get("template_version_id")),
+        get_users_by_ids(participant_ids(req)),
+        get_department_map(),
+    )
+    participants = {
+        uid: {k: profile.get(k) for k in ("id", "name", "role", "department_id", "is_active")}
+        for uid, profile in profiles.items()
+    }
+    dept_ids = {req.get("department_id"), req.get("requester_department_id")}
+    return conditional_response(request, {
+        "request": req,
+        "template_version": version,
+        "participants": participants,
+        "departments": {d: departments[d] for d in dept_ids if d in departments},
+    })
+
+
+@requests_router.get("/{request_id}")
+async def get_request(request_id: str, request: Request, user=Depends(get_current_user)):
+    req = await _find_visible_request(request_id, user)
+    # version and template_version_id also change on writes that leave updated_at alone (backfills)
+    return conditional_response(
+        request,
+        req,
+        etag_key=f"{req['id']}:{req.get('version')}:{req.get('template_version_id')}:{req.get('updated_at', '')}",
+        last_modified=req.get("updated_at"),
+    )
+
+
 @requests_router.post("", status_code=201)
 async def create_request(req: RequestCreate, user=Depends(get_current_user)):
     role = user.get("role", "")
@@ -122,10 +299,11 @@ async def create_request(req: RequestCreate, user=Depends(get_current_user)):
     tmpl = await db.form_templates.find_one({"id": req.form_template_id, "is_active": True}, {"_id": 0})
     if not tmpl:
         raise HTTPException(status_code=400, detail="Form template not found or inactive")
+    validate_form_data(tmpl, req.form_data)
+    template_version_id = tmpl.get("current_version_id") or await save_template_version(tmpl)
     display_title = tmpl["name"]
 
-    count = await db.requests.count_documents({})
-    request_number = f"REQ-{count + 1:05d}"
+    request_number = format_request_number(await allocate_request_numbers(db))
 
     approvals = []
     requester_dept_id = user.get("department_id", "")
@@ -133,7 +311,18 @@ async def create_request(req: RequestCreate, user=Depends(get_current_user)):
     next_step_number = 1
     custodian_doc = None
 
-    for step in tmpl.get("approver_chain", []):
+    # Resolve every user the chain references up front: one $in query plus the cached manager map
+    approver_chain = tmpl.get("approver_chain", [])
+    tmpl_custodian = tmpl.get("custodian")
+    chain_users = await get_users_by_ids(
+        [step["user_id"] for step in approver_chain if step["user_id"] != "immediate_manager"]
+        + [(tmpl_custodian or {}).get("user_id")]
+    )
+    department_managers = {}
+    if any(step["user_id"] == "immediate_manager" for step in approver_chain):
+        department_managers = await get_department_managers()
+
+    for step in approver_chain:
         approver_id = step["user_id"]
         approver_name = step.get("user_name", "")
 
@@ -143,10 +332,7 @@ async def create_request(req: RequestCreate, user=Depends(get_current_user)):
                     status_code=400,
                     detail="Requestor has no department assigned. Immediate Manager requires the requestor to have a department."
                 )
-            manager_user = await db.users.find_one(
-                {"role": "manager", "department_id": requester_dept_id, "is_active": True},
-                {"_id": 0}
-            )
+            manager_user = department_managers.get(requester_dept_id)
             if not manager_user:
                 raise HTTPException(
                     status_code=400,
@@ -154,6 +340,7 @@ async def create_request(req: RequestCreate, user=Depends(get_current_user)):
                 )
             approver_id = manager_user["id"]
             approver_name = manager_user.get("name", "Immediate Manager")
+            chain_users[approver_id] = manager_user
 
         # Skip duplicate approvers so each user only appears once in the chain
         if approver_id in seen_approver_ids:
@@ -172,13 +359,9 @@ async def create_request(req: RequestCreate, user=Depends(get_current_user)):
 
         next_step_number += 1
 
-    tmpl_custodian = tmpl.get("custodian")
     if tmpl_custodian and tmpl_custodian.get("user_id"):
-        custodian_user = await db.users.find_one(
-            {"id": tmpl_custodian["user_id"], "is_active": True},
-            {"_id": 0},
-        )
-        if not custodian_user:
+        custodian_user = chain_users.get(tmpl_custodian["user_id"])
+        if not custodian_user or not custodian_user.get("is_active", True):
             raise HTTPException(
                 status_code=400,
                 detail="The assigned custodian for this form is not available. Please update the form custodian.",
@@ -207,6 +390,7 @@ async def create_request(req: RequestCreate, user=Depends(get_current_user)):
         "request_number": request_number,
         "form_template_id": req.form_template_id,
         "form_template_name": tmpl["name"],
+        "template_version_id": template_version_id,
         "department_id": tmpl["department_id"],
         "requester_id": user["id"],
         "requester_name": user["name"],
@@ -220,67 +404,40 @@ async def create_request(req: RequestCreate, user=Depends(get_current_user)):
         "total_approval_steps": total_steps,
         "approvals": approvals,
         "custodian": custodian_doc,
+        "version": 1,
         "created_at": datetime.now(timezone.utc).isoformat(),
         "updated_at": datetime.now(timezone.utc).isoformat()
     }
+    request_doc.update(actor_fields(request_doc))
 
     await db.requests.insert_one(request_doc)
+    await record_created(request_doc)
     result = {k: v for k, v in request_doc.items() if k != "_id"}
 
-    # Notify first approver or custodian
+    # Notify first approver or custodian, reusing the users resolved above
     if approvals:
-        first_approver = await db.users.find_one({"id": approvals[0]["approver_id"]}, {"_id": 0})
+        first_approver = chain_users.get(approvals[0]["approver_id"])
         if first_approver:
-            notif = {
-                "id": str(uuid.uuid4()),
-                "user_id": first_approver["id"],
-                "request_id": result["id"],
-                "request_number": request_number,
-                "message": f"New request '{display_title}' from {user['name']} requires your approval",
-                "type": "approval_required",
-                "is_read": False,
-                "created_at": datetime.now(timezone.utc).isoformat()
-            }
-            await db.notifications.insert_one(notif)
-            await send_email_notification(
-                first_approver.get("email", ""),
+            await deliver_notifications([notice(
+                first_approver["id"],
+                result,
+                f"New request '{display_title}' from {user['name']} requires your approval",
+                "approval_required",
                 f"Approval Required: {request_number} - {display_title}",
-                f"<h3>New Request Pending Your Approval</h3><p><b>{request_number}</b> - {display_title}</p><p>From: {user['name']}</p><p>Please log in to review and approve.</p>"
-            )
-            await manager.broadcast(
-                event="NOTIFICATION_CREATED",
-                payload={
-                    "user_id": notif["user_id"],
-                    "notification_id": notif["id"],
-                    "type": notif["type"]
-                }
-            )
+                f"<h3>New Request Pending Your Approval</h3><p><b>{request_number}</b> - {display_title}</p><p>From: {user['name']}</p><p>Please log in to review and approve.</p>",
+                email=first_approver.get("email", ""),
+            )])
     elif custodian_doc:
-        custodian_user = await db.users.find_one({"id": custodian_doc["user_id"]}, {"_id": 0})
-        notif = {
-            "id": str(uuid.uuid4()),
-            "user_id": custodian_doc["user_id"],
-            "request_id": result["id"],
-            "request_number": request_number,
-            "message": f"Request '{display_title}' is ready for fulfillment confirmation",
-            "type": "custodian_required",
-            "is_read": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.notifications.insert_one(notif)
-        await send_email_notification(
-            custodian_user.get("email", "") if custodian_user else "",
+        custodian_user = chain_users.get(custodian_doc["user_id"])
+        await deliver_notifications([notice(
+            custodian_doc["user_id"],
+            result,
+            f"Request '{display_title}' is ready for fulfillment confirmation",
+            "custodian_required",
             f"Fulfillment Required: {request_number} - {display_title}",
-            f"<h3>Request Ready for Fulfillment</h3><p><b>{request_number}</b> - {display_title}</p><p>Requested by: {user['name']}</p><p>Please fulfill the request and confirm once it is completed.</p>"
-        )
-        await manager.broadcast(
-            event="NOTIFICATION_CREATED",
-            payload={
-                "user_id": notif["user_id"],
-                "notification_id": notif["id"],
-                "type": notif["type"]
-            }
-        )
+            f"<h3>Request Ready for Fulfillment</h3><p><b>{request_number}</b> - {display_title}</p><p>Requested by: {user['name']}</p><p>Please fulfill the request and confirm once it is completed.</p>",
+            email=custodian_user.get("email", "") if custodian_user else "",
+        )])
 
     await manager.broadcast(
         event="REQUEST_CREATED",
@@ -310,17 +467,11 @@ async def cancel_request(request_id: str, user=Depends(get_current_user)):
 
     now = datetime.now(timezone.utc).isoformat()
 
-    await db.requests.update_one(
-        {"id": request_id},
-        {
-            "$set": {
-                "status": "cancelled",
-                "updated_at": now,
-            }
-        },
-    )
-
-    updated = await db.requests.find_one({"id": request_id}, {"_id": 0})
+    updated = await _apply_transition(req, {
+        "status": "cancelled",
+        "current_actor_id": None,
+        "updated_at": now,
+    })
 
     # Broadcast cancellation events so dashboards and detail views update live
     await manager.broadcast(
@@ -332,6 +483,7 @@ async def cancel_request(request_id: str, user=Depends(get_current_user)):
             "requester_id": updated["requester_id"],
             "status": updated["status"],
         },
+        deltas=[request_delta(updated)],
     )
 
     await manager.broadcast(
@@ -341,11 +493,204 @@ async def cancel_request(request_id: str, user=Depends(get_current_user)):
             "status": updated["status"],
             "current_step": updated.get("current_approval_step", 0),
         },
+        deltas=[request_delta(updated)],
     )
 
     return updated
 
 
+def _plan_step_action(req: dict, step_index: int, action: str, comments: str, user: dict, now: str):
+    """
+    Work out an approve/reject of the approval at ``step_index`` without touching
+    the database. Returns the ``$set`` for the transition, the notices to
+    deliver once it lands, and the realtime events describing it.
+    """
+    approvals = req.get("approvals", [])
+    custodian = req.get("custodian")
+    current_step = approvals[step_index]["step"]
+    request_id = req["id"]
+    request_number = req["request_number"]
+    request_display_name = req.get("form_template_name") or req.get("title") or "Request"
+    step_prefix = f"approvals.{step_index}"
+    acted_step = {
+        f"{step_prefix}.status": "rejected" if action == "reject" else "approved",
+        f"{step_prefix}.comments": comments or "",
+        f"{step_prefix}.acted_at": now,
+    }
+
+    if action == "reject":
+        updates = {
+            **acted_step,
+            "status": "rejected",
+            "current_actor_id": None,
+            "updated_at": now
+        }
+        notices = [notice(
+            req["requester_id"],
+            req,
+            f"Your request '{request_display_name}' was rejected by {user['name']}",
+            "request_rejected",
+            f"Request Rejected: {request_number}",
+            f"<h3>Request Rejected</h3><p><b>{request_number}</b> - {request_display_name}</p><p>Rejected by: {user['name']}</p><p>Comments: {comments or 'None'}</p>",
+            email=req.get("requester_email", ""),
+        )]
+        events = [("REQUEST_REJECTED", {
+            "request_id": request_id,
+            "request_number": request_number,
+            "acted_by": user["id"],
+            "department_id": req["department_id"],
+            "status": "rejected"
+        })]
+        return updates, notices, events
+
+    next_step = current_step + 1
+    next_index = next((idx for idx, a in enumerate(approvals) if a["step"] == next_step), None)
+
+    if next_index is not None:
+        next_approver_id = approvals[next_index]["approver_id"]
+        updates = {
+            **acted_step,
+            f"approvals.{next_index}.status": "pending",
+            "current_approval_step": next_step,
+            "current_actor_id": next_approver_id,
+            "updated_at": now
+        }
+        notices = [notice(
+            next_approver_id,
+            req,
+            f"Request '{request_display_name}' requires your approval (Step {next_step})",
+            "approval_required",
+            f"Approval Required (Step {next_step}): {request_number}",
+            f"<h3>Approval Required</h3><p><b>{request_number}</b> - {request_display_name}</p><p>Step {next_step} of {req['total_approval_steps']}</p>",
+        )]
+        events = [("REQUEST_UPDATED", {
+            "request_id": request_id,
+            "request_number": request_number,
+            "current_step": next_step,
+            "status": "in_progress",
+            "department_id": req["department_id"]
+        })]
+        return updates, notices, events
+
+    if custodian and custodian.get("user_id"):
+        updates = {
+            **acted_step,
+            "custodian.status": "pending",
+            "status": "pending",
+            "current_approval_step": current_step + 1,
+            "current_actor_id": custodian["user_id"],
+            "updated_at": now
+        }
+        notices = [notice(
+            custodian["user_id"],
+            req,
+            f"Request '{request_display_name}' is ready for fulfillment confirmation",
+            "custodian_required",
+            f"Fulfillment Required: {request_number}",
+            f"<h3>Request Ready for Fulfillment</h3><p><b>{request_number}</b> - {request_display_name}</p><p>All approvers have approved this request.</p><p>Please fulfill it and confirm completion.</p>",
+        )]
+        return updates, notices, []
+
+    updates = {
+        **acted_step,
+        "status": "approved",
+        "current_actor_id": None,
+        "updated_at": now
+    }
+    notices = [notice(
+        req["requester_id"],
+        req,
+        f"Your request '{request_display_name}' has been fully approved!",
+        "request_approved",
+        f"Request Approved: {request_number}",
+        f"<h3>Request Approved</h3><p><b>{request_number}</b> - {request_display_name}</p><p>All approvers have signed off.</p>",
+        email=req.get("requester_email", ""),
+    )]
+    events = [("REQUEST_APPROVED", {
+        "request_id": request_id,
+        "request_number": request_number,
+        "department_id": req["department_id"],
+        "status": "approved"
+    })]
+    return updates, notices, events
+
+
+def _current_step_index(req: dict, user_id: str):
+    current_step = req.get("current_approval_step", 1)
+    for idx, a in enumerate(req.get("approvals", [])):
+        if a["step"] == current_step and a["approver_id"] == user_id:
+            return idx
+    return None
+
+
+@requests_router.post("/bulk-action")
+async def bulk_action_requests(body: BulkRequestAction, user=Depends(get_current_user)):
+    if body.action not in ("approve", "reject"):
+        raise HTTPException(status_code=400, detail="Invalid action. Use 'approve' or 'reject'")
+    if user.get("role", "") not in ("approver", "both", "manager", "super_admin"):
+        raise HTTPException(status_code=403, detail="Only approvers can approve or reject requests")
+
+    request_ids = list(dict.fromkeys(body.request_ids))
+    # One query: only requests currently waiting on this user can be acted upon
+    candidates = await db.requests.find(
+        {"id": {"$in": request_ids}, "status": "in_progress", "current_actor_id": user["id"]},
+        {"_id": 0},
+    ).to_list(len(request_ids))
+
+    now = datetime.now(timezone.utc).isoformat()
+    ops = []
+    plans = {}
+    for req in candidates:
+        step_index = _current_step_index(req, user["id"])
+        if step_index is None or req["approvals"][step_index]["status"] != "pending":
+            continue
+        updates, notices, _ = _plan_step_action(req, step_index, body.action, body.comments, user, now)
+        ops.append(UpdateOne(transition_guard(req), {"$set": updates, "$inc": {"version": 1}}))
+        plans[req["id"]] = (req, notices)
+
+    updated = []
+    if ops:
+        await db.requests.bulk_write(ops, ordered=False)
+        # bulk_write only reports totals; a transition landed if it bumped the version at our timestamp
+        written = await db.requests.find(
+            {"id": {"$in": list(plans)}, "updated_at": now},
+            {"_id": 0},
+        ).to_list(len(plans))
+        updated = [
+            doc for doc in written
+            if doc.get("version") == (plans[doc["id"]][0].get("version") or 0) + 1
+        ]
+        await record_transitions([(plans[doc["id"]][0], doc["status"]) for doc in updated])
+
+    updated_ids = {doc["id"] for doc in updated}
+    skipped = [
+        {
+            "request_id": rid,
+            "reason": "conflict" if rid in plans else "not_awaiting_your_action",
+        }
+        for rid in request_ids if rid not in updated_ids
+    ]
+
+    await deliver_notifications(
+        [n for rid in request_ids if rid in updated_ids for n in plans[rid][1]],
+        now=now,
+    )
+    if updated:
+        # One aggregated event instead of a REQUEST_* event per request
+        await manager.broadcast(
+            event="REQUESTS_BULK_UPDATED",
+            payload={
+                "request_ids": [doc["id"] for doc in updated],
+                "acted_by": user["id"],
+                "action": body.action,
+                "statuses": {doc["id"]: doc["status"] for doc in updated},
+            },
+            deltas=[request_delta(doc) for doc in updated],
+        )
+
+    return {"updated": updated, "skipped": skipped}
+
+
 @requests_router.post("/{request_id}/action")
 async def action_request(request_id: str, action: RequestAction, user=Depends(get_current_user)):
     req = await db.requests.find_one({"id": request_id}, {"_id": 0})
@@ -370,78 +715,38 @@ async def action_request(request_id: str, action: RequestAction, user=Depends(ge
             raise HTTPException(status_code=400, detail="This request is not awaiting custodian confirmation")
 
         now = datetime.now(timezone.utc).isoformat()
-        custodian["status"] = "fulfilled"
-        custodian["comments"] = action.comments or ""
-        custodian["acted_at"] = now
-
-        await db.requests.update_one(
-            {"id": request_id},
-            {"$set": {
-                "custodian": custodian,
-                "status": "approved",
-                "current_approval_step": req.get("total_approval_steps", current_step),
-                "updated_at": now
-            }},
-        )
+        updated = await _apply_transition(req, {
+            "custodian.status": "fulfilled",
+            "custodian.comments": action.comments or "",
+            "custodian.acted_at": now,
+            "status": "approved",
+            "current_approval_step": req.get("total_approval_steps", current_step),
+            "current_actor_id": None,
+            "updated_at": now
+        })
 
         approver_ids = list({a.get("approver_id") for a in approvals if a.get("approver_id")})
-        approver_users = []
-        if approver_ids:
-            approver_users = await db.users.find(
-                {"id": {"$in": approver_ids}},
-                {"_id": 0},
-            ).to_list(len(approver_ids))
-
-        for approver_user in approver_users:
-            notif = {
-                "id": str(uuid.uuid4()),
-                "user_id": approver_user["id"],
-                "request_id": request_id,
-                "request_number": req["request_number"],
-                "message": f"Request '{request_display_name}' was fulfilled and confirmed by {user['name']}",
-                "type": "request_completed",
-                "is_read": False,
-                "created_at": now
-            }
-            await db.notifications.insert_one(notif)
-            await send_email_notification(
-                approver_user.get("email", ""),
+        notices = [
+            notice(
+                approver_id,
+                req,
+                f"Request '{request_display_name}' was fulfilled and confirmed by {user['name']}",
+                "request_completed",
                 f"Request Completed: {req['request_number']}",
-                f"<h3>Request Completed</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>Confirmed by custodian: {user['name']}</p><p>Comments: {action.comments or 'None'}</p>"
-            )
-            await manager.broadcast(
-                event="NOTIFICATION_CREATED",
-                payload={
-                    "user_id": notif["user_id"],
-                    "notification_id": notif["id"],
-                    "type": notif["type"]
-                }
+                f"<h3>Request Completed</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>Confirmed by custodian: {user['name']}</p><p>Comments: {action.comments or 'None'}</p>",
             )
-
-        requester_notif = {
-            "id": str(uuid.uuid4()),
-            "user_id": req["requester_id"],
-            "request_id": request_id,
-            "request_number": req["request_number"],
-            "message": f"Your request '{request_display_name}' has been fulfilled",
-            "type": "request_approved",
-            "is_read": False,
-            "created_at": now
-        }
-        await db.notifications.insert_one(requester_notif)
-        await send_email_notification(
-            req.get("requester_email", ""),
+            for approver_id in approver_ids
+        ]
+        notices.append(notice(
+            req["requester_id"],
+            req,
+            f"Your request '{request_display_name}' has been fulfilled",
+            "request_approved",
             f"Request Approved: {req['request_number']}",
-            f"<h3>Request Fulfilled</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>Confirmed by custodian: {user['name']}</p><p>Your request is now complete.</p>"
-        )
-        await manager.broadcast(
-            event="NOTIFICATION_CREATED",
-            payload={
-                "user_id": requester_notif["user_id"],
-                "notification_id": requester_notif["id"],
-                "type": requester_notif["type"]
-            }
-        )
+            f"<h3>Request Fulfilled</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>Confirmed by custodian: {user['name']}</p><p>Your request is now complete.</p>",
+            email=req.get("requester_email", ""),
+        ))
+        await deliver_notifications(notices, now=now)
         await manager.broadcast(
             event="REQUEST_APPROVED",
             payload={
@@ -449,226 +754,33 @@ async def action_request(request_id: str, action: RequestAction, user=Depends(ge
                 "request_number": req["request_number"],
                 "department_id": req["department_id"],
                 "status": "approved"
-            }
-        )
-
-        updated = await db.requests.find_one({"id": request_id}, {"_id": 0})
-        await manager.broadcast(
-            event="REQUEST_STATE_CHANGED",
-            payload={
-                "request_id": updated["id"],
-                "status": updated["status"],
-                "current_step": updated.get("current_approval_step", 0)
-            }
-        )
-        return updated
-
-    current_approval = None
-    for a in approvals:
-        if a["step"] == current_step and a["approver_id"] == user["id"]:
-            current_approval = a
-            break
-
-    if not current_approval:
-        raise HTTPException(status_code=403, detail="You are not the current approver for this request")
-    if current_approval["status"] != "pending":
-        raise HTTPException(status_code=400, detail="This step has already been acted upon")
-
-    now = datetime.now(timezone.utc).isoformat()
-
-    if action.action == "reject":
-        for a in approvals:
-            if a["step"] == current_step and a["approver_id"] == user["id"]:
-                a["status"] = "rejected"
-                a["comments"] = action.comments or ""
-                a["acted_at"] = now
-        await db.requests.update_one({"id": request_id}, {"$set": {
-            "approvals": approvals,
-            "status": "rejected",
-            "updated_at": now
-        }})
-        # Notify requester
-        notif = {
-            "id": str(uuid.uuid4()),
-            "user_id": req["requester_id"],
-            "request_id": request_id,
-            "request_number": req["request_number"],
-            "message": f"Your request '{request_display_name}' was rejected by {user['name']}",
-            "type": "request_rejected",
-            "is_read": False,
-            "created_at": now
-        }
-        await db.notifications.insert_one(notif)
-        await send_email_notification(
-            req.get("requester_email", ""),
-            f"Request Rejected: {req['request_number']}",
-            f"<h3>Request Rejected</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>Rejected by: {user['name']}</p><p>Comments: {action.comments or 'None'}</p>"
-        )
-        await manager.broadcast(
-            event="NOTIFICATION_CREATED",
-            payload={
-                "user_id": notif["user_id"],
-                "notification_id": notif["id"],
-                "type": notif["type"]
-            }
-        )
-        await manager.broadcast(
-            event="REQUEST_REJECTED",
-            payload={
-                "request_id": request_id,
-                "request_number": req["request_number"],
-                "acted_by": user["id"],
-                "department_id": req["department_id"],
-                "status": "rejected"
-            }
+            },
+            deltas=[request_delta(updated)],
         )
+    elif action.action in ("approve", "reject"):
+        step_index = _current_step_index(req, user["id"])
+        if step_index is None:
+            raise HTTPException(status_code=403, detail="You are not the current approver for this request")
+        if approvals[step_index]["status"] != "pending":
+            raise HTTPException(status_code=400, detail="This step has already been acted upon")
 
-    elif action.action == "approve":
-        for a in approvals:
-            if a["step"] == current_step and a["approver_id"] == user["id"]:
-                a["status"] = "approved"
-                a["comments"] = action.comments or ""
-                a["acted_at"] = now
-
-        next_step = current_step + 1
-        has_next = any(a["step"] == next_step for a in approvals)
-
-        if has_next:
-            for a in approvals:
-                if a["step"] == next_step:
-                    a["status"] = "pending"
-            await db.requests.update_one({"id": request_id}, {"$set": {
-                "approvals": approvals,
-                "current_approval_step": next_step,
-                "updated_at": now
-            }})
-            next_approver_data = next((a for a in approvals if a["step"] == next_step), None)
-            if next_approver_data:
-                next_approver = await db.users.find_one({"id": next_approver_data["approver_id"]}, {"_id": 0})
-                if next_approver:
-                    notif = {
-                        "id": str(uuid.uuid4()),
-                        "user_id": next_approver["id"],
-                        "request_id": request_id,
-                        "request_number": req["request_number"],
-                        "message": f"Request '{request_display_name}' requires your approval (Step {next_step})",
-                        "type": "approval_required",
-                        "is_read": False,
-                        "created_at": now
-                    }
-                    await db.notifications.insert_one(notif)
-                    await send_email_notification(
-                        next_approver.get("email", ""),
-                        f"Approval Required (Step {next_step}): {req['request_number']}",
-                        f"<h3>Approval Required</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>Step {next_step} of {req['total_approval_steps']}</p>"
-                    )
-                    await manager.broadcast(
-                        event="NOTIFICATION_CREATED",
-                        payload={
-                            "user_id": notif["user_id"],
-                            "notification_id": notif["id"],
-                            "type": notif["type"]
-                        }
-                    )
-                    await manager.broadcast(
-                        event="REQUEST_UPDATED",
-                        payload={
-                            "request_id": request_id,
-                            "request_number": req["request_number"],
-                            "current_step": next_step,
-                            "status": "in_progress",
-                            "department_id": req["department_id"]
-                        }
-                    )
-
-        else:
-            if custodian and custodian.get("user_id"):
-                custodian["status"] = "pending"
-                await db.requests.update_one({"id": request_id}, {"$set": {
-                    "approvals": approvals,
-                    "custodian": custodian,
-                    "status": "pending",
-                    "current_approval_step": current_step + 1,
-                    "updated_at": now
-                }})
-                custodian_user = await db.users.find_one({"id": custodian["user_id"]}, {"_id": 0})
-                if custodian_user:
-                    notif = {
-                        "id": str(uuid.uuid4()),
-                        "user_id": custodian_user["id"],
-                        "request_id": request_id,
-                        "request_number": req["request_number"],
-                        "message": f"Request '{request_display_name}' is ready for fulfillment confirmation",
-                        "type": "custodian_required",
-                        "is_read": False,
-                        "created_at": now
-                    }
-                    await db.notifications.insert_one(notif)
-                    await send_email_notification(
-                        custodian_user.get("email", ""),
-                        f"Fulfillment Required: {req['request_number']}",
-                        f"<h3>Request Ready for Fulfillment</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>All approvers have approved this request.</p><p>Please fulfill it and confirm completion.</p>"
-                    )
-                    await manager.broadcast(
-                        event="NOTIFICATION_CREATED",
-                        payload={
-                            "user_id": notif["user_id"],
-                            "notification_id": notif["id"],
-                            "type": notif["type"]
-                        }
-                    )
-            else:
-                await db.requests.update_one({"id": request_id}, {"$set": {
-                    "approvals": approvals,
-                    "status": "approved",
-                    "updated_at": now
-                }})
-                notif = {
-                    "id": str(uuid.uuid4()),
-                    "user_id": req["requester_id"],
-                    "request_id": request_id,
-                    "request_number": req["request_number"],
-                    "message": f"Your request '{request_display_name}' has been fully approved!",
-                    "type": "request_approved",
-                    "is_read": False,
-                    "created_at": now
-                }
-                await db.notifications.insert_one(notif)
-                await send_email_notification(
-                    req.get("requester_email", ""),
-                    f"Request Approved: {req['request_number']}",
-                    f"<h3>Request Approved</h3><p><b>{req['request_number']}</b> - {request_display_name}</p><p>All approvers have signed off.</p>"
-                )
-                await manager.broadcast(
-                    event="NOTIFICATION_CREATED",
-                    payload={
-                        "user_id": notif["user_id"],
-                        "notification_id": notif["id"],
-                        "type": notif["type"]
-                    }
-                )
-                await manager.broadcast(
-                    event="REQUEST_APPROVED",
-                    payload={
-                        "request_id": request_id,
-                        "request_number": req["request_number"],
-                        "department_id": req["department_id"],
-                        "status": "approved"
-                    }
-                )
-
+        now = datetime.now(timezone.utc).isoformat()
+        updates, notices, events = _plan_step_action(req, step_index, action.action, action.comments, user, now)
+        updated = await _apply_transition(req, updates)
+        await deliver_notifications(notices, now=now)
+        for event, payload in events:
+            await manager.broadcast(event=event, payload=payload, deltas=[request_delta(updated)])
     else:
         raise HTTPException(status_code=400, detail="Invalid action. Use 'approve', 'reject', or 'fulfill'")
 
-    updated = await db.requests.find_one({"id": request_id}, {"_id": 0})
-
     await manager.broadcast(
-    event="REQUEST_STATE_CHANGED",
+        event="REQUEST_STATE_CHANGED",
         payload={
             "request_id": updated["id"],
             "status": updated["status"],
             "current_step": updated.get("current_approval_step", 0)
-        }
+        },
+        deltas=[request_delta(updated)],
     )
 
     return updated
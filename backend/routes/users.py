@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Depends, Query
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Literal
 from utils.helpers import db, hash_password, require_admin, get_current_user
+from utils.user_directory import invalidate_department_managers
 import uuid
 from datetime import datetime, timezone
 
@@ -29,6 +30,10 @@ class PasswordChange(BaseModel):
     new_password: str
 
 
+class NotificationPreferences(BaseModel):
+    email_frequency: Literal["immediate", "hourly", "daily", "off"]
+
+
 @users_router.get("")
 async def list_users(
     department_id: Optional[str] = None,
@@ -68,6 +73,7 @@ async def create_user(req: UserCreate, admin=Depends(require_admin)):
         "created_at": datetime.now(timezone.utc).isoformat()
     }
     await db.users.insert_one(user)
+    invalidate_department_managers()
     return {k: v for k, v in user.items() if k not in ("_id", "password_hash")}
 
 
@@ -80,6 +86,7 @@ async def update_user(user_id: str, req: UserUpdate, admin=Depends(require_admin
     result = await db.users.update_one({"id": user_id}, {"$set": updates})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_department_managers()
     user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
     return user
 
@@ -89,6 +96,7 @@ async def delete_user(user_id: str, admin=Depends(require_admin)):
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    invalidate_department_managers()
     return {"message": "User deleted"}
 
 
@@ -113,3 +121,18 @@ async def change_password(user_id: str, req: PasswordChange, current=Depends(get
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     await db.users.update_one({"id": user_id}, {"$set": {"password_hash": hash_password(req.new_password)}})
     return {"message": "Password changed"}
+
+
+@users_router.put("/{user_id}/notification-preferences")
+async def update_notification_preferences(
+    user_id: str, req: NotificationPreferences, current=Depends(get_current_user)
+):
+    if current["id"] != user_id and current["role"] != "super_admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+    result = await db.users.update_one(
+        {"id": user_id},
+        {"$set": {"email_frequency": req.email_frequency, "updated_at": datetime.now(timezone.utc).isoformat()}},
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="User not found")
+    return await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
@@ -1,6 +1,7 @@
 import uuid
 from datetime import datetime, timezone, timedelta
 from utils.helpers import hash_password
+from utils.workflow import actor_fields
 import logging
 import random
 
@@ -682,13 +683,15 @@ async def seed_data(db):
             "department_id": dept_map[dept_code],
             "requester_id": requester["id"], "requester_name": requester["name"],
             "requester_email": requester["email"],
+            "requester_department_id": requester.get("department_id"),
             "title": title, "form_data": form_data,
             "notes": "", "priority": priority,
             "status": status, "current_approval_step": current_step,
             "total_approval_steps": len(chain),
-            "approvals": approvals,
+            "approvals": approvals, "custodian": None, "version": 1,
             "created_at": created_at, "updated_at": created_at
         }
+        req_doc.update(actor_fields(req_doc))
         await db.requests.insert_one(req_doc)
         req_count += 1
 
@@ -724,21 +727,5 @@ async def seed_data(db):
         await db.notifications.insert_many(notif_docs)
     logger.info(f"  {req_count} sample requests created with {len(notif_docs)} notifications.")
 
-    # ── 6. Indexes ──
-    await db.users.create_index("id", unique=True)
-    await db.users.create_index("email", unique=True)
-    await db.departments.create_index("id", unique=True)
-    await db.departments.create_index("code", unique=True)
-    await db.form_templates.create_index("id", unique=True)
-    await db.form_templates.create_index("department_id")
-    await db.requests.create_index("id", unique=True)
-    await db.requests.create_index("requester_id")
-    await db.requests.create_index("department_id")
-    await db.requests.create_index("status")
-    await db.requests.create_index([("created_at", -1)])
-    await db.notifications.create_index("id", unique=True)
-    await db.notifications.create_index("user_id")
-    await db.notifications.create_index([("user_id", 1), ("is_read", 1)])
-
     logger.info("Seeding complete!")
     logger.info(f"  Summary: {len(dept_map)} depts, {tmpl_count} templates, {len(user_map)} users, {assign_count} approver chains, {req_count} requests, {len(notif_docs)} notifications")
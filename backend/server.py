@@ -1,24 +1,31 @@
-from fastapi import FastAPI, APIRouter
+from fastapi import FastAPI, APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
+from starlette.middleware.gzip import GZipMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+import hmac
+import json
 import os
 import logging
 from pathlib import Path
 from fastapi import WebSocket
 from realtime import manager
+from utils.responses import FastJSONResponse, SkipStreamCompression
+from utils.metrics import Gauge, MetricsMiddleware, mongo_listener, render_metrics
+from utils.logging_config import RequestIdMiddleware, configure_logging, stop_logging
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_listener])
 db = client[os.environ['DB_NAME']]
 
-app = FastAPI(redirect_slashes=False)
+app = FastAPI(redirect_slashes=False, default_response_class=FastJSONResponse)
 api_router = APIRouter(prefix="/api")
 
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+configure_logging()
 logger = logging.getLogger(__name__)
 
 # Import routes
@@ -28,7 +35,10 @@ from routes.departments import departments_router
 from routes.form_templates import templates_router
 from routes.requests import requests_router
 from routes.notifications import notifications_router
+from utils.helpers import get_user_from_token
+from utils.rate_limit import LONG_LIVED_PATHS, RateLimitMiddleware, in_flight_requests
 from routes.dashboard import dashboard_router
+from routes.analytics import analytics_router
 
 api_router.include_router(auth_router)
 api_router.include_router(users_router)
@@ -37,6 +47,7 @@ api_router.include_router(templates_router)
 api_router.include_router(requests_router)
 api_router.include_router(notifications_router)
 api_router.include_router(dashboard_router)
+api_router.include_router(analytics_router)
 
 @api_router.get("/")
 async def root():
@@ -49,6 +60,62 @@ async def realtime_status():
 
 app.include_router(api_router)
 
+
+Gauge(
+    "websocket_active_connections",
+    "Websocket connections open on this instance.",
+    lambda: len(manager.active_connections),
+)
+Gauge(
+    "http_requests_in_flight",
+    "API requests being handled on this instance (counted against MAX_CONCURRENT_REQUESTS).",
+    in_flight_requests,
+)
+
+
+# Scrapers send "Authorization: Bearer <METRICS_TOKEN>"; without a token only local clients may scrape
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+METRICS_LOCAL_HOSTS = {"127.0.0.1", "::1", "localhost"}
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    if METRICS_TOKEN:
+        scheme, _, token = request.headers.get("authorization", "").partition(" ")
+        allowed = scheme.lower() == "bearer" and hmac.compare_digest(token, METRICS_TOKEN)
+    else:
+        allowed = request.client is not None and request.client.host in METRICS_LOCAL_HOSTS
+    if not allowed:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# Response compression: "gzip" (default), "br" (needs brotli-asgi) or "off"
+RESPONSE_COMPRESSION = os.environ.get('RESPONSE_COMPRESSION', 'gzip').lower()
+COMPRESSION_MINIMUM_SIZE = int(os.environ.get('COMPRESSION_MINIMUM_SIZE', '1024'))
+
+if RESPONSE_COMPRESSION == 'br':
+    try:
+        from brotli_asgi import BrotliMiddleware
+        # Falls back to gzip for clients that do not accept br
+        app.add_middleware(
+            SkipStreamCompression, compressor=BrotliMiddleware, skip_paths=LONG_LIVED_PATHS,
+            minimum_size=COMPRESSION_MINIMUM_SIZE, gzip_fallback=True,
+        )
+    except ImportError:
+        logger.warning("RESPONSE_COMPRESSION=br but brotli-asgi is not installed; using gzip")
+        app.add_middleware(
+            SkipStreamCompression, compressor=GZipMiddleware, skip_paths=LONG_LIVED_PATHS,
+            minimum_size=COMPRESSION_MINIMUM_SIZE,
+        )
+elif RESPONSE_COMPRESSION == 'gzip':
+    app.add_middleware(
+        SkipStreamCompression, compressor=GZipMiddleware, skip_paths=LONG_LIVED_PATHS,
+        minimum_size=COMPRESSION_MINIMUM_SIZE,
+    )
+
+# Inside CORS so 429/503 responses still carry CORS headers the browser can read
+app.add_middleware(RateLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
@@ -57,16 +124,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so latency covers compression and CORS handling too
+app.add_middleware(MetricsMiddleware)
+# Wraps everything so every log line of a request shares its id
+app.add_middleware(RequestIdMiddleware)
+
 @app.on_event("startup")
 async def startup_event():
     from seed import seed_data
+    from migrations import run_migrations
+    from archive import start_maintenance
+    from utils.email_digest import start_digests
     await seed_data(db)
+    await run_migrations(db)
     await manager.startup()
+    start_maintenance(db)
+    start_digests()
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    from archive import stop_maintenance
+    from utils.email_digest import stop_digests
+    await stop_maintenance()
+    await stop_digests()
     await manager.shutdown()
     client.close()
+    stop_logging()
+
+async def _authenticate_socket(ws: WebSocket, message: str):
+    try:
+        data = json.loads(message)
+    except ValueError:
+        return
+    if not isinstance(data, dict) or data.get("type") != "auth" or not data.get("token"):
+        return
+    try:
+        manager.identify(ws, await get_user_from_token(data["token"]))
+    except HTTPException:
+        pass
+
 
 @app.websocket("/ws")
 async def websocket_endpoint(ws: WebSocket):
@@ -76,6 +172,9 @@ async def websocket_endpoint(ws: WebSocket):
             message = await ws.receive_text()
             if message == "ping":
                 await ws.send_text("pong")
+            elif message.startswith("{"):
+                # {"type": "auth", "token": ...} as a message keeps the token out of the URL
+                # and access logs; it lets events carry request patches this user may see
+                await _authenticate_socket(ws, message)
     except:
         manager.disconnect(ws)
-
@@ -0,0 +1,166 @@
+"""
+Opt-in database profiling for development (DB_PROFILING=true).
+
+Counts Mongo commands per HTTP request and groups them by query shape
+(command + collection + filter keys, values stripped). A request is flagged
+when it exceeds its DB-command budget or repeats one shape often enough to
+look like a query issued in a loop (N+1). Slow commands get their query plan
+logged via explain. With DB_PROFILE_STRICT=true budget violations are also
+collected so tests can fail on them with assert_within_db_budgets().
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from typing import List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+PROFILING_ENABLED = os.environ.get('DB_PROFILING', 'false').lower() == 'true'
+PROFILE_STRICT = os.environ.get('DB_PROFILE_STRICT', 'false').lower() == 'true'
+DEFAULT_COMMAND_BUDGET = int(os.environ.get('DB_PROFILE_MAX_COMMANDS', '25'))
+REPEAT_THRESHOLD = int(os.environ.get('DB_PROFILE_REPEAT_THRESHOLD', '3'))
+SLOW_QUERY_MS = float(os.environ.get('DB_SLOW_QUERY_MS', '100'))
+EXPLAIN_SLOW_QUERIES = os.environ.get('DB_PROFILE_EXPLAIN', 'true').lower() == 'true'
+
+# Mongo commands each hot endpoint is expected to need, keyed by "METHOD route".
+# Every count includes the users lookup that authenticates the request, and
+# the worst case of the archive fallback and of a recipient whose unread
+# counter does not exist yet (find_one_and_update, find_one, count, upsert).
+# tests/test_db_budgets.py runs each route against these numbers.
+# Requests not listed here use DEFAULT_COMMAND_BUDGET.
+ROUTE_BUDGETS = {
+    # auth, count, page
+    "GET /api/requests": 3,
+    # auth, requests, requests_archive
+    "GET /api/requests/{request_id}": 3,
+    # auth, requests, requests_archive, template version, profiles, departments
+    "GET /api/requests/{request_id}/bundle": 6,
+    # auth, template, number, approvers, insert, stats, recipients, notifications, unread counter (4)
+    "POST /api/requests": 12,
+    # auth, request, guarded update, recipients, notifications, unread counter (4)
+    "POST /api/requests/{request_id}/action": 9,
+    # auth, request, guarded update, stats
+    "POST /api/requests/{request_id}/cancel": 4,
+    # auth, requests, bulk update, re-read, recipients, notifications, unread counter (4)
+    "POST /api/requests/bulk-action": 10,
+    # admin: auth, stats, three counts, unread counter (3)
+    "GET /api/dashboard/stats": 10,
+    # auth, unread counter (3), count, page
+    "GET /api/notifications": 6,
+}
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "findAndModify", "update", "delete"}
+
+violations: List[dict] = []
+# Strong references to pending explain tasks, so they are not collected mid-run
+_explain_tasks: Set[asyncio.Task] = set()
+
+
+class DBBudgetExceeded(AssertionError):
+    pass
+
+
+def _normalize(value):
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in sorted(value.items())}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value[:1]]
+    return "?"
+
+
+def _filter_of(command_name: str, command: dict):
+    if command_name == "find":
+        return command.get("filter", {})
+    if command_name in ("count", "findAndModify"):
+        return command.get("query", {})
+    if command_name == "distinct":
+        return command.get("query", {})
+    if command_name == "aggregate":
+        for stage in command.get("pipeline", []):
+            if "$match" in stage:
+                return stage["$match"]
+        return {}
+    if command_name == "update":
+        updates = command.get("updates") or [{}]
+        return updates[0].get("q", {})
+    if command_name == "delete":
+        deletes = command.get("deletes") or [{}]
+        return deletes[0].get("q", {})
+    return {}
+
+
+def query_shape(command_name: str, collection: str, command: dict) -> str:
+    shape = json.dumps(_normalize(_filter_of(command_name, command)), sort_keys=True, default=str)
+    return f"{command_name} {collection} {shape}"
+
+
+def explainable(command_name: str, command: dict) -> Optional[dict]:
+    """Strip driver/session fields so the command can be wrapped in explain."""
+    if command_name not in EXPLAINABLE_COMMANDS:
+        return None
+    return {k: v for k, v in command.items() if not k.startswith("$") and k not in ("lsid", "txnNumber")}
+
+
+def _summarize_plan(stage: dict) -> str:
+    name = stage.get("stage", "?")
+    if stage.get("indexName"):
+        name = f"{name}({stage['indexName']})"
+    children = [stage["inputStage"]] if "inputStage" in stage else stage.get("inputStages", [])
+    if children:
+        return f"{name} <- " + ", ".join(_summarize_plan(child) for child in children)
+    return name
+
+
+async def _explain(command: dict, shape: str, duration_ms: float):
+    try:
+        from utils.helpers import db
+
+        result = await db.command({"explain": command, "verbosity": "queryPlanner"})
+        planner = result.get("queryPlanner") or result.get("stages", [{}])[0].get("$cursor", {}).get("queryPlanner", {})
+        plan = _summarize_plan(planner.get("winningPlan", {}))
+        logger.warning("Slow query (%.1f ms) %s plan: %s", duration_ms, shape, plan)
+    except Exception as exc:
+        logger.warning("Slow query (%.1f ms) %s; explain failed: %s", duration_ms, shape, exc)
+
+
+def evaluate_request(method: str, route: str, stats: dict):
+    """Flag budget overruns, repeated query shapes and slow queries for one HTTP request."""
+    key = f"{method} {route}"
+    budget = ROUTE_BUDGETS.get(key, DEFAULT_COMMAND_BUDGET)
+    shapes: Counter = stats.get("shapes") or Counter()
+    repeated = {shape: n for shape, n in shapes.items() if n >= REPEAT_THRESHOLD}
+
+    if stats["commands"] > budget:
+        logger.warning(
+            "DB budget exceeded on %s: %d commands (budget %d)", key, stats["commands"], budget
+        )
+        if PROFILE_STRICT:
+            violations.append({"route": key, "commands": stats["commands"], "budget": budget})
+    if repeated:
+        logger.warning(
+            "Possible N+1 on %s: %s",
+            key,
+            "; ".join(f"{n}x {shape}" for shape, n in repeated.items()),
+        )
+
+    if EXPLAIN_SLOW_QUERIES:
+        for command, shape, duration_ms in stats.get("slow", []):
+            task = asyncio.get_running_loop().create_task(_explain(command, shape, duration_ms))
+            _explain_tasks.add(task)
+            task.add_done_callback(_explain_tasks.discard)
+    else:
+        for _, shape, duration_ms in stats.get("slow", []):
+            logger.warning("Slow query (%.1f ms) %s", duration_ms, shape)
+
+
+def assert_within_db_budgets():
+    """Raise DBBudgetExceeded if any request since the last call went over budget (strict mode)."""
+    if violations:
+        found = list(violations)
+        violations.clear()
+        raise DBBudgetExceeded(
+            "DB command budget exceeded: "
+            + ", ".join(f"{v['route']} used {v['commands']} (budget {v['budget']})" for v in found)
+        )
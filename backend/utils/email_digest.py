@@ -0,0 +1,147 @@
+"""
+Batched email delivery for users who prefer digests.
+
+Each user has an ``email_frequency``: immediate (the default), hourly, daily
+or off. deliver_notifications queues notices for digest users in
+``db.email_digest_queue``, and a background loop sends each of them one
+email per period with everything queued since their last digest. Periods
+are claimed in ``db.email_digest_runs`` with a compare-and-set, so with
+several API instances each digest still goes out once. Daily digests go
+out at DIGEST_DAILY_HOUR (UTC). A digest that fails to send stays queued
+for the next period, up to DIGEST_MAX_ATTEMPTS tries; one the provider can
+never accept (invalid address, missing sender) is dropped right away.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from utils.helpers import EMAIL_REJECTED, EMAIL_SENT, db, send_email_notification
+
+logger = logging.getLogger(__name__)
+
+EMAIL_FREQUENCIES = ("immediate", "hourly", "daily", "off")
+DIGEST_FREQUENCIES = ("hourly", "daily")
+DIGEST_DAILY_HOUR = int(os.environ.get('DIGEST_DAILY_HOUR', '8'))
+DIGEST_POLL_SECONDS = float(os.environ.get('DIGEST_POLL_SECONDS', '300'))
+DIGEST_MAX_ATTEMPTS = int(os.environ.get('DIGEST_MAX_ATTEMPTS', '5'))
+
+_digest_task = None
+
+
+def current_period(frequency: str, now: datetime) -> str:
+    if frequency == "hourly":
+        return now.strftime("%Y-%m-%dT%H")
+    # A daily period runs from DIGEST_DAILY_HOUR to DIGEST_DAILY_HOUR the next day
+    if now.hour < DIGEST_DAILY_HOUR:
+        now -= timedelta(days=1)
+    return now.strftime("%Y-%m-%d")
+
+
+def render_digest(frequency: str, items: List[dict]):
+    count = len(items)
+    subject = f"{frequency.capitalize()} digest: {count} request update{'s' if count != 1 else ''}"
+    html = f"<h2>{subject}</h2>" + "<hr>".join(item["html"] for item in items)
+    return subject, html
+
+
+async def queue_digest_items(items: List[dict]) -> None:
+    if items:
+        await db.email_digest_queue.insert_many(items)
+
+
+async def _claim_period(frequency: str, period: str) -> bool:
+    try:
+        await db.email_digest_runs.update_one(
+            {"_id": frequency, "period": {"$ne": period}},
+            {"$set": {"period": period, "started_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        # This period was already claimed
+        return False
+    return True
+
+
+async def send_digests(frequency: str, now: Optional[datetime] = None) -> int:
+    """Send one email per user with the notices queued for ``frequency``; returns emails sent."""
+    cutoff = (now or datetime.now(timezone.utc)).isoformat()
+    cursor = db.email_digest_queue.find(
+        {"frequency": frequency, "created_at": {"$lte": cutoff}},
+    ).sort([("user_id", 1), ("created_at", 1)])
+
+    sent = failed = dropped = 0
+    user_id, items = None, []
+
+    async def flush():
+        nonlocal sent, failed, dropped
+        if not items:
+            return
+        ids = [item["_id"] for item in items]
+        result = await send_email_notification(items[-1]["email"], *render_digest(frequency, items))
+        if result == EMAIL_SENT:
+            # Delete only after sending: a crash in between resends rather than drops
+            await db.email_digest_queue.delete_many({"_id": {"$in": ids}})
+            sent += 1
+            return
+        attempts = max(item.get("attempts", 0) for item in items) + 1
+        if result == EMAIL_REJECTED or attempts >= DIGEST_MAX_ATTEMPTS:
+            await db.email_digest_queue.delete_many({"_id": {"$in": ids}})
+            dropped += 1
+            return
+        # Left queued, so the next period's digest includes them
+        await db.email_digest_queue.update_many({"_id": {"$in": ids}}, {"$set": {"attempts": attempts}})
+        failed += 1
+
+    async for item in cursor:
+        if item["user_id"] != user_id:
+            await flush()
+            user_id, items = item["user_id"], []
+        items.append(item)
+    await flush()
+
+    if sent:
+        logger.info(f"Sent {sent} {frequency} digest emails.")
+    if failed:
+        logger.warning(f"{failed} {frequency} digest emails failed; their items stay queued for the next period.")
+    if dropped:
+        logger.error(f"Dropped {dropped} {frequency} digest emails that could not be delivered.")
+    return sent
+
+
+async def run_due_digests(now: Optional[datetime] = None) -> int:
+    now = now or datetime.now(timezone.utc)
+    sent = 0
+    for frequency in DIGEST_FREQUENCIES:
+        if await _claim_period(frequency, current_period(frequency, now)):
+            sent += await send_digests(frequency, now)
+    return sent
+
+
+async def _digest_loop():
+    while True:
+        try:
+            await run_due_digests()
+        except Exception as exc:
+            logger.exception("Digest delivery failed: %s", exc)
+        await asyncio.sleep(DIGEST_POLL_SECONDS)
+
+
+def start_digests():
+    global _digest_task
+    if _digest_task is None:
+        _digest_task = asyncio.create_task(_digest_loop())
+
+
+async def stop_digests():
+    global _digest_task
+    if _digest_task is not None:
+        _digest_task.cancel()
+        try:
+            await _digest_task
+        except asyncio.CancelledError:
+            pass
+        _digest_task = None
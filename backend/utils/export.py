@@ -0,0 +1,163 @@
+"""
+Flattening and streaming writers for request exports.
+
+Rows are produced batch by batch from a Mongo cursor, so memory stays flat
+regardless of how many requests match. CSV is written straight into the
+response stream; XLSX (needs openpyxl) is built in write-only mode in a
+temporary file off the event loop and then streamed out.
+"""
+import asyncio
+import csv
+import io
+import os
+import tempfile
+from typing import AsyncIterator, Dict, List, Tuple
+
+try:
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+except ImportError:
+    Workbook = WriteOnlyCell = None
+
+EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', '1000'))
+STREAM_CHUNK_SIZE = 64 * 1024
+# Leading characters that make Excel/LibreOffice treat a cell as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+BASE_COLUMNS: List[Tuple[str, str]] = [
+    ("request_number", "Request #"),
+    ("form_template_name", "Form"),
+    ("department_name", "Department"),
+    ("status", "Status"),
+    ("requester_name", "Requester"),
+    ("requester_email", "Requester Email"),
+    ("created_at", "Created At"),
+    ("updated_at", "Updated At"),
+    ("approvals", "Approvals"),
+    ("custodian", "Custodian"),
+    ("notes", "Notes"),
+]
+
+
+def form_columns(templates: List[dict]) -> List[Tuple[str, str]]:
+    """Union of the templates' fields in first-seen order; same-named fields share a column."""
+    columns = {}
+    for tmpl in templates:
+        for field in tmpl.get("fields") or []:
+            name = field.get("name")
+            if name and name not in columns:
+                columns[name] = field.get("label") or name
+    return list(columns.items())
+
+
+def _format_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, dict):
+        if "rows" in value:
+            # Table field: one "header: cell" group per non-empty row
+            headers = value.get("headers") or []
+            rows = []
+            for row in value.get("rows") or []:
+                cells = [
+                    f"{headers[i] if i < len(headers) else i + 1}: {cell}"
+                    for i, cell in enumerate(row or []) if str(cell or "").strip()
+                ]
+                if cells:
+                    rows.append(", ".join(cells))
+            return " | ".join(rows)
+        if "filename" in value:
+            # Dropzone field: never inline the base64 payload
+            return value.get("filename") or ""
+        return "; ".join(f"{k}: {_format_value(v)}" for k, v in value.items())
+    if isinstance(value, list):
+        return ", ".join(_format_value(v) for v in value)
+    return str(value)
+
+
+def _safe_cell(value: str) -> str:
+    """Quote text a spreadsheet would otherwise evaluate as a formula (CSV/formula injection)."""
+    if value and value[0] in FORMULA_PREFIXES:
+        return "'" + value
+    return value
+
+
+def _text_cell(sheet, value: str):
+    """XLSX cell that stays text: typed as a string, with Excel's quote prefix set."""
+    if not (value and value[0] in FORMULA_PREFIXES):
+        return value
+    cell = WriteOnlyCell(sheet, value)
+    # openpyxl would store a leading "=" as a formula
+    cell.data_type = "s"
+    cell.quotePrefix = True
+    return cell
+
+
+def flatten_request(req: dict, field_names: List[str], dept_names: Dict[str, str]) -> List[str]:
+    approvals = "; ".join(
+        f"{a.get('step')}. {a.get('approver_name', '')} ({a.get('status', '')}"
+        + (f" {a['acted_at']}" if a.get("acted_at") else "") + ")"
+        for a in req.get("approvals") or []
+    )
+    custodian = req.get("custodian") or {}
+    values = {
+        **req,
+        "department_name": dept_names.get(req.get("department_id"), ""),
+        "approvals": approvals,
+        "custodian": f"{custodian.get('user_name', '')} ({custodian.get('status', '')})" if custodian else "",
+    }
+    row = [_format_value(values.get(key)) for key, _ in BASE_COLUMNS]
+    form_data = req.get("form_data") or {}
+    row.extend(_format_value(form_data.get(name)) for name in field_names)
+    return row
+
+
+def header_row(columns: List[Tuple[str, str]]) -> List[str]:
+    return [label for _, label in BASE_COLUMNS] + [label for _, label in columns]
+
+
+async def _row_batches(cursor, field_names, dept_names) -> AsyncIterator[List[List[str]]]:
+    batch = []
+    async for req in cursor:
+        batch.append(flatten_request(req, field_names, dept_names))
+        if len(batch) >= EXPORT_BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+async def stream_csv(cursor, columns, dept_names) -> AsyncIterator[bytes]:
+    field_names = [name for name, _ in columns]
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # BOM so Excel opens the UTF-8 file with the right encoding
+    writer.writerow([_safe_cell(label) for label in header_row(columns)])
+    yield ("\ufeff" + buffer.getvalue()).encode("utf-8")
+    async for batch in _row_batches(cursor, field_names, dept_names):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_safe_cell(cell) for cell in row] for row in batch)
+        yield buffer.getvalue().encode("utf-8")
+
+
+async def stream_xlsx(cursor, columns, dept_names) -> AsyncIterator[bytes]:
+    field_names = [name for name, _ in columns]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Requests")
+    sheet.append([_text_cell(sheet, label) for label in header_row(columns)])
+
+    def append_rows(rows):
+        for row in rows:
+            sheet.append([_text_cell(sheet, cell) for cell in row])
+
+    with tempfile.TemporaryFile(suffix=".xlsx") as tmp:
+        async for batch in _row_batches(cursor, field_names, dept_names):
+            await asyncio.to_thread(append_rows, batch)
+        await asyncio.to_thread(workbook.save, tmp)
+        tmp.seek(0)
+        while True:
+            chunk = await asyncio.to_thread(tmp.read, STREAM_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
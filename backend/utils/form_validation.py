@@ -0,0 +1,221 @@
+"""
+Validation of request ``form_data`` against the template's field schema.
+
+Each template's field list is compiled once into a pydantic model (one
+validator per field, with its options, table shape and limits baked in) and
+cached by (template id, updated_at), so create_request checks the whole
+payload in a single model_validate call. Limits mirror the request form in
+the frontend (CreateRequestDialog).
+"""
+import base64
+import binascii
+import math
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from pydantic import AfterValidator, ConfigDict, Field, ValidationError, create_model
+from typing_extensions import Annotated
+
+MAX_TEXT_LENGTH = 10_000
+MAX_TABLE_ROWS = 50
+ATTACHMENT_MAX_BYTES = 2 * 1024 * 1024
+ATTACHMENT_EXTENSIONS = {"png", "jpg", "jpeg", "gif", "webp", "pdf", "xls", "xlsx", "doc", "docx"}
+VALIDATOR_CACHE_SIZE = 256
+
+_validators: "OrderedDict[tuple, type]" = OrderedDict()
+
+
+def _is_blank(value) -> bool:
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def _text_check(required: bool) -> Callable:
+    def check(value):
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = str(value)
+        if value is not None and not isinstance(value, str):
+            raise ValueError("must be text")
+        if required and _is_blank(value):
+            raise ValueError("is required")
+        if value and len(value) > MAX_TEXT_LENGTH:
+            raise ValueError(f"must be at most {MAX_TEXT_LENGTH} characters")
+        return value
+    return check
+
+
+def _number_check(required: bool) -> Callable:
+    def check(value):
+        if _is_blank(value):
+            if required:
+                raise ValueError("is required")
+            return value
+        if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+            raise ValueError("must be a number")
+        try:
+            number = float(value)
+        except ValueError:
+            raise ValueError("must be a number")
+        if not math.isfinite(number):
+            raise ValueError("must be a number")
+        return value
+    return check
+
+
+def _date_check(required: bool) -> Callable:
+    def check(value):
+        if _is_blank(value):
+            if required:
+                raise ValueError("is required")
+            return value
+        if not isinstance(value, str) or len(value) != 10:
+            raise ValueError("must be a date (YYYY-MM-DD)")
+        try:
+            date.fromisoformat(value)
+        except ValueError:
+            raise ValueError("must be a date (YYYY-MM-DD)")
+        return value
+    return check
+
+
+def _select_check(required: bool, options) -> Callable:
+    allowed = frozenset(options or [])
+
+    def check(value):
+        if _is_blank(value):
+            if required:
+                raise ValueError("is required")
+            return value
+        if allowed and value not in allowed:
+            raise ValueError("is not one of the allowed options")
+        return value
+    return check
+
+
+def _table_check(required: bool, column_headers, num_rows) -> Callable:
+    headers = list(column_headers or [])
+    max_rows = max(MAX_TABLE_ROWS, num_rows or 0)
+
+    def check(value):
+        if value is None:
+            if required:
+                raise ValueError("is required")
+            return value
+        if not isinstance(value, dict) or not isinstance(value.get("rows"), list):
+            raise ValueError("must be a table")
+        if headers and value.get("headers") not in (None, headers):
+            raise ValueError("has unexpected columns")
+        width = len(headers or value.get("headers") or [])
+        rows = value["rows"]
+        if len(rows) > max_rows:
+            raise ValueError(f"must have at most {max_rows} rows")
+        has_content = False
+        for row in rows:
+            if not isinstance(row, list) or (width and len(row) != width):
+                raise ValueError(f"rows must have {width} cells")
+            for cell in row:
+                if cell is not None and not isinstance(cell, (str, int, float)):
+                    raise ValueError("cells must be text")
+                if isinstance(cell, str) and len(cell) > MAX_TEXT_LENGTH:
+                    raise ValueError(f"cells must be at most {MAX_TEXT_LENGTH} characters")
+                has_content = has_content or not _is_blank(cell)
+        if required and not has_content:
+            raise ValueError("is required")
+        return value
+    return check
+
+
+def _attachment_check(required: bool) -> Callable:
+    def check(value):
+        if value is None:
+            if required:
+                raise ValueError("is required")
+            return value
+        if not isinstance(value, dict) or not isinstance(value.get("filename"), str) \
+                or not isinstance(value.get("base64"), str):
+            raise ValueError("must be an uploaded file")
+        extension = value["filename"].rsplit(".", 1)[-1].lower() if "." in value["filename"] else ""
+        if extension not in ATTACHMENT_EXTENSIONS:
+            raise ValueError("has a file type that is not allowed")
+        encoded = value["base64"]
+        # Size from the encoded length first, so oversized payloads are never decoded
+        if len(encoded) * 3 // 4 - encoded[-2:].count("=") > ATTACHMENT_MAX_BYTES:
+            raise ValueError(f"must be at most {ATTACHMENT_MAX_BYTES // (1024 * 1024)}MB")
+        try:
+            base64.b64decode(encoded, validate=True)
+        except (binascii.Error, ValueError):
+            raise ValueError("is not a valid file upload")
+        return value
+    return check
+
+
+def _field_validator(field: dict) -> Optional[Callable]:
+    required = field.get("required", True)
+    field_type = field.get("type")
+    if field_type in ("text", "textarea"):
+        return _text_check(required)
+    if field_type == "number":
+        return _number_check(required)
+    if field_type == "date":
+        return _date_check(required)
+    if field_type == "select":
+        return _select_check(required, field.get("options"))
+    if field_type == "table":
+        return _table_check(required, field.get("column_headers"), field.get("num_rows"))
+    if field_type == "dropzone":
+        return _attachment_check(required)
+    return None
+
+
+def compile_validator(tmpl: dict) -> type:
+    """Build a pydantic model for the template's fields; form field names are used as aliases."""
+    definitions: Dict[str, Any] = {}
+    for index, field in enumerate(tmpl.get("fields") or []):
+        name = field.get("name")
+        if not name:
+            continue
+        check = _field_validator(field)
+        annotation = Annotated[Any, AfterValidator(check)] if check else Any
+        default = ... if field.get("required", True) else None
+        definitions[f"field_{index}"] = (annotation, Field(default, alias=name))
+    return create_model(
+        f"FormData_{tmpl.get('id', 'template')}",
+        __config__=ConfigDict(extra="forbid"),
+        **definitions,
+    )
+
+
+def get_validator(tmpl: dict) -> type:
+    key = (tmpl.get("id"), tmpl.get("updated_at") or tmpl.get("created_at"))
+    model = _validators.get(key)
+    if model is None:
+        model = compile_validator(tmpl)
+        _validators[key] = model
+        if len(_validators) > VALIDATOR_CACHE_SIZE:
+            _validators.popitem(last=False)
+    else:
+        _validators.move_to_end(key)
+    return model
+
+
+def validate_form_data(tmpl: dict, form_data: dict) -> dict:
+    """Check form_data against the template; raises a 400 listing every problem."""
+    try:
+        get_validator(tmpl).model_validate(form_data)
+    except ValidationError as exc:
+        labels = {f.get("name"): f.get("label") or f.get("name") for f in tmpl.get("fields") or []}
+        problems = []
+        for error in exc.errors():
+            name = error["loc"][0] if error["loc"] else ""
+            label = labels.get(name, name)
+            if error["type"] == "missing":
+                problems.append(f"{label} is required")
+            elif error["type"] == "extra_forbidden":
+                problems.append(f"Unknown field '{name}'")
+            elif error["type"] == "value_error":
+                problems.append(f"{label} {error['ctx']['error']}")
+            else:
+                problems.append(f"{label}: {error['msg']}")
+        raise HTTPException(status_code=400, detail="Invalid form data: " + "; ".join(problems))
+    return form_data
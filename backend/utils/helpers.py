@@ -6,12 +6,14 @@ import resend
 from email_validator import EmailNotValidError, validate_email
 from datetime import datetime, timezone, timedelta
 from passlib.context import CryptContext
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Query, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 from pathlib import Path
+from utils.metrics import mongo_listener
 import hashlib
+from typing import Optional
 
 ROOT_DIR = Path(__file__).parent.parent
 load_dotenv(ROOT_DIR / '.env')
@@ -21,6 +23,9 @@ logger = logging.getLogger(__name__)
 JWT_SECRET = os.environ.get('JWT_SECRET', 'fallback_secret')
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_HOURS = 24
+# Short-lived tokens for the SSE stream, whose credential has to travel in the URL
+STREAM_TOKEN_SCOPE = "notifications_stream"
+STREAM_TOKEN_TTL_SECONDS = int(os.environ.get('STREAM_TOKEN_TTL_SECONDS', '300'))
 
 from passlib.context import CryptContext
 
@@ -30,9 +35,10 @@ pwd_context = CryptContext(
 )
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 mongo_url = os.environ['MONGO_URL']
-_client = AsyncIOMotorClient(mongo_url)
+_client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_listener])
 db = _client[os.environ['DB_NAME']]
 
 RESEND_API_KEY = os.environ.get('RESEND_API_KEY', '')
@@ -43,6 +49,12 @@ RESEND_ALLOW_TEST_MODE = os.environ.get('RESEND_ALLOW_TEST_MODE', 'false').lower
 if RESEND_API_KEY:
     resend.api_key = RESEND_API_KEY
 
+# Outcomes of send_email_notification: rejected emails (invalid address,
+# missing sender configuration) fail the same way when retried
+EMAIL_SENT = "sent"
+EMAIL_RETRY = "retry"
+EMAIL_REJECTED = "rejected"
+
 
 def hash_password(password: str) -> str:
     # Pre-hash to fixed length (bcrypt-safe)
@@ -65,22 +77,34 @@ def create_token(user_id: str, role: str) -> str:
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
 
-def decode_token(token: str) -> dict:
+def create_stream_token(user_id: str) -> str:
+    payload = {
+        "sub": user_id,
+        "scope": STREAM_TOKEN_SCOPE,
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=STREAM_TOKEN_TTL_SECONDS)
+    }
+    return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
+
+
+def decode_token(token: str, scope: Optional[str] = None) -> dict:
+    """Decode a token issued for ``scope``; session tokens have no scope."""
     try:
-        return jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except jwt.InvalidTokenError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    if payload.get("scope") != scope:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return payload
 
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    payload = decode_token(credentials.credentials)
+async def get_user_from_token(token: str, scope: Optional[str] = None) -> dict:
+    payload = decode_token(token, scope)
     user = await db.users.find_one({"id": payload["sub"]}, {"_id": 0})
     if not user:
         raise HTTPException(status_code=401, detail="User not found")
-    logger.info(f"Login attempt for: {user.get('email', 'Unknown')}")
-    logger.info(f"User found: {bool(user)}")
+    logger.debug("Authenticated request for: %s", user.get('email', 'Unknown'))
     if not user.get("is_active", True):
         raise HTTPException(status_code=403, detail="Account disabled")
     if "has_viewed_tutorial" not in user:
@@ -88,6 +112,26 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
     return user
 
 
+async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    return await get_user_from_token(credentials.credentials)
+
+
+async def get_stream_user(
+    token: Optional[str] = Query(None),
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(optional_security),
+):
+    """
+    Like get_current_user, but also accepts ``?token=`` because EventSource
+    cannot set headers. URL tokens must be stream tokens from
+    create_stream_token, never the session token.
+    """
+    if credentials is not None:
+        return await get_user_from_token(credentials.credentials)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return await get_user_from_token(token, STREAM_TOKEN_SCOPE)
+
+
 async def require_admin(user=Depends(get_current_user)):
     if user["role"] != "super_admin":
         raise HTTPException(status_code=403, detail="Admin access required")
@@ -116,14 +160,15 @@ def build_sender_address() -> str:
     return sender_email
 
 
-async def send_email_notification(to_email: str, subject: str, html: str):
+async def send_email_notification(to_email: str, subject: str, html: str) -> str:
+    """Send one email; returns EMAIL_SENT, EMAIL_RETRY or EMAIL_REJECTED (skipped emails count as sent)."""
     if not RESEND_API_KEY:
-        logger.info(f"Email skipped (no API key): {subject} -> {to_email}")
-        return
+        logger.debug("Email skipped (no API key): %s -> %s", subject, to_email)
+        return EMAIL_SENT
 
     if not to_email:
-        logger.info(f"Email skipped (no recipient): {subject}")
-        return
+        logger.debug("Email skipped (no recipient): %s", subject)
+        return EMAIL_SENT
 
     try:
         recipient_email = normalize_email_address(to_email)
@@ -138,10 +183,14 @@ async def send_email_notification(to_email: str, subject: str, html: str):
             params["reply_to"] = normalize_email_address(REPLY_TO_EMAIL)
 
         response = await asyncio.to_thread(resend.Emails.send, params)
-        logger.info(f"Email sent: {subject} -> {recipient_email} ({response.get('id', 'no-id')})")
+        logger.info("Email sent: %s -> %s (%s)", subject, recipient_email, response.get('id', 'no-id'))
+        return EMAIL_SENT
     except EmailNotValidError as exc:
-        logger.error(f"Email validation failed for '{to_email}': {exc}")
+        logger.error("Email validation failed for '%s': %s", to_email, exc)
+        return EMAIL_REJECTED
     except ValueError as exc:
-        logger.error(f"Email configuration error: {exc}")
+        logger.error("Email configuration error: %s", exc)
+        return EMAIL_REJECTED
     except Exception as e:
-        logger.error(f"Email failed: {e}")
+        logger.error("Email failed: %s", e)
+        return EMAIL_RETRY
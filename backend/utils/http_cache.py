@@ -0,0 +1,128 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from utils.responses import FastJSONResponse
+
+
+class CachePolicy:
+    """Cache-Control policy an endpoint declares for its conditional responses."""
+
+    def __init__(self, max_age: int = 0, private: bool = True, immutable: bool = False):
+        self.max_age = max_age
+        self.private = private
+        self.immutable = immutable
+
+    def header_value(self) -> str:
+        parts = ["private" if self.private else "public"]
+        if self.max_age > 0:
+            parts.append(f"max-age={self.max_age}")
+        else:
+            # Cache the body but revalidate with the ETag on every use
+            parts.append("no-cache")
+        if self.immutable:
+            parts.append("immutable")
+        return ", ".join(parts)
+
+
+# Mutable per-user data: clients keep a copy but always revalidate
+REVALIDATE = CachePolicy()
+# Reference data that changes rarely (departments)
+REFERENCE_DATA = CachePolicy(max_age=60)
+# Content-addressed documents that never change (template versions)
+IMMUTABLE = CachePolicy(max_age=31536000, immutable=True)
+
+
+def weak_etag(value: bytes) -> str:
+    return f'W/"{hashlib.sha1(value).hexdigest()}"'
+
+
+def _parse_timestamp(value) -> Optional[datetime]:
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value))
+        except ValueError:
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.replace(microsecond=0)
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore the W/ prefix on both sides
+    target = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == target:
+            return True
+    return False
+
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime] = None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return _etag_matches(if_none_match, etag)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return last_modified <= since
+    return False
+
+
+def conditional_response(
+    request: Request,
+    content,
+    policy: CachePolicy = REVALIDATE,
+    etag_key: Optional[str] = None,
+    last_modified=None,
+    response_class=FastJSONResponse,
+) -> Response:
+    """
+    Build a JSON response carrying ETag / Last-Modified / Cache-Control headers,
+    or an empty 304 when the client's validators still match.
+
+    When ``etag_key`` is given (e.g. ``"{id}:{updated_at}"``) the ETag is derived
+    from it and the body is only rendered if the client actually needs it;
+    otherwise the ETag is a hash of the rendered body.
+    """
+    modified_at = _parse_timestamp(last_modified)
+    response = None
+    if etag_key is not None:
+        etag = weak_etag(etag_key.encode("utf-8"))
+    else:
+        response = response_class(content)
+        etag = weak_etag(response.body)
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": policy.header_value(),
+        "Vary": "Authorization",
+    }
+    if modified_at:
+        headers["Last-Modified"] = format_datetime(modified_at, usegmt=True)
+
+    if is_not_modified(request, etag, modified_at):
+        return Response(status_code=304, headers=headers)
+
+    if response is None:
+        response = response_class(content)
+    response.headers.update(headers)
+    return response
@@ -0,0 +1,251 @@
+"""
+In-process metrics exposed in Prometheus text format on /metrics.
+
+Per-route HTTP latency, Mongo command counts/durations (globally and per HTTP
+request), Redis publish latency and websocket fan-out time. Kept
+dependency-free: a handful of counters and histograms does not need
+prometheus_client.
+"""
+import bisect
+import threading
+import time
+from collections import Counter as ShapeCounter
+from contextvars import ContextVar
+from typing import Callable, Optional
+
+from pymongo import monitoring
+
+from utils import db_profiler
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 10.0)
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+_registry = []
+
+# Per-HTTP-request database activity; set by MetricsMiddleware and updated by
+# the Mongo listener (Motor copies the context into its executor threads)
+request_db_stats: ContextVar[Optional[dict]] = ContextVar("request_db_stats", default=None)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    """Gauge whose value is read from a callback at scrape time."""
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], float]):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        _registry.append(self)
+
+    def render(self):
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(self.callback())}",
+        ]
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value: float, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(float(bound))}"'
+                    lines.append(
+                        f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+                    )
+                label_str = _format_labels(self.labelnames, labels)
+                lines.append(f"{self.name}_sum{label_str} {_format_value(float(total))}")
+                lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    ("method", "route", "status"),
+)
+HTTP_REQUEST_DB_COMMANDS = Histogram(
+    "http_request_db_commands", "Mongo commands issued while serving one HTTP request.",
+    ("method", "route"), buckets=COUNT_BUCKETS,
+)
+HTTP_REQUEST_DB_SECONDS = Histogram(
+    "http_request_db_seconds", "Total Mongo command time spent serving one HTTP request.",
+    ("method", "route"),
+)
+MONGO_COMMAND_DURATION = Histogram(
+    "mongo_command_duration_seconds", "Mongo command duration.",
+    ("command", "collection"), buckets=FAST_BUCKETS,
+)
+MONGO_COMMAND_FAILURES = Counter(
+    "mongo_command_failures_total", "Mongo commands that failed.", ("command", "collection"),
+)
+HTTP_REQUESTS_REJECTED = Counter(
+    "http_requests_rejected_total", "Requests refused by rate limiting (429) or load shedding (503).",
+    ("route_class", "status"),
+)
+REDIS_PUBLISH_DURATION = Histogram(
+    "redis_publish_duration_seconds", "Latency of realtime event publishes to Redis.",
+    buckets=FAST_BUCKETS,
+)
+WEBSOCKET_FANOUT_DURATION = Histogram(
+    "websocket_fanout_duration_seconds", "Time to send one realtime event to every local websocket.",
+    buckets=FAST_BUCKETS,
+)
+WEBSOCKET_FANOUT_RECIPIENTS = Histogram(
+    "websocket_fanout_recipients", "Local websocket connections one realtime event was sent to.",
+    buckets=(0, 1, 5, 10, 50, 100, 500, 1000, 5000),
+)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds Mongo command timings into the metrics and the current request's counters."""
+
+    def __init__(self):
+        self._collections = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if event.command_name == "getMore":
+            collection = event.command.get("collection")
+        collection = collection if isinstance(collection, str) else ""
+        shape = command = None
+        if db_profiler.PROFILING_ENABLED and request_db_stats.get() is not None:
+            shape = db_profiler.query_shape(event.command_name, collection, event.command)
+            command = db_profiler.explainable(event.command_name, event.command)
+        self._collections[(event.connection_id, event.request_id)] = (collection, shape, command)
+
+    def _finish(self, event, failed: bool):
+        collection, shape, command = self._collections.pop(
+            (event.connection_id, event.request_id), ("", None, None)
+        )
+        seconds = event.duration_micros / 1_000_000
+        MONGO_COMMAND_DURATION.observe(seconds, event.command_name, collection)
+        if failed:
+            MONGO_COMMAND_FAILURES.inc(event.command_name, collection)
+        stats = request_db_stats.get()
+        if stats is not None:
+            stats["commands"] += 1
+            stats["seconds"] += seconds
+            if shape is not None:
+                stats["shapes"][shape] += 1
+                duration_ms = seconds * 1000
+                if command is not None and duration_ms >= db_profiler.SLOW_QUERY_MS:
+                    stats["slow"].append((command, shape, duration_ms))
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+
+mongo_listener = MongoCommandListener()
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and DB activity."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = {"commands": 0, "seconds": 0.0}
+        if db_profiler.PROFILING_ENABLED:
+            stats.update(shapes=ShapeCounter(), slow=[])
+        token = request_db_stats.set(stats)
+        status = {"code": 500}
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if db_profiler.PROFILING_ENABLED:
+                    message["headers"] = list(message["headers"]) + [
+                        (b"x-db-commands", str(stats["commands"]).encode())
+                    ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_REQUEST_DURATION.observe(elapsed, method, route_path, str(status["code"]))
+            HTTP_REQUEST_DB_COMMANDS.observe(stats["commands"], method, route_path)
+            HTTP_REQUEST_DB_SECONDS.observe(stats["seconds"], method, route_path)
+            request_db_stats.reset(token)
+            if db_profiler.PROFILING_ENABLED:
+                db_profiler.evaluate_request(method, route_path, stats)
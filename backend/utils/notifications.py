@@ -0,0 +1,140 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import List, Optional
+
+from realtime import manager
+from utils.email_digest import DIGEST_FREQUENCIES, queue_digest_items
+from utils.helpers import db, send_email_notification
+from utils.unread_counts import adjust_unread_count
+
+
+def notice(
+    user_id: str,
+    req: dict,
+    message: str,
+    type_: str,
+    subject: str,
+    html: str,
+    email: Optional[str] = None,
+) -> dict:
+    """
+    Describe one notification to deliver. When ``email`` is None the recipient's
+    address is looked up at delivery time (and the notice dropped if the user is gone).
+    """
+    return {
+        "user_id": user_id,
+        "request_id": req["id"],
+        "request_number": req["request_number"],
+        "message": message,
+        "type": type_,
+        "subject": subject,
+        "html": html,
+        "email": email,
+    }
+
+
+def _render_email(items: List[dict]):
+    if len(items) == 1:
+        return items[0]["subject"], items[0]["html"]
+    subject = f"{len(items)} request updates"
+    html = "<hr>".join(item["html"] for item in items)
+    return subject, html
+
+
+async def deliver_notifications(notices: List[dict], now: Optional[str] = None) -> List[dict]:
+    """
+    Persist, email and broadcast a batch of notices.
+
+    Recipients' addresses and email preferences are resolved with one query,
+    notifications are written with one insert_many, and each recipient gets a
+    single NOTIFICATION_CREATED event (carrying their new unread count)
+    however many notices they have. Email follows the recipient's
+    ``email_frequency``: one email now, queued for their digest, or none.
+    """
+    if not notices:
+        return []
+    now = now or datetime.now(timezone.utc).isoformat()
+
+    user_ids = list({n["user_id"] for n in notices})
+    users = await db.users.find(
+        {"id": {"$in": user_ids}},
+        {"_id": 0, "id": 1, "email": 1, "email_frequency": 1},
+    ).to_list(len(user_ids))
+    profiles = {u["id"]: u for u in users}
+
+    docs = []
+    recipients = {}
+    for n in notices:
+        profile = profiles.get(n["user_id"])
+        email = n.get("email")
+        if email is None:
+            if profile is None:
+                continue
+            email = profile.get("email", "")
+        doc = {
+            "id": str(uuid.uuid4()),
+            "user_id": n["user_id"],
+            "request_id": n["request_id"],
+            "request_number": n["request_number"],
+            "message": n["message"],
+            "type": n["type"],
+            "is_read": False,
+            "created_at": now,
+        }
+        docs.append(doc)
+        recipient = recipients.setdefault(n["user_id"], {
+            "email": email,
+            "frequency": (profile or {}).get("email_frequency") or "immediate",
+            "items": [],
+            "docs": [],
+        })
+        recipient["items"].append(n)
+        recipient["docs"].append(doc)
+
+    if not docs:
+        return []
+
+    await db.notifications.insert_many(docs)
+    for doc in docs:
+        doc.pop("_id", None)
+
+    await asyncio.gather(*(
+        send_email_notification(recipient["email"], *_render_email(recipient["items"]))
+        for recipient in recipients.values()
+        if recipient["frequency"] == "immediate"
+    ))
+    await queue_digest_items([
+        {
+            "user_id": user_id,
+            "email": recipient["email"],
+            "frequency": recipient["frequency"],
+            "request_id": item["request_id"],
+            "subject": item["subject"],
+            "html": item["html"],
+            "created_at": now,
+        }
+        for user_id, recipient in recipients.items()
+        if recipient["frequency"] in DIGEST_FREQUENCIES and recipient["email"]
+        for item in recipient["items"]
+    ])
+
+    unread_counts = await asyncio.gather(*(
+        adjust_unread_count(user_id, len(recipient["docs"]))
+        for user_id, recipient in recipients.items()
+    ))
+
+    for (user_id, recipient), unread_count in zip(recipients.items(), unread_counts):
+        latest = recipient["docs"][-1]
+        await manager.broadcast(
+            event="NOTIFICATION_CREATED",
+            payload={
+                "user_id": user_id,
+                "notification_id": latest["id"],
+                "type": latest["type"],
+                "count": len(recipient["docs"]),
+                "unread_count": unread_count,
+            }
+        )
+
+    return docs
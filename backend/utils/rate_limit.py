@@ -0,0 +1,295 @@
+"""
+Rate limiting and admission control for the API.
+
+Every /api request is put in a route class (auth, export, write, read) and
+charged against a token bucket for its client: the user from the bearer
+token, or the client IP for anonymous calls. Logins are charged per client
+IP and submitted email (auth), so one address behind a shared NAT does not
+lock everyone else out, plus a looser per-IP bucket (auth_ip) that caps
+guessing across many accounts. Buckets live in
+process memory, or in Redis (RATE_LIMIT_BACKEND=redis) so the limit holds
+across instances; Redis errors fall back to the in-memory buckets rather
+than failing requests. Limits are ``class=rate/burst`` pairs in RATE_LIMITS,
+with rate in requests per second.
+
+Independently, at most MAX_CONCURRENT_REQUESTS requests are handled at once
+per process; beyond that the API answers 503 straight away instead of
+queueing work on the event loop. Long-lived streams are not counted.
+"""
+import ipaddress
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+import jwt
+
+from utils.helpers import JWT_ALGORITHM, JWT_SECRET
+from utils.metrics import HTTP_REQUESTS_REJECTED
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', '1').lower() not in ('0', 'false', 'no')
+RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory').lower()
+DEFAULT_RATE_LIMITS = "read=10/40,write=3/15,export=0.1/3,auth=0.2/5,auth_ip=1/30"
+MAX_CONCURRENT_REQUESTS = int(os.environ.get('MAX_CONCURRENT_REQUESTS', '256'))
+# Behind a proxy (e.g. Render) the peer is the proxy, so the client address comes from
+# X-Forwarded-For; the header is only honoured when the peer is one of TRUSTED_PROXIES
+TRUST_FORWARDED_FOR = os.environ.get('TRUST_FORWARDED_FOR', '1').lower() not in ('0', 'false', 'no')
+DEFAULT_TRUSTED_PROXIES = "127.0.0.0/8,10.0.0.0/8,172.16.0.0/12,192.168.0.0/16,::1/128,fc00::/7"
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(cidr.strip(), strict=False)
+    for cidr in os.environ.get('TRUSTED_PROXIES', DEFAULT_TRUSTED_PROXIES).split(",")
+    if cidr.strip()
+]
+RATE_LIMIT_MAX_KEYS = 100_000
+REDIS_KEY_PREFIX = "ratelimit:"
+
+LONG_LIVED_PATHS = {"/api/notifications/stream"}
+EXPORT_PATH_PREFIXES = ("/api/requests/export", "/api/analytics/")
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+_in_flight = 0
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    limits = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        name, _, value = item.partition("=")
+        rate, _, burst = value.partition("/")
+        limits[name.strip()] = (float(rate), float(burst or rate))
+    return limits
+
+
+ROUTE_LIMITS = {
+    **parse_rate_limits(DEFAULT_RATE_LIMITS),
+    **parse_rate_limits(os.environ.get('RATE_LIMITS', '')),
+}
+
+
+def in_flight_requests() -> int:
+    return _in_flight
+
+
+def route_class(method: str, path: str) -> str:
+    if path == "/api/auth/login":
+        return "auth"
+    if path.startswith(EXPORT_PATH_PREFIXES):
+        return "export"
+    if method in WRITE_METHODS:
+        return "write"
+    return "read"
+
+
+@lru_cache(maxsize=4096)
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in TRUSTED_PROXIES)
+
+
+def _client_ip(scope) -> str:
+    """
+    The peer address, or behind trusted proxies the right-most X-Forwarded-For
+    hop that is not itself a trusted proxy. Hops left of it are client-supplied
+    and could be spoofed.
+    """
+    client = scope.get("client")
+    peer = client[0] if client else "unknown"
+    if not TRUST_FORWARDED_FOR or not _is_trusted_proxy(peer):
+        return peer
+    hops = []
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            hops.extend(hop.strip() for hop in value.decode("latin-1").split(","))
+    for hop in reversed(hops):
+        if hop and not _is_trusted_proxy(hop):
+            return hop
+    return hops[0] if hops and hops[0] else peer
+
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return token if scheme.lower() == "bearer" else None
+    # Only the EventSource stream authenticates with ?token= (a short-lived stream token)
+    if scope["path"] in LONG_LIVED_PATHS:
+        for pair in scope.get("query_string", b"").decode("latin-1").split("&"):
+            if pair.startswith("token="):
+                return pair[len("token="):]
+    return None
+
+
+def client_key(scope, cls: str) -> str:
+    """The user id from a valid bearer token (signature check only, no DB), else the client IP."""
+    if cls != "auth":
+        token = _bearer_token(scope)
+        if token:
+            try:
+                return "u:" + jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])["sub"]
+            except (jwt.InvalidTokenError, KeyError):
+                pass
+    return "ip:" + _client_ip(scope)
+
+
+async def _read_login_email(receive):
+    """
+    The email submitted to the login endpoint, and a ``receive`` that
+    replays the consumed body to the app.
+    """
+    messages, body = [], b""
+    while True:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+
+    async def replay():
+        return messages.pop(0) if messages else await receive()
+
+    try:
+        email = json.loads(body).get("email")
+    except (ValueError, AttributeError):
+        email = None
+    return (email.strip().lower() if isinstance(email, str) else ""), replay
+
+
+class MemoryTokenBuckets:
+    """Token buckets in process memory, least recently used keys evicted past RATE_LIMIT_MAX_KEYS."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    async def hit(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        """Take one token; returns (allowed, seconds until a token is available)."""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        allowed = tokens >= 1
+        if allowed:
+            tokens -= 1
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return allowed, 0.0 if allowed else (1 - tokens) / rate
+
+
+# Refill and take in one atomic step, using the Redis clock so instances agree
+_TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= 1 then
+  tokens = tokens - 1
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisTokenBuckets:
+    """Token buckets shared through Redis; falls back to ``fallback`` when Redis is unavailable."""
+
+    def __init__(self, get_redis, fallback: MemoryTokenBuckets):
+        self.get_redis = get_redis
+        self.fallback = fallback
+        self._script = None
+        self._script_redis = None
+
+    async def hit(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        redis = self.get_redis()
+        if redis is None:
+            return await self.fallback.hit(key, rate, burst)
+        if self._script_redis is not redis:
+            self._script = redis.register_script(_TOKEN_BUCKET_SCRIPT)
+            self._script_redis = redis
+        try:
+            allowed, tokens = await self._script(keys=[REDIS_KEY_PREFIX + key], args=[rate, burst])
+        except Exception as exc:
+            logger.warning("Redis rate limiting failed, using in-memory buckets: %s", exc)
+            return await self.fallback.hit(key, rate, burst)
+        allowed = int(allowed) == 1
+        return allowed, 0.0 if allowed else (1 - float(tokens)) / rate
+
+
+async def _reject(send, status: int, detail: str, retry_after: float):
+    body = json.dumps({"detail": detail}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(max(1, int(retry_after + 0.999))).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware applying per-client token buckets and the in-flight request cap."""
+
+    def __init__(self, app):
+        self.app = app
+        memory = MemoryTokenBuckets()
+        if RATE_LIMIT_BACKEND == "redis":
+            from realtime import manager
+            self.buckets = RedisTokenBuckets(lambda: manager.redis, memory)
+        else:
+            self.buckets = memory
+
+    async def __call__(self, scope, receive, send):
+        global _in_flight
+        if scope["type"] != "http" or scope["method"] == "OPTIONS" or not scope["path"].startswith("/api/"):
+            await self.app(scope, receive, send)
+            return
+
+        cls = route_class(scope["method"], scope["path"])
+        counted = MAX_CONCURRENT_REQUESTS > 0 and scope["path"] not in LONG_LIVED_PATHS
+        if counted:
+            if _in_flight >= MAX_CONCURRENT_REQUESTS:
+                HTTP_REQUESTS_REJECTED.inc(cls, "503")
+                await _reject(send, 503, "Server is busy, please retry shortly", 1)
+                return
+            # Taken before any await, so concurrent requests cannot all pass the check
+            _in_flight += 1
+        try:
+            if RATE_LIMIT_ENABLED:
+                key = client_key(scope, cls)
+                hits = [(cls, key)]
+                if cls == "auth":
+                    email, receive = await _read_login_email(receive)
+                    hits = [("auth_ip", key), (cls, f"{key}:{email}")]
+                for bucket, bucket_key in hits:
+                    limit = ROUTE_LIMITS.get(bucket)
+                    if not limit:
+                        continue
+                    allowed, retry_after = await self.buckets.hit(f"{bucket}:{bucket_key}", *limit)
+                    if not allowed:
+                        HTTP_REQUESTS_REJECTED.inc(cls, "429")
+                        await _reject(send, 429, "Too many requests, please slow down", retry_after)
+                        return
+            await self.app(scope, receive, send)
+        finally:
+            if counted:
+                _in_flight -= 1
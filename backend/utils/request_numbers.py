@@ -0,0 +1,47 @@
+"""
+Request numbers (REQ-00042) allocated from an atomic counter.
+
+``db.counters`` holds ``{_id: "request_number", seq: n}``, the last number
+handed out. Numbers are never reused, even after archive.py moves closed
+requests into ``requests_archive``. A missing counter is seeded from the
+highest number in both collections before the first allocation.
+"""
+from pymongo import ReturnDocument
+
+COUNTER_ID = "request_number"
+
+
+def format_request_number(number: int) -> str:
+    return f"REQ-{number:05d}"
+
+
+async def _highest_request_number(db) -> int:
+    pipeline = [
+        {"$match": {"request_number": {"$regex": "^REQ-[0-9]+$"}}},
+        {"$group": {"_id": None, "highest": {"$max": {"$toInt": {"$substr": ["$request_number", 4, 20]}}}}},
+    ]
+    highest = 0
+    for collection in (db.requests, db.requests_archive):
+        async for row in collection.aggregate(pipeline):
+            highest = max(highest, row.get("highest") or 0)
+    return highest
+
+
+async def ensure_request_number_counter(db) -> None:
+    """Make sure the counter is at least the highest existing number. Safe to run repeatedly."""
+    highest = await _highest_request_number(db)
+    await db.counters.update_one({"_id": COUNTER_ID}, {"$max": {"seq": highest}}, upsert=True)
+
+
+async def allocate_request_numbers(db, count: int = 1) -> int:
+    """Reserve ``count`` consecutive numbers and return the first one."""
+    update = {"$inc": {"seq": count}}
+    counter = await db.counters.find_one_and_update(
+        {"_id": COUNTER_ID}, update, return_document=ReturnDocument.AFTER
+    )
+    if counter is None:
+        await ensure_request_number_counter(db)
+        counter = await db.counters.find_one_and_update(
+            {"_id": COUNTER_ID}, update, return_document=ReturnDocument.AFTER
+        )
+    return counter["seq"] - count + 1
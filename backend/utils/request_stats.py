@@ -0,0 +1,66 @@
+"""
+Incrementally maintained request counts in ``db.request_stats``.
+
+One document per (department, form template, month of creation) bucket
+holding a total and per-status counts. Request writes adjust the bucket with
+``$inc`` so analytics read a few hundred small documents instead of
+aggregating the whole requests collection. Failures here never fail the
+request itself; ``migrations.rebuild_request_stats`` recomputes the
+collection from scratch to repair drift.
+"""
+import logging
+from typing import Iterable, Tuple
+
+from pymongo import UpdateOne
+
+from utils.helpers import db
+
+logger = logging.getLogger(__name__)
+
+
+def stats_key(req: dict) -> dict:
+    return {
+        "department_id": req.get("department_id") or "",
+        "form_template_id": req.get("form_template_id") or "",
+        "month": (req.get("created_at") or "")[:7],
+    }
+
+
+def bucket_id(key: dict) -> str:
+    return f"{key['department_id']}|{key['form_template_id']}|{key['month']}"
+
+
+def _bucket_update(req: dict, inc: dict) -> UpdateOne:
+    key = stats_key(req)
+    return UpdateOne(
+        {"_id": bucket_id(key)},
+        {
+            "$inc": inc,
+            "$set": {"form_template_name": req.get("form_template_name", "")},
+            "$setOnInsert": key,
+        },
+        upsert=True,
+    )
+
+
+async def _write(ops):
+    if not ops:
+        return
+    try:
+        await db.request_stats.bulk_write(ops, ordered=False)
+    except Exception as exc:
+        logger.warning("Failed to update request stats (rebuild to repair): %s", exc)
+
+
+async def record_created(req: dict):
+    await _write([_bucket_update(req, {"total": 1, f"by_status.{req['status']}": 1})])
+
+
+async def record_transitions(transitions: Iterable[Tuple[dict, str]]):
+    """Move each (request as read, new status) pair between status counters."""
+    ops = [
+        _bucket_update(req, {f"by_status.{req['status']}": -1, f"by_status.{new_status}": 1})
+        for req, new_status in transitions
+        if req["status"] != new_status
+    ]
+    await _write(ops)
@@ -0,0 +1,55 @@
+import json
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson when it is installed.
+
+    Handlers that return this class directly also skip FastAPI's
+    jsonable_encoder pass, which is the bulk of the serialization cost for
+    large lists of Mongo documents (they only hold JSON-native values).
+    """
+
+    def render(self, content) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(
+            content,
+            ensure_ascii=False,
+            allow_nan=False,
+            separators=(",", ":"),
+        ).encode("utf-8")
+
+
+class SkipStreamCompression:
+    """
+    Wraps a compression middleware so it never sees Server-Sent Events.
+
+    GZip and Brotli hold small writes back until their buffer fills, which
+    would delay each event until the next ones arrive. Requests to
+    ``skip_paths`` or that accept ``text/event-stream`` go straight to the app.
+    """
+
+    def __init__(self, app, compressor, skip_paths=(), **options):
+        self.app = app
+        self.compressed = compressor(app, **options)
+        self.skip_paths = frozenset(skip_paths)
+
+    def _is_event_stream(self, scope) -> bool:
+        if scope["path"] in self.skip_paths:
+            return True
+        accept = dict(scope["headers"]).get(b"accept", b"")
+        return b"text/event-stream" in accept
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and self._is_event_stream(scope):
+            await self.app(scope, receive, send)
+            return
+        await self.compressed(scope, receive, send)
@@ -0,0 +1,176 @@
+"""
+Approval turnaround (SLA) analytics.
+
+Every started approval or custodian step becomes a row: it starts when the
+request was created (first step) or when the previous step was acted on, and
+ends at its own ``acted_at``. Steps still open on active requests count as
+backlog and age until now.
+
+Requests are streamed with a cursor and turned into step rows in batches
+that pandas parses and diffs in one vectorized pass. The resulting frame is
+kept in memory; each refresh only rescans requests whose ``updated_at`` is at
+or after the last one seen and replaces their rows. Archived requests are
+closed and never change, so they are only read on the first, full scan.
+"""
+import asyncio
+import os
+import time
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from utils.helpers import db
+from utils.workflow import ACTIVE_STATUSES
+
+SLA_CACHE_TTL_SECONDS = float(os.environ.get('SLA_CACHE_TTL_SECONDS', '300'))
+SLA_SCAN_BATCH_SIZE = int(os.environ.get('SLA_SCAN_BATCH_SIZE', '2000'))
+
+GROUP_COLUMNS = {"department": "department_id", "approver": "actor_id", "step": "step"}
+
+_PROJECTION = {
+    "_id": 0, "id": 1, "status": 1, "department_id": 1, "created_at": 1, "updated_at": 1,
+    "approvals.step": 1, "approvals.approver_id": 1, "approvals.approver_name": 1,
+    "approvals.status": 1, "approvals.acted_at": 1,
+    "custodian.user_id": 1, "custodian.user_name": 1, "custodian.status": 1, "custodian.acted_at": 1,
+}
+_COLUMNS = ["request_id", "department_id", "actor_id", "actor_name", "step", "started_at", "acted_at"]
+
+_steps: Optional[pd.DataFrame] = None
+_watermark: Optional[str] = None
+_refreshed_at = 0.0
+_refresh_lock = asyncio.Lock()
+
+
+def _step_rows(doc: dict) -> List[tuple]:
+    """Rows for every step of one request that has started, in chain order."""
+    rows = []
+    is_active = doc.get("status") in ACTIVE_STATUSES
+    started = doc.get("created_at")
+    base = (doc["id"], doc.get("department_id") or "")
+
+    for approval in sorted(doc.get("approvals") or [], key=lambda a: a.get("step", 0)):
+        acted = approval.get("acted_at")
+        if not started or approval.get("status") == "waiting" or (not acted and not is_active):
+            return rows
+        rows.append(base + (
+            approval.get("approver_id") or "", approval.get("approver_name") or "",
+            str(approval.get("step", "")), started, acted,
+        ))
+        if not acted or approval.get("status") == "rejected":
+            return rows
+        started = acted
+
+    custodian = doc.get("custodian") or {}
+    acted = custodian.get("acted_at")
+    if started and custodian.get("user_id") and custodian.get("status") != "waiting" and (acted or is_active):
+        rows.append(base + (
+            custodian["user_id"], custodian.get("user_name") or "", "custodian", started, acted,
+        ))
+    return rows
+
+
+def _frame(rows: List[tuple]) -> pd.DataFrame:
+    frame = pd.DataFrame.from_records(rows, columns=_COLUMNS)
+    for column in ("started_at", "acted_at"):
+        frame[column] = pd.to_datetime(frame[column], utc=True, format="ISO8601", errors="coerce")
+    frame["hours"] = (frame["acted_at"] - frame["started_at"]).dt.total_seconds() / 3600
+    return frame
+
+
+async def _refresh():
+    global _steps, _watermark, _refreshed_at
+    if _watermark is None:
+        sources = [(db.requests_archive, {}, False), (db.requests, {}, True)]
+    else:
+        sources = [(db.requests, {"updated_at": {"$gte": _watermark}}, True)]
+
+    frames, rows, seen = [], [], []
+    watermark = _watermark
+    for collection, query, is_hot in sources:
+        async for doc in collection.find(query, _PROJECTION).batch_size(SLA_SCAN_BATCH_SIZE):
+            seen.append(doc["id"])
+            rows.extend(_step_rows(doc))
+            updated_at = doc.get("updated_at")
+            if is_hot and updated_at and (watermark is None or updated_at > watermark):
+                watermark = updated_at
+            if len(seen) % SLA_SCAN_BATCH_SIZE == 0:
+                frames.append(_frame(rows))
+                rows = []
+    if rows or not frames:
+        frames.append(_frame(rows))
+
+    steps = _steps
+    if steps is not None and seen:
+        steps = steps[~steps["request_id"].isin(seen)]
+    if steps is not None and not steps.empty:
+        frames.insert(0, steps)
+    _steps = pd.concat([f for f in frames if not f.empty] or frames[:1], ignore_index=True)
+    _watermark = watermark
+    _refreshed_at = time.monotonic()
+
+
+async def get_step_frame() -> pd.DataFrame:
+    """The cached step frame, incrementally refreshed once it is older than SLA_CACHE_TTL_SECONDS."""
+    if _steps is None or time.monotonic() - _refreshed_at >= SLA_CACHE_TTL_SECONDS:
+        async with _refresh_lock:
+            if _steps is None or time.monotonic() - _refreshed_at >= SLA_CACHE_TTL_SECONDS:
+                await _refresh()
+    return _steps
+
+
+def _as_python(value):
+    if value is None or pd.isna(value):
+        return None
+    if isinstance(value, np.integer):
+        return int(value)
+    if isinstance(value, (float, np.floating)):
+        return round(float(value), 2)
+    return value
+
+
+async def approval_turnaround(
+    group_by: str = "department",
+    department_id: Optional[str] = None,
+    since: Optional[str] = None,
+) -> List[dict]:
+    """
+    p50/p90/mean hours per completed step and backlog size/age per open step,
+    grouped by department, approver (actor) or step.
+    """
+    key = GROUP_COLUMNS[group_by]
+    steps = await get_step_frame()
+    if department_id:
+        steps = steps[steps["department_id"] == department_id]
+
+    done = steps[steps["acted_at"].notna()]
+    if since:
+        done = done[done["acted_at"] >= pd.Timestamp(since, tz="UTC")]
+    open_steps = steps[steps["acted_at"].isna() & steps["started_at"].notna()]
+    ages = (pd.Timestamp.now(tz="UTC") - open_steps["started_at"]).dt.total_seconds() / 3600
+
+    hours = done.groupby(key)["hours"]
+    backlog = ages.groupby(open_steps[key])
+    summary = pd.DataFrame({
+        "completed_steps": hours.size(),
+        "p50_hours": hours.quantile(0.5),
+        "p90_hours": hours.quantile(0.9),
+        "mean_hours": hours.mean(),
+    }).join(pd.DataFrame({
+        "pending_steps": backlog.size(),
+        "p50_pending_age_hours": backlog.median(),
+        "oldest_pending_hours": backlog.max(),
+    }), how="outer")
+    summary[["completed_steps", "pending_steps"]] = summary[["completed_steps", "pending_steps"]].fillna(0)
+
+    names = steps.groupby("actor_id")["actor_name"].last() if group_by == "approver" else None
+    results = []
+    for group, row in summary.sort_values("completed_steps", ascending=False).iterrows():
+        entry = {key: group}
+        if names is not None:
+            entry["actor_name"] = names.get(group, "")
+        entry.update({column: _as_python(value) for column, value in row.items()})
+        entry["completed_steps"] = int(entry["completed_steps"] or 0)
+        entry["pending_steps"] = int(entry["pending_steps"] or 0)
+        results.append(entry)
+    return results
@@ -0,0 +1,64 @@
+"""
+Immutable, content-addressed snapshots of form templates.
+
+A version holds what is needed to render a request's form data (name,
+description, fields). Its id is a hash of that content, so saving the same
+content twice yields the same version, and a version document never changes
+once written. Templates point at their latest snapshot via
+``current_version_id``; requests record the ``template_version_id`` they were
+created against.
+"""
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Optional
+
+from utils.helpers import db
+
+_SNAPSHOT_KEYS = ("name", "description", "fields")
+
+VERSION_CACHE_SIZE = 512
+
+# Version ids already known to exist, to skip the upsert on repeat saves
+_written = set()
+# Versions never change, so cached copies never need invalidating
+_versions: "OrderedDict[str, dict]" = OrderedDict()
+
+
+def snapshot(tmpl: dict) -> dict:
+    content = {key: tmpl.get(key) for key in _SNAPSHOT_KEYS}
+    encoded = json.dumps([tmpl["id"], content], sort_keys=True, separators=(",", ":"), default=str)
+    return {
+        "id": hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32],
+        "template_id": tmpl["id"],
+        **content,
+    }
+
+
+async def save_template_version(tmpl: dict, database=None) -> str:
+    """Write the snapshot for ``tmpl`` if it does not exist yet and return its id."""
+    version = snapshot(tmpl)
+    if version["id"] not in _written:
+        await (database if database is not None else db).form_template_versions.update_one(
+            {"id": version["id"]},
+            {"$setOnInsert": {**version, "created_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True,
+        )
+        _written.add(version["id"])
+    return version["id"]
+
+
+async def get_template_version(version_id: Optional[str]) -> Optional[dict]:
+    if not version_id:
+        return None
+    version = _versions.get(version_id)
+    if version is not None:
+        _versions.move_to_end(version_id)
+        return version
+    version = await db.form_template_versions.find_one({"id": version_id}, {"_id": 0})
+    if version is not None:
+        _versions[version_id] = version
+        if len(_versions) > VERSION_CACHE_SIZE:
+            _versions.popitem(last=False)
+    return version
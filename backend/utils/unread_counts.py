@@ -0,0 +1,40 @@
+"""
+Per-user unread notification counters in ``db.notification_counters``.
+
+One ``{_id: user_id, unread: n}`` document per user, adjusted with ``$inc``
+when notifications are delivered or marked read, so the bell and dashboard
+read one small document instead of counting the user's notifications. A
+missing counter is initialized from a count on first read; increments for a
+user without a counter are skipped, since that count will include them.
+``archive.reconcile_unread_counts`` repairs drift (e.g. after pruning).
+"""
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from utils.helpers import db
+
+
+async def get_unread_count(user_id: str) -> int:
+    counter = await db.notification_counters.find_one({"_id": user_id})
+    if counter is not None:
+        return max(counter.get("unread", 0), 0)
+    unread = await db.notifications.count_documents({"user_id": user_id, "is_read": False})
+    try:
+        await db.notification_counters.update_one(
+            {"_id": user_id}, {"$setOnInsert": {"unread": unread}}, upsert=True
+        )
+    except DuplicateKeyError:
+        pass
+    return unread
+
+
+async def adjust_unread_count(user_id: str, delta: int) -> int:
+    """Add ``delta`` to the user's counter and return the new unread count."""
+    counter = await db.notification_counters.find_one_and_update(
+        {"_id": user_id},
+        {"$inc": {"unread": delta}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if counter is None:
+        return await get_unread_count(user_id)
+    return max(counter.get("unread", 0), 0)
@@ -0,0 +1,69 @@
+import os
+import time
+from typing import Dict, Iterable
+
+from utils.helpers import db
+
+MANAGER_MAP_TTL_SECONDS = float(os.environ.get('MANAGER_MAP_TTL_SECONDS', '60'))
+DEPARTMENT_MAP_TTL_SECONDS = float(os.environ.get('DEPARTMENT_MAP_TTL_SECONDS', '60'))
+
+_USER_PROJECTION = {"_id": 0, "id": 1, "name": 1, "email": 1, "role": 1, "department_id": 1, "is_active": 1}
+
+_manager_map: Dict[str, dict] = {}
+_manager_map_expires_at = 0.0
+_department_map: Dict[str, dict] = {}
+_department_map_expires_at = 0.0
+
+
+async def get_department_managers() -> Dict[str, dict]:
+    """
+    Map of department id -> its active Manager, loaded with a single query and
+    kept for MANAGER_MAP_TTL_SECONDS. User writes on this instance invalidate it.
+    """
+    global _manager_map, _manager_map_expires_at
+    if time.monotonic() < _manager_map_expires_at:
+        return _manager_map
+
+    managers = await db.users.find(
+        {"role": "manager", "is_active": True},
+        _USER_PROJECTION,
+    ).to_list(None)
+    manager_map = {}
+    for manager_user in managers:
+        if manager_user.get("department_id"):
+            manager_map.setdefault(manager_user["department_id"], manager_user)
+
+    _manager_map = manager_map
+    _manager_map_expires_at = time.monotonic() + MANAGER_MAP_TTL_SECONDS
+    return _manager_map
+
+
+def invalidate_department_managers():
+    global _manager_map_expires_at
+    _manager_map_expires_at = 0.0
+
+
+async def get_department_map() -> Dict[str, dict]:
+    """Every department keyed by id, kept for DEPARTMENT_MAP_TTL_SECONDS."""
+    global _department_map, _department_map_expires_at
+    if time.monotonic() < _department_map_expires_at:
+        return _department_map
+
+    departments = await db.departments.find({}, {"_id": 0}).to_list(None)
+    _department_map = {d["id"]: d for d in departments}
+    _department_map_expires_at = time.monotonic() + DEPARTMENT_MAP_TTL_SECONDS
+    return _department_map
+
+
+def invalidate_department_map():
+    global _department_map_expires_at
+    _department_map_expires_at = 0.0
+
+
+async def get_users_by_ids(user_ids: Iterable[str]) -> Dict[str, dict]:
+    """Fetch several users with one ``$in`` query, keyed by id."""
+    ids = [uid for uid in set(user_ids) if uid]
+    if not ids:
+        return {}
+    users = await db.users.find({"id": {"$in": ids}}, _USER_PROJECTION).to_list(len(ids))
+    return {u["id"]: u for u in users}
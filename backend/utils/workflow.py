@@ -0,0 +1,81 @@
+from typing import List, Optional
+
+ACTIVE_STATUSES = ("in_progress", "pending")
+
+# Request fields a workflow transition can change, sent as realtime patches
+DELTA_FIELDS = (
+    "status", "current_approval_step", "current_actor_id", "approvals", "custodian", "updated_at", "version",
+)
+
+
+def current_actor_id(doc: dict) -> Optional[str]:
+    """Return the user whose action the request is waiting on, if any."""
+    status = doc.get("status")
+    if status == "in_progress":
+        step = doc.get("current_approval_step")
+        for a in doc.get("approvals") or []:
+            if a.get("step") == step and a.get("status") == "pending":
+                return a.get("approver_id")
+        return None
+    if status == "pending":
+        custodian = doc.get("custodian") or {}
+        if custodian.get("status") == "pending":
+            return custodian.get("user_id")
+    return None
+
+
+def participant_ids(doc: dict) -> List[str]:
+    """Requester, every approver in the chain and the custodian, without duplicates."""
+    ids = []
+    candidates = [doc.get("requester_id")]
+    candidates.extend(a.get("approver_id") for a in doc.get("approvals") or [])
+    candidates.append((doc.get("custodian") or {}).get("user_id"))
+    for user_id in candidates:
+        if user_id and user_id not in ids:
+            ids.append(user_id)
+    return ids
+
+
+def actor_fields(doc: dict) -> dict:
+    """Denormalized fields kept on every request so inbox and access queries hit one index."""
+    return {
+        "current_actor_id": current_actor_id(doc),
+        "participant_ids": participant_ids(doc),
+    }
+
+
+def can_view_request(doc: dict, user_id: str) -> bool:
+    ids = doc.get("participant_ids")
+    if ids is None:
+        # Legacy request the request_actor_fields backfill has not reached yet
+        ids = participant_ids(doc)
+    return user_id in ids
+
+
+def transition_guard(doc: dict) -> dict:
+    """
+    Filter matching the request only while it is still in the state ``doc`` was
+    read in, so concurrent actions on the same step cannot both succeed.
+    """
+    return {
+        "id": doc["id"],
+        "status": doc["status"],
+        "current_approval_step": doc.get("current_approval_step"),
+        # Requests the request_version backfill has not reached yet have no version;
+        # the transition's $inc then starts it at 1
+        "version": doc["version"] if "version" in doc else {"$exists": False},
+    }
+
+
+def request_delta(doc: dict) -> dict:
+    """
+    Versioned patch of a request's workflow fields for realtime events.
+    ``participant_ids`` decides which connections receive the patch; it is
+    not sent itself.
+    """
+    return {
+        "request_id": doc["id"],
+        "version": doc.get("version"),
+        "participant_ids": doc["participant_ids"] if "participant_ids" in doc else participant_ids(doc),
+        "patch": {field: doc.get(field) for field in DELTA_FIELDS},
+    }
@@ -20,7 +20,22 @@ const TYPE_COLORS = {
   request_rejected: "text-red-500 bg-red-50",
 };
 
-export default function NotificationPanel({ notifications, onMarkRead, onMarkAllRead, onClose, onSelectRequest }) {
+const EMAIL_FREQUENCY_OPTIONS = [
+  { value: "immediate", label: "Email each update" },
+  { value: "hourly", label: "Hourly email digest" },
+  { value: "daily", label: "Daily email digest" },
+  { value: "off", label: "No emails" },
+];
+
+export default function NotificationPanel({
+  notifications,
+  emailFrequency = "immediate",
+  onChangeEmailFrequency,
+  onMarkRead,
+  onMarkAllRead,
+  onClose,
+  onSelectRequest,
+}) {
   return (
     <div
       className="fixed left-1/2 -translate-x-1/2 top-16 w-[92vw] max-w-[24rem] bg-white rounded-xl shadow-2xl border border-slate-200 z-50 animate-slide-up sm:absolute sm:left-auto sm:translate-x-0 sm:right-0 sm:top-12 sm:w-96"
@@ -79,7 +94,17 @@ export default function NotificationPanel({ notifications, onMarkRead, onMarkAll
           })
         )}
       </div>
-      <div className="p-3 border-t border-slate-100 text-center">
+      <div className="flex items-center justify-between gap-2 p-3 border-t border-slate-100">
+        <select
+          value={emailFrequency}
+          onChange={(e) => onChangeEmailFrequency?.(e.target.value)}
+          className="text-xs text-slate-600 bg-transparent border border-slate-200 rounded-md px-2 py-1"
+          data-testid="email-frequency"
+        >
+          {EMAIL_FREQUENCY_OPTIONS.map((opt) => (
+            <option key={opt.value} value={opt.value}>{opt.label}</option>
+          ))}
+        </select>
         <button onClick={onClose} className="text-xs text-slate-500 hover:text-slate-700">Close</button>
       </div>
     </div>
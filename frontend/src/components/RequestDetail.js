@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { Textarea } from "@/components/ui/textarea";
 import { Badge } from "@/components/ui/badge";
@@ -30,6 +30,54 @@ import {
 } from "@/components/ui/table";
 import { Card, CardContent } from "@/components/ui/card";
 import { differenceInHours, format } from "date-fns";
+import { getTemplateVersion } from "@/lib/api";
+
+// Template versions never change, so each one is fetched at most once per session
+const templateVersionCache = new Map();
+
+export function rememberTemplateVersion(version) {
+  if (version?.id) templateVersionCache.set(version.id, version);
+}
+
+function useTemplateVersion(versionId) {
+  const [version, setVersion] = useState(
+    () => templateVersionCache.get(versionId) || null,
+  );
+
+  useEffect(() => {
+    if (!versionId) {
+      setVersion(null);
+      return undefined;
+    }
+    if (templateVersionCache.has(versionId)) {
+      setVersion(templateVersionCache.get(versionId));
+      return undefined;
+    }
+    let cancelled = false;
+    getTemplateVersion(versionId)
+      .then((res) => {
+        templateVersionCache.set(versionId, res.data);
+        if (!cancelled) setVersion(res.data);
+      })
+      .catch(() => {
+        if (!cancelled) setVersion(null);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [versionId]);
+
+  return version;
+}
+
+function orderedFormEntries(formData, version) {
+  const entries = Object.entries(formData || {});
+  if (!version?.fields?.length) return entries;
+  const order = new Map(version.fields.map((f, i) => [f.name, i]));
+  return entries.sort(
+    ([a], [b]) => (order.get(a) ?? order.size) - (order.get(b) ?? order.size),
+  );
+}
 
 const STATUS_CONFIG = {
   in_progress: {
@@ -188,6 +236,10 @@ export default function RequestDetail({
   const [comments, setComments] = useState("");
   const [actionLoading, setActionLoading] = useState(false);
   const [cancelLoading, setCancelLoading] = useState(false);
+  const templateVersion = useTemplateVersion(request?.template_version_id);
+  const fieldLabels = Object.fromEntries(
+    (templateVersion?.fields || []).map((f) => [f.name, f.label]),
+  );
 
   if (!request) {
     return (
@@ -345,8 +397,8 @@ export default function RequestDetail({
             Request Details
           </h4>
           <div className="flex flex-wrap -mx-2 gap-y-4">
-            {Object.entries(request.form_data || {}).map(([key, value]) => {
-              const label = key.replace(/_/g, " ");
+            {orderedFormEntries(request.form_data, templateVersion).map(([key, value]) => {
+              const label = fieldLabels[key] || key.replace(/_/g, " ");
               if (
                 value &&
                 typeof value === "object" &&
@@ -1,5 +1,6 @@
 import React, { useCallback, useEffect, useRef } from "react";
 import { Input } from "@/components/ui/input";
+import { Checkbox } from "@/components/ui/checkbox";
 import { ScrollArea } from "@/components/ui/scroll-area";
 import { Skeleton } from "@/components/ui/skeleton";
 import { Search, FileText, Clock, CheckCircle2, XCircle, AlertTriangle } from "lucide-react";
@@ -40,7 +41,8 @@ function getRequestAgeIndicator(request) {
 }
 
 export default function RequestList({
-  requests, selectedRequest, onSelect, searchQuery, onSearchChange, loading, loadingMore = false, hasMore = false, onLoadMore
+  requests, selectedRequest, onSelect, searchQuery, onSearchChange, loading, loadingMore = false, hasMore = false, onLoadMore,
+  includeArchived = false, onIncludeArchivedChange
 }) {
   const scrollAreaRef = useRef(null);
   const showInitialLoading = loading && requests.length === 0;
@@ -90,6 +92,20 @@ export default function RequestList({
             className="pl-9 h-9 text-sm max-[390px]:text-[13px] bg-white border-slate-200"
           />
         </div>
+        {onIncludeArchivedChange && (
+          <label
+            className="mt-2 flex items-center gap-2 text-xs text-slate-500 cursor-pointer select-none"
+            title="Closed requests with no activity for a long time are archived. They still count in the dashboard totals."
+          >
+            <Checkbox
+              data-testid="include-archived"
+              checked={includeArchived}
+              onCheckedChange={(checked) => onIncludeArchivedChange(checked === true)}
+              className="h-3.5 w-3.5"
+            />
+            Include archived requests
+          </label>
+        )}
         <div className="mt-2 h-0.5 overflow-hidden rounded-full bg-slate-100">
           <div
             className={`h-full rounded-full bg-blue-500 transition-all duration-300 ${
@@ -1,11 +1,18 @@
 import { useEffect, useRef } from "react";
+import { getStreamToken } from "@/lib/api";
 
 const HEARTBEAT_INTERVAL_MS = 25000;
 const RECONNECT_BASE_MS = 1000;
 const RECONNECT_MAX_MS = 10000;
+// Websocket attempts that never open before falling back to the SSE notification stream
+const WS_FAILURES_BEFORE_STREAM = 3;
 
 export function useLiveUpdates({ onEvent, enabled = true }) {
   const socketRef = useRef(null);
+  const streamRef = useRef(null);
+  const streamStartingRef = useRef(false);
+  const lastEventIdRef = useRef(null);
+  const failedOpensRef = useRef(0);
   const onEventRef = useRef(onEvent);
   const reconnectTimeoutRef = useRef(null);
   const heartbeatIntervalRef = useRef(null);
@@ -21,6 +28,7 @@ export function useLiveUpdates({ onEvent, enabled = true }) {
     }
 
     const baseUrl = process.env.REACT_APP_BACKEND_URL || "";
+    const streamUrl = `${baseUrl || `http://${window.location.hostname}:8000`}/api/notifications/stream`;
     const wsUrl = baseUrl.startsWith("https")
       ? `wss://${baseUrl.replace("https://", "")}/ws`
       : baseUrl.startsWith("http")
@@ -64,12 +72,80 @@ export function useLiveUpdates({ onEvent, enabled = true }) {
       }, HEARTBEAT_INTERVAL_MS);
     };
 
+    // Proxies that block websockets usually pass SSE. The stream carries only the
+    // user's notification events. Its URL holds a short-lived stream token rather
+    // than the session token, so when the server rejects a reconnect (the token
+    // expired) a fresh token is fetched and the stream resumes after the last event.
+    const startStream = async () => {
+      if (!localStorage.getItem("token") || streamRef.current || streamStartingRef.current) {
+        return;
+      }
+      streamStartingRef.current = true;
+      let token;
+      try {
+        token = (await getStreamToken()).data.token;
+      } catch {
+        streamStartingRef.current = false;
+        scheduleReconnect();
+        return;
+      }
+      streamStartingRef.current = false;
+      if (!shouldReconnectRef.current) {
+        return;
+      }
+      const params = new URLSearchParams({ token });
+      if (lastEventIdRef.current) {
+        params.set("last_event_id", lastEventIdRef.current);
+      }
+      const source = new EventSource(`${streamUrl}?${params}`);
+      streamRef.current = source;
+      source.onopen = () => {
+        reconnectAttemptRef.current = 0;
+      };
+      source.onmessage = (event) => {
+        if (event.lastEventId) {
+          lastEventIdRef.current = event.lastEventId;
+        }
+        try {
+          onEventRef.current?.(JSON.parse(event.data));
+        } catch {}
+      };
+      source.addEventListener("resync", (event) => {
+        if (event.lastEventId) {
+          lastEventIdRef.current = event.lastEventId;
+        }
+        onEventRef.current?.({ event: "STREAM_RESYNC", payload: {} });
+      });
+      source.onerror = () => {
+        // EventSource retries dropped connections itself and only gives up when rejected
+        if (source.readyState === EventSource.CLOSED) {
+          if (streamRef.current === source) {
+            streamRef.current = null;
+          }
+          scheduleReconnect();
+        }
+      };
+    };
+
     const connect = () => {
       clearReconnectTimeout();
+      if (failedOpensRef.current >= WS_FAILURES_BEFORE_STREAM) {
+        startStream();
+        return;
+      }
       const ws = new WebSocket(wsUrl);
       socketRef.current = ws;
+      let opened = false;
 
       ws.onopen = () => {
+        opened = true;
+        // Sent as a message, not in the URL, so the token stays out of access logs.
+        // It lets the server include request patches this user may see.
+        const token = localStorage.getItem("token");
+        if (token) {
+          ws.send(JSON.stringify({ type: "auth", token }));
+        }
+        failedOpensRef.current = 0;
         reconnectAttemptRef.current = 0;
         startHeartbeat(ws);
       };
@@ -91,6 +167,9 @@ export function useLiveUpdates({ onEvent, enabled = true }) {
 
       ws.onclose = () => {
         clearHeartbeat();
+        if (!opened) {
+          failedOpensRef.current += 1;
+        }
         if (socketRef.current === ws) {
           socketRef.current = null;
         }
@@ -108,6 +187,10 @@ export function useLiveUpdates({ onEvent, enabled = true }) {
         socketRef.current.close();
         socketRef.current = null;
       }
+      if (streamRef.current) {
+        streamRef.current.close();
+        streamRef.current = null;
+      }
     };
   }, [enabled]);
 }
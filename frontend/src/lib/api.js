@@ -35,6 +35,7 @@ export const updateUser = (id, data) => api.put(`/users/${id}`, data);
 export const deleteUser = (id) => api.delete(`/users/${id}`);
 export const listApprovers = (params) => api.get('/users/approvers', { params });
 export const changePassword = (id, data) => api.put(`/users/${id}/password`, data);
+export const updateNotificationPreferences = (id, data) => api.put(`/users/${id}/notification-preferences`, data);
 
 // Departments
 export const listDepartments = () => api.get('/departments');
@@ -50,18 +51,22 @@ export const getTemplate = (id) => api.get(`/form-templates/${id}`);
 export const createTemplate = (data) => api.post('/form-templates', data);
 export const updateTemplate = (id, data) => api.put(`/form-templates/${id}`, data);
 export const deleteTemplate = (id) => api.delete(`/form-templates/${id}`);
+export const getTemplateVersion = (versionId) => api.get(`/form-templates/versions/${versionId}`);
 
 // Requests
 export const listRequests = (params) => api.get('/requests', { params });
 export const getRequest = (id) => api.get(`/requests/${id}`);
+export const getRequestBundle = (id) => api.get(`/requests/${id}/bundle`);
 export const createRequest = (data) => api.post('/requests', data);
 export const actionRequest = (id, data) => api.post(`/requests/${id}/action`, data);
+export const bulkActionRequests = (data) => api.post('/requests/bulk-action', data);
 export const cancelRequest = (id) => api.post(`/requests/${id}/cancel`);
 
 // Notifications
 export const listNotifications = (params) => api.get('/notifications', { params });
 export const markNotificationRead = (id) => api.post(`/notifications/${id}/read`);
 export const markAllNotificationsRead = () => api.post('/notifications/read-all');
+export const getStreamToken = () => api.post('/notifications/stream-token');
 
 // Dashboard
 export const getDashboardStats = () => api.get('/dashboard/stats');
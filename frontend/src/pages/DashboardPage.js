@@ -13,14 +13,16 @@ import {
   listNotifications,
   markNotificationRead,
   markAllNotificationsRead,
+  updateNotificationPreferences,
   createRequest,
   actionRequest,
   getRequest,
+  getRequestBundle,
   cancelRequest,
 } from "@/lib/api";
 import Sidebar from "@/components/Sidebar";
 import RequestList from "@/components/RequestList";
-import RequestDetail from "@/components/RequestDetail";
+import RequestDetail, { rememberTemplateVersion } from "@/components/RequestDetail";
 import CreateRequestDialog from "@/components/CreateRequestDialog";
 import NotificationPanel from "@/components/NotificationPanel";
 import { Button } from "@/components/ui/button";
@@ -30,7 +32,7 @@ const INITIAL_REQUEST_PAGE_SIZE = 12;
 const REQUESTS_LOAD_MORE_SIZE = 5;
 
 export default function DashboardPage() {
-  const { user, logout } = useAuthStore();
+  const { user, logout, updateUser } = useAuthStore();
   const navigate = useNavigate();
 
   const [departments, setDepartments] = useState([]);
@@ -47,6 +49,7 @@ export default function DashboardPage() {
   const canCreateRequest = user?.role === "requestor" || user?.role === "both" || user?.role === "manager" || user?.role === "super_admin";
   const [selectedRequest, setSelectedRequest] = useState(null);
   const [searchQuery, setSearchQuery] = useState("");
+  const [includeArchived, setIncludeArchived] = useState(false);
 
   const [showCreateDialog, setShowCreateDialog] = useState(false);
   const [showNotifications, setShowNotifications] = useState(false);
@@ -126,6 +129,7 @@ export default function DashboardPage() {
       if (activeFilter === "rejected") params.status = "rejected";
       if (activeFilter === "cancelled") params.status = "cancelled";
       if (searchQuery) params.search = searchQuery;
+      if (includeArchived) params.include_archived = true;
 
       const res = await listRequests(params);
       let nextLoadedCount = res.data.items.length;
@@ -151,7 +155,7 @@ export default function DashboardPage() {
         setLoading(false);
       }
     }
-  }, [user?.role, selectedDept, activeFilter, searchQuery]);
+  }, [user?.role, selectedDept, activeFilter, searchQuery, includeArchived]);
 
   const fetchTemplates = useCallback(async () => {
     try {
@@ -183,48 +187,119 @@ export default function DashboardPage() {
     fetchTemplates();
   }, [fetchTemplates]);
 
+  // Apply the versioned request patches carried by realtime events. Patches hold
+  // the full workflow fields, so any newer version can be applied directly; a
+  // refetch is needed only when our copy is behind and no patch was sent to us.
+  const seenVersionsRef = useRef({});
+  const applyRequestPatches = ({ versions, patches = {} }) => {
+    // Several events share one version (e.g. REQUEST_UPDATED + REQUEST_STATE_CHANGED); act once
+    const fresh = Object.keys(versions).filter((id) => (seenVersionsRef.current[id] ?? 0) < versions[id]);
+    if (fresh.length === 0) return;
+    fresh.forEach((id) => {
+      seenVersionsRef.current[id] = versions[id];
+    });
+
+    const isBehind = (doc) => doc && versions[doc.id] > (doc.version ?? 0);
+
+    const staleRows = requests.filter((r) => isBehind(r) && !patches[r.id]);
+    const patchedRows = requests.filter((r) => isBehind(r) && patches[r.id]);
+    // Status and inbox filters can gain or lose rows when a request moves on
+    const filterDependsOnStatus = !["all", "my_requests"].includes(activeFilter);
+    const enteredView = Object.keys(patches).some((id) => !requests.some((r) => r.id === id));
+    if (staleRows.length > 0 || (filterDependsOnStatus && (patchedRows.length > 0 || enteredView))) {
+      fetchRequests();
+    } else if (patchedRows.length > 0) {
+      setRequests((prev) => prev.map((r) => (
+        patches[r.id] && patches[r.id].version > (r.version ?? 0) ? { ...r, ...patches[r.id] } : r
+      )));
+    }
+
+    if (isBehind(selectedRequest)) {
+      const patch = patches[selectedRequest.id];
+      if (patch) {
+        setSelectedRequest((prev) => (
+          prev?.id === selectedRequest.id && patch.version > (prev.version ?? 0) ? { ...prev, ...patch } : prev
+        ));
+      } else {
+        getRequest(selectedRequest.id)
+          .then((res) => setSelectedRequest(res.data))
+          .catch(() => {});
+      }
+    }
+  };
+
   useLiveUpdates({
     enabled: !!user,
     onEvent: ({ event, payload }) => {
       switch (event) {
-        case "REQUEST_CREATED":
         case "REQUEST_UPDATED":
         case "REQUEST_APPROVED":
         case "REQUEST_REJECTED":
         case "REQUEST_CANCELLED":
-        case "REQUEST_STATE_CHANGED": {
-          // Refresh request lists and stats
-          fetchRequests();
-          fetchData();
-
-          // If the currently opened request changed, refresh it
-          if (selectedRequest?.id === payload?.request_id) {
-            getRequest(payload.request_id)
-              .then((res) => setSelectedRequest(res.data))
+        case "REQUEST_STATE_CHANGED":
+        case "REQUESTS_BULK_UPDATED": {
+          if (!payload?.versions) {
+            // Event without versions: fall back to refetching everything
+            fetchRequests();
+            fetchData();
+            const ids = payload?.request_ids || [payload?.request_id];
+            if (selectedRequest?.id && ids.includes(selectedRequest.id)) {
+              getRequest(selectedRequest.id)
+                .then((res) => setSelectedRequest(res.data))
+                .catch(() => {});
+            }
+            break;
+          }
+          applyRequestPatches(payload);
+          // Paired REQUEST_* events are followed by REQUEST_STATE_CHANGED; refresh counts once
+          if (event === "REQUEST_STATE_CHANGED" || event === "REQUESTS_BULK_UPDATED") {
+            getDashboardStats()
+              .then((res) => setStats(res.data))
               .catch(() => {});
           }
           break;
         }
 
+        case "REQUEST_CREATED": {
+          fetchRequests();
+          fetchData();
+          break;
+        }
+
         case "NOTIFICATION_CREATED": {
           if (payload?.user_id === user?.id) {
+            if (typeof payload.unread_count === "number") {
+              setUnreadCount(payload.unread_count);
+            }
             listNotifications({ limit: 20 }).then((res) => {
               setNotifications(res.data.items);
               setUnreadCount(res.data.unread_count);
             });
-            fetchData(); // unread badge in dashboard stats
           }
           break;
         }
 
+        case "STREAM_RESYNC": {
+          // The notification stream missed events; reload what it would have carried
+          listNotifications({ limit: 20 }).then((res) => {
+            setNotifications(res.data.items);
+            setUnreadCount(res.data.unread_count);
+          });
+          break;
+        }
+
         case "NOTIFICATION_READ":
         case "NOTIFICATIONS_CLEARED": {
+          // Another tab marked notifications read; the event carries the new count
           if (payload?.user_id === user?.id) {
-            listNotifications({ limit: 20 }).then((res) => {
-              setNotifications(res.data.items);
-              setUnreadCount(res.data.unread_count);
-            });
-            fetchData();
+            setNotifications((prev) => prev.map((n) => (
+              event === "NOTIFICATIONS_CLEARED" || n.id === payload.notification_id
+                ? { ...n, is_read: true }
+                : n
+            )));
+            if (typeof payload.unread_count === "number") {
+              setUnreadCount(payload.unread_count);
+            }
           }
           break;
         }
@@ -303,25 +378,36 @@ export default function DashboardPage() {
 
   const handleSelectRequest = async (req) => {
     try {
-      const res = await getRequest(req.id);
-      setSelectedRequest(res.data);
+      // One round trip for the request and the template schema it renders with
+      const res = await getRequestBundle(req.id);
+      rememberTemplateVersion(res.data.template_version);
+      setSelectedRequest(res.data.request);
     } catch {
       setSelectedRequest(req);
     }
   };
 
   const handleMarkRead = async (id) => {
-    await markNotificationRead(id);
+    const res = await markNotificationRead(id);
     setNotifications((prev) =>
       prev.map((n) => (n.id === id ? { ...n, is_read: true } : n)),
     );
-    setUnreadCount((prev) => Math.max(0, prev - 1));
+    setUnreadCount(res.data.unread_count ?? 0);
   };
 
   const handleMarkAllRead = async () => {
-    await markAllNotificationsRead();
+    const res = await markAllNotificationsRead();
     setNotifications((prev) => prev.map((n) => ({ ...n, is_read: true })));
-    setUnreadCount(0);
+    setUnreadCount(res.data.unread_count ?? 0);
+  };
+
+  const handleChangeEmailFrequency = async (emailFrequency) => {
+    try {
+      const res = await updateNotificationPreferences(user.id, { email_frequency: emailFrequency });
+      updateUser(res.data);
+    } catch (err) {
+      console.error("Failed to update email preferences:", err);
+    }
   };
 
   const handleLogout = () => {
@@ -438,6 +524,8 @@ export default function DashboardPage() {
               {showNotifications && (
                 <NotificationPanel
                   notifications={notifications}
+                  emailFrequency={user?.email_frequency || "immediate"}
+                  onChangeEmailFrequency={handleChangeEmailFrequency}
                   onMarkRead={handleMarkRead}
                   onMarkAllRead={handleMarkAllRead}
                   onClose={() => setShowNotifications(false)}
@@ -494,6 +582,8 @@ export default function DashboardPage() {
                 onSelect={handleSelectRequest}
                 searchQuery={searchQuery}
                 onSearchChange={setSearchQuery}
+                includeArchived={includeArchived}
+                onIncludeArchivedChange={setIncludeArchived}
                 loading={loading}
                 loadingMore={loadingMoreRequests}
                 hasMore={hasMoreRequests}
@@ -515,6 +605,8 @@ export default function DashboardPage() {
               onSelect={handleSelectRequest}
               searchQuery={searchQuery}
               onSearchChange={setSearchQuery}
+              includeArchived={includeArchived}
+              onIncludeArchivedChange={setIncludeArchived}
               loading={loading}
               loadingMore={loadingMoreRequests}
               hasMore={hasMoreRequests}
@@ -0,0 +1,112 @@
+"""
+Shared fixtures: the API runs in-process against an in-memory mongomock
+database (mongomock-motor), seeded the same way as a fresh deployment.
+
+mongomock does not emit pymongo command events, so the collection methods
+that map to one wire command are wrapped to feed the current request's DB
+counters, as MongoCommandListener does against a real server.
+"""
+import functools
+import os
+import sys
+from contextvars import ContextVar
+from pathlib import Path
+
+import pytest
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "workflow_bridge_test")
+os.environ.setdefault("JWT_SECRET", "test-secret-" + "x" * 32)
+os.environ.setdefault("RATE_LIMIT_ENABLED", "0")
+os.environ.setdefault("MAINTENANCE_INTERVAL_MINUTES", "0")
+os.environ.setdefault("REDIS_URL", "")
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import httpx  # noqa: E402
+import motor.motor_asyncio  # noqa: E402
+from mongomock.collection import Collection  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+_mongo = AsyncMongoMockClient()
+motor.motor_asyncio.AsyncIOMotorClient = lambda *args, **kwargs: _mongo
+
+from utils.metrics import request_db_stats  # noqa: E402
+
+# Collection methods that send exactly one command to the server
+_COMMAND_METHODS = (
+    "find", "find_one", "count_documents", "estimated_document_count", "distinct", "aggregate",
+    "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+    "delete_one", "delete_many", "bulk_write",
+    "find_one_and_update", "find_one_and_replace", "find_one_and_delete",
+)
+_call_depth: ContextVar[int] = ContextVar("mongo_call_depth", default=0)
+
+
+def _counted(method):
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        depth = _call_depth.get()
+        if depth == 0:
+            stats = request_db_stats.get()
+            if stats is not None:
+                stats["commands"] += 1
+        token = _call_depth.set(depth + 1)
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            _call_depth.reset(token)
+    return wrapper
+
+
+for _name in _COMMAND_METHODS:
+    setattr(Collection, _name, _counted(getattr(Collection, _name)))
+
+# mongomock's find_and_modify re-applies the filter after the update, so a
+# guarded update on a field it changes (status, version) reports no match
+_find_and_modify = Collection._find_and_modify
+
+
+def _find_and_modify_by_id(self, query, projection=None, *args, **kwargs):
+    match = self.find_one(query, projection={"_id": 1})
+    if match is not None:
+        query = {"_id": match["_id"]}
+    return _find_and_modify(self, query, projection, *args, **kwargs)
+
+
+Collection._find_and_modify = _find_and_modify_by_id
+
+import server  # noqa: E402
+from migrations import run_migrations  # noqa: E402
+from seed import seed_data  # noqa: E402
+from utils.helpers import db  # noqa: E402
+
+PASSWORD = "pass123"
+ADMIN_PASSWORD = "admin123"
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def database():
+    """A freshly seeded and migrated database."""
+    await _mongo.drop_database(os.environ["DB_NAME"])
+    await seed_data(db)
+    await run_migrations(db)
+    return db
+
+
+@pytest.fixture
+async def client(database):
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+        yield http
+
+
+async def login(client, email: str, password: str = PASSWORD) -> dict:
+    response = await client.post("/api/auth/login", json={"email": email, "password": password})
+    response.raise_for_status()
+    return {"Authorization": f"Bearer {response.json()['token']}"}
@@ -0,0 +1,34 @@
+"""Response compression leaves Server-Sent Events uncompressed."""
+import httpx
+import pytest
+from starlette.middleware.gzip import GZipMiddleware
+
+from utils.responses import SkipStreamCompression
+
+pytestmark = pytest.mark.anyio
+
+BODY = b"data: {}\n\n" * 500
+
+
+async def _app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": BODY})
+
+
+async def _get(path: str, accept: str = "*/*") -> httpx.Response:
+    app = SkipStreamCompression(_app, compressor=GZipMiddleware, skip_paths={"/stream"}, minimum_size=100)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await client.get(path, headers={"Accept": accept, "Accept-Encoding": "gzip"})
+
+
+async def test_regular_responses_are_compressed():
+    response = await _get("/api/requests")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.content == BODY
+
+
+async def test_event_streams_are_not_compressed():
+    for response in (await _get("/stream"), await _get("/other", accept="text/event-stream")):
+        assert "content-encoding" not in response.headers
+        assert response.content == BODY
@@ -0,0 +1,78 @@
+"""Every route in ROUTE_BUDGETS stays within its DB-command budget."""
+import pytest
+
+from tests.conftest import ADMIN_PASSWORD, login
+from utils import db_profiler
+from utils.helpers import db
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def profiled(monkeypatch):
+    """Strict profiling, recording which budgeted routes were exercised."""
+    monkeypatch.setattr(db_profiler, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(db_profiler, "PROFILE_STRICT", True)
+    monkeypatch.setattr(db_profiler, "EXPLAIN_SLOW_QUERIES", False)
+    db_profiler.violations.clear()
+    seen = set()
+    evaluate = db_profiler.evaluate_request
+
+    def record(method, route, stats):
+        seen.add(f"{method} {route}")
+        evaluate(method, route, stats)
+
+    monkeypatch.setattr(db_profiler, "evaluate_request", record)
+    yield seen
+    db_profiler.violations.clear()
+
+
+async def _create(client, headers, template_id) -> str:
+    response = await client.post("/api/requests", headers=headers, json={
+        "form_template_id": template_id,
+        "form_data": {
+            "item_description": "Printer paper",
+            "quantity": "5",
+            "purpose": "Monthly restock",
+            "date_needed": "2026-12-01",
+        },
+    })
+    assert response.status_code == 201, response.text
+    return response.json()["id"]
+
+
+async def test_budgeted_routes_stay_within_budget(client, profiled):
+    requestor = await login(client, "ana.reyes@company.com")
+    approver = await login(client, "maria.santos@company.com")
+    admin = await login(client, "admin@company.com", ADMIN_PASSWORD)
+    templates = (await client.get("/api/form-templates", headers=requestor)).json()
+    template_id = next(t["id"] for t in templates if t["name"] == "Office Supplies and Consumables")
+
+    approved, cancelled, bulk = [await _create(client, requestor, template_id) for _ in range(3)]
+
+    calls = [
+        ("get", "/api/requests", requestor, None),
+        ("get", f"/api/requests/{approved}", requestor, None),
+        ("get", f"/api/requests/{approved}/bundle", requestor, None),
+        ("post", f"/api/requests/{approved}/action", approver, {"action": "approve"}),
+        ("post", f"/api/requests/{cancelled}/cancel", requestor, None),
+        ("post", "/api/requests/bulk-action", approver, {"request_ids": [bulk], "action": "approve"}),
+        ("get", "/api/dashboard/stats", requestor, None),
+        ("get", "/api/dashboard/stats", admin, None),
+        ("get", "/api/notifications", requestor, None),
+        ("get", "/api/notifications", admin, None),
+    ]
+    for method, path, headers, body in calls:
+        response = await client.request(method, path, headers=headers, json=body)
+        assert response.status_code == 200, (path, response.text)
+
+    # Closed requests moved by archive.py are served from the fallback lookup
+    doc = await db.requests.find_one({"id": cancelled}, {"_id": 0})
+    await db.requests_archive.insert_one(doc)
+    await db.requests.delete_one({"id": cancelled})
+    for path in (f"/api/requests/{cancelled}", f"/api/requests/{cancelled}/bundle"):
+        response = await client.get(path, headers=requestor)
+        assert response.status_code == 200, (path, response.text)
+
+    assert set(db_profiler.ROUTE_BUDGETS) <= profiled
+    db_profiler.assert_within_db_budgets()
@@ -0,0 +1,67 @@
+"""Digest delivery keeps notices for temporary failures and drops undeliverable ones."""
+from datetime import datetime, timezone
+
+import pytest
+import resend
+
+from utils import email_digest, helpers
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def resend_configured(monkeypatch):
+    monkeypatch.setattr(helpers, "RESEND_API_KEY", "re_test")
+    monkeypatch.setattr(helpers, "SENDER_EMAIL", "forms@example.com")
+
+
+async def _queue(db, email: str, count: int = 2):
+    await email_digest.queue_digest_items([
+        {
+            "user_id": "user-1",
+            "email": email,
+            "frequency": "daily",
+            "request_id": f"request-{n}",
+            "subject": f"Update {n}",
+            "html": f"<p>Update {n}</p>",
+            "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc).isoformat(),
+        }
+        for n in range(count)
+    ])
+
+
+async def test_invalid_address_is_dropped(database, resend_configured, monkeypatch):
+    def send(params):
+        raise AssertionError("an invalid address must not reach the provider")
+
+    monkeypatch.setattr(resend.Emails, "send", send)
+    await _queue(database, "not-an-email")
+
+    assert await email_digest.send_digests("daily") == 0
+    assert await database.email_digest_queue.count_documents({}) == 0
+
+
+async def test_temporary_failure_retries_then_drops(database, resend_configured, monkeypatch):
+    def send(params):
+        raise ConnectionError("provider unavailable")
+
+    monkeypatch.setattr(resend.Emails, "send", send)
+    await _queue(database, "ana.reyes@company.com")
+
+    for attempt in range(1, email_digest.DIGEST_MAX_ATTEMPTS):
+        assert await email_digest.send_digests("daily") == 0
+        queued = await database.email_digest_queue.find({}).to_list(None)
+        assert [item["attempts"] for item in queued] == [attempt, attempt]
+
+    assert await email_digest.send_digests("daily") == 0
+    assert await database.email_digest_queue.count_documents({}) == 0
+
+
+async def test_sent_digest_is_removed(database, resend_configured, monkeypatch):
+    sent = []
+    monkeypatch.setattr(resend.Emails, "send", lambda params: sent.append(params) or {"id": "email-1"})
+    await _queue(database, "ana.reyes@company.com", count=3)
+
+    assert await email_digest.send_digests("daily") == 1
+    assert sent[0]["to"] == ["ana.reyes@company.com"]
+    assert await database.email_digest_queue.count_documents({}) == 0
@@ -0,0 +1,39 @@
+"""Formula-like values are neutralized in CSV exports and kept as text in XLSX."""
+import csv
+import io
+
+import openpyxl
+import pytest
+
+from utils.export import stream_csv, stream_xlsx
+
+pytestmark = pytest.mark.anyio
+
+COLUMNS = [("item_description", "Item")]
+REQUEST = {"request_number": "REQ-00001", "status": "pending", "form_data": {"item_description": "=1+2"}}
+
+
+async def _cursor():
+    yield REQUEST
+
+
+async def _read(stream) -> bytes:
+    return b"".join([chunk async for chunk in stream])
+
+
+async def test_csv_quotes_formula_cells():
+    body = (await _read(stream_csv(_cursor(), COLUMNS, {}))).decode("utf-8-sig")
+    header, row = list(csv.reader(io.StringIO(body)))
+    assert header[-1] == "Item"
+    assert row[0] == "REQ-00001"
+    assert row[-1] == "'=1+2"
+
+
+async def test_xlsx_keeps_formula_text_as_a_string():
+    body = await _read(stream_xlsx(_cursor(), COLUMNS, {}))
+    sheet = openpyxl.load_workbook(io.BytesIO(body))["Requests"]
+    cell = sheet.cell(row=2, column=sheet.max_column)
+    assert cell.value == "=1+2"
+    assert cell.data_type == "s"
+    assert cell.quotePrefix
+    assert sheet.cell(row=2, column=1).value == "REQ-00001"
@@ -0,0 +1,31 @@
+"""generate_data reports documents that failed to insert instead of dropping them silently."""
+import pytest
+
+from generate_data import BatchWriteFailed, BatchWriter
+from utils.helpers import db
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_flush_raises_when_documents_fail():
+    await db.generate_data_test.drop()
+    await db.generate_data_test.create_index("id", unique=True)
+    writer = BatchWriter(db.generate_data_test, parallel=2)
+
+    await writer.write([{"id": 1}, {"id": 2}])
+    await writer.write([{"id": 2}, {"id": 3}])
+    with pytest.raises(BatchWriteFailed, match="1 generate_data_test failed"):
+        await writer.flush()
+
+    assert (writer.written, writer.failed) == (3, 1)
+    assert await db.generate_data_test.count_documents({}) == 3
+
+
+async def test_flush_succeeds_when_everything_is_written():
+    await db.generate_data_test.drop()
+    writer = BatchWriter(db.generate_data_test, parallel=2)
+
+    await writer.write([{"id": n} for n in range(5)])
+    await writer.flush()
+
+    assert (writer.written, writer.failed) == (5, 0)
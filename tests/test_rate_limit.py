@@ -0,0 +1,81 @@
+"""Login rate limits per account and per IP, and the in-flight request cap."""
+import asyncio
+
+import httpx
+import pytest
+
+from utils import rate_limit
+from utils.rate_limit import RateLimitMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+async def _echo(scope, receive, send):
+    body = b""
+    while True:
+        message = await receive()
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            break
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": body})
+
+
+def _client(app) -> httpx.AsyncClient:
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "ROUTE_LIMITS", {"auth": (0.001, 2), "auth_ip": (0.001, 5)})
+
+
+async def _login(client, email):
+    return await client.post("/api/auth/login", json={"email": email, "password": "wrong"})
+
+
+async def test_login_limit_is_per_account_and_replays_the_body(limits):
+    async with _client(RateLimitMiddleware(_echo)) as client:
+        first = await _login(client, "ana.reyes@company.com")
+        assert first.status_code == 200
+        assert first.json() == {"email": "ana.reyes@company.com", "password": "wrong"}
+        assert (await _login(client, "Ana.Reyes@company.com ")).status_code == 200
+        assert (await _login(client, "ana.reyes@company.com")).status_code == 429
+        # Another account from the same address is not locked out
+        assert (await _login(client, "maria.santos@company.com")).status_code == 200
+
+
+async def test_login_attempts_across_accounts_share_a_per_ip_limit(limits):
+    async with _client(RateLimitMiddleware(_echo)) as client:
+        statuses = [(await _login(client, f"user{n}@company.com")).status_code for n in range(6)]
+    assert statuses == [200] * 5 + [429]
+
+
+async def test_in_flight_slot_is_taken_before_the_bucket_check(monkeypatch):
+    monkeypatch.setattr(rate_limit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(rate_limit, "MAX_CONCURRENT_REQUESTS", 1)
+    middleware = RateLimitMiddleware(_echo)
+    release = asyncio.Event()
+
+    async def slow_hit(key, rate, burst):
+        await release.wait()
+        return True, 0.0
+
+    middleware.buckets.hit = slow_hit
+    async with _client(middleware) as client:
+        first = asyncio.create_task(client.get("/api/requests"))
+        await asyncio.sleep(0.01)
+        second = await client.get("/api/requests")
+        assert second.status_code == 503
+        release.set()
+        assert (await first).status_code == 200
+    assert rate_limit.in_flight_requests() == 0
+
+
+async def test_rejected_requests_release_their_in_flight_slot(limits, monkeypatch):
+    monkeypatch.setattr(rate_limit, "MAX_CONCURRENT_REQUESTS", 1)
+    async with _client(RateLimitMiddleware(_echo)) as client:
+        statuses = [(await _login(client, "ana.reyes@company.com")).status_code for _ in range(3)]
+    assert statuses == [200, 200, 429]
+    assert rate_limit.in_flight_requests() == 0
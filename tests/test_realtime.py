@@ -0,0 +1,23 @@
+"""/ws frame encoding negotiated through the websocket subprotocol."""
+import json
+
+import msgpack
+from starlette.testclient import TestClient
+
+import server
+from realtime import manager
+
+
+def test_msgpack_subprotocol_gets_binary_frames():
+    with TestClient(server.app) as client:
+        with client.websocket_connect("/ws", subprotocols=["msgpack", "json"]) as packed, \
+                client.websocket_connect("/ws") as plain:
+            assert packed.accepted_subprotocol == "msgpack"
+            assert plain.accepted_subprotocol is None
+
+            client.portal.call(manager.broadcast, "request_updated", {"request_id": "request-1"})
+
+            frame = msgpack.unpackb(packed.receive_bytes())
+            assert frame["event"] == "request_updated"
+            assert frame["payload"] == {"request_id": "request-1"}
+            assert json.loads(plain.receive_text()) == frame